@@ -0,0 +1,112 @@
+"""Analytics page latency against history size (lms_analytics).
+
+For each history size, generates a database, then measures:
+
+    summary       each dashboard query, reading the summary tables only
+    ad hoc        the same figure aggregated from IssueTable (where one exists)
+    circulation   one issue + return with the maintenance triggers, and without them
+    rebuild       recomputing every summary from the loans
+
+Summary queries should stay well under 50 ms however many loans there are;
+the ad hoc ones grow with the history.
+
+    python -m benchmarks.analytics --loans 100000 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date
+
+from benchmarks.datagen import generate, skewed, student_id
+from benchmarks.harness import percentile
+from lms_analytics import SUMMARY_TRIGGERS, dashboard_queries, rebuild
+from lms_circulation import issue_books, return_books
+from lms_db import ConnectionPool
+
+# The same figures computed from the loans themselves
+AD_HOC = {
+    "kpis": """
+    SELECT SUM(issue_date = :today), SUM(return_date = :today), SUM(is_returned = 0),
+        SUM(is_returned = 0 AND due_date < :today), COUNT(DISTINCT CASE WHEN is_returned = 0 THEN student_id END)
+    FROM IssueTable
+    """,
+    "top titles (all time)": "SELECT book_id, COUNT(*) FROM IssueTable GROUP BY book_id ORDER BY 2 DESC LIMIT 10",
+    "top borrowers": "SELECT student_id, COUNT(*) FROM IssueTable GROUP BY student_id ORDER BY 2 DESC LIMIT 10",
+    "overdue rate by cohort": """
+    SELECT substr(issue_date, 1, 7), COUNT(*),
+        SUM(CASE WHEN is_returned = 1 THEN return_date > due_date ELSE due_date < :today END)
+    FROM IssueTable GROUP BY 1
+    """,
+}
+
+
+def timed(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return percentile(samples, 0.5) * 1000, percentile(samples, 0.99) * 1000
+
+
+def circulate(pool, books, students, iterations, today, rng):
+    """p50/p99 ms of one issue followed by its return."""
+    def cycle():
+        outcome, = issue_books(pool, student_id(rng.randint(1, students)), [skewed(rng, books, 2)], today)
+        if outcome.ok:
+            return_books(pool, [outcome.issue_id], today)
+    return timed(cycle, iterations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--loans", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--books", type=int, default=20000)
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    today = date.today()
+    queries = dashboard_queries(today)
+    with tempfile.TemporaryDirectory() as tmp:
+        for loans in args.loans:
+            db_file = os.path.join(tmp, f"analytics_{loans}.db")
+            generate(db_file, args.books, args.students, loans, args.years, args.seed)
+            pool = ConnectionPool(db_file)
+            conn = pool.reader()
+            rng = random.Random(args.seed)
+
+            print(f"\n{loans:,} loans")
+            print(f"{'query':<24} {'summary p50/p99 ms':>20} {'ad hoc p50/p99 ms':>20}")
+            for name, (query, params) in queries.items():
+                summary = timed(lambda: conn.execute(query, params).fetchall(), args.iterations)
+                line = f"{name:<24} {summary[0]:>9.3f} / {summary[1]:>8.3f}"
+                if name in AD_HOC:
+                    ad_hoc = timed(lambda: conn.execute(AD_HOC[name], {"today": today.isoformat()}).fetchall(),
+                                   max(args.iterations // 20, 3))
+                    line += f" {ad_hoc[0]:>9.1f} / {ad_hoc[1]:>8.1f}"
+                print(line)
+
+            with_triggers = circulate(pool, args.books, args.students, args.iterations, today, rng)
+            start = time.perf_counter()
+            differences = rebuild(pool)
+            rebuilt = time.perf_counter() - start
+            with pool.writer() as w:
+                for name in ("analytics_issue", "analytics_return"):
+                    w.execute(f"DROP TRIGGER {name}")
+            without = circulate(pool, args.books, args.students, args.iterations, today, rng)
+            with pool.writer() as w:
+                for statement in SUMMARY_TRIGGERS:
+                    w.execute(statement)
+            pool.close_all()
+            print(f"issue + return: {with_triggers[0]:.3f} / {with_triggers[1]:.3f} ms with triggers, "
+                  f"{without[0]:.3f} / {without[1]:.3f} ms without")
+            print(f"rebuild: {rebuilt:.2f} s, {sum(differences.values())} rows differed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Load test for the headless API: scan-to-issue requests per second and tail latency.
+
+Each simulated kiosk holds one keep-alive connection and loops: scan a book
+(POST /issue), then drop it back (POST /return), so copy counts stay steady
+for the whole run. Without --url an API server is started in-process on a
+copy of the given database (or on a freshly generated one).
+
+    python -m benchmarks.api_load --kiosks 16 --seconds 10
+    python -m benchmarks.api_load --db bench.db --workers 8
+    python -m benchmarks.api_load --url 127.0.0.1:8080 --books 500 --students 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from benchmarks.datagen import generate
+from benchmarks.harness import percentile
+from lms_api import LibraryApi, serve
+from lms_db import ConnectionPool
+from lms_migrations import ensure_migrated
+from lms_writequeue import WriteQueue
+
+
+class Client:
+    """Minimal keep-alive HTTP/1.1 JSON client on asyncio streams."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def post(self, path, payload):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode()
+        self.writer.write(f"POST {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+                          f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while (line := await self.reader.readline()) not in (b"\r\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        return status, json.loads(await self.reader.readexactly(length))
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+
+
+async def kiosk(host, port, students, max_book, deadline, seed, issue_times, return_times, errors):
+    rng = random.Random(seed)
+    client = Client(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            status, body = await client.post("/issue", {"student_id": rng.choice(students),
+                                                        "book_ids": [rng.randint(1, max_book)]})
+            issue_times.append(time.perf_counter() - start)
+            outcome = body["outcomes"][0] if status == 200 else {"ok": False}
+            if not outcome["ok"]:
+                errors.append(body.get("error") or outcome.get("error"))
+                continue
+            start = time.perf_counter()
+            status, body = await client.post("/return", {"issue_ids": [outcome["issue_id"]]})
+            return_times.append(time.perf_counter() - start)
+            if status != 200 or not body["outcomes"][0]["ok"]:
+                errors.append(body)
+    finally:
+        client.close()
+
+
+async def load(host, port, students, max_book, kiosks, seconds):
+    issue_times, return_times, errors = [], [], []
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    await asyncio.gather(*(kiosk(host, port, students, max_book, deadline, seed, issue_times, return_times, errors)
+                           for seed in range(kiosks)))
+    return issue_times, return_times, errors, time.perf_counter() - start
+
+
+def start_server(db_file, workers, group_commit=True):
+    """Runs the API on an ephemeral port in a background thread; returns (host, port)."""
+    pool = ConnectionPool(db_file)
+    ensure_migrated(pool)
+    api = LibraryApi(pool, workers, api_key=None, write_queue=WriteQueue(pool) if group_commit else None)
+    listening = threading.Event()
+    address = []
+
+    def started(server):
+        address.extend(server.sockets[0].getsockname()[:2])
+        listening.set()
+
+    threading.Thread(target=asyncio.run, args=(serve(api, "127.0.0.1", 0, started),), daemon=True).start()
+    listening.wait()
+    return tuple(address)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="host:port of a running API (default: start one in-process)")
+    parser.add_argument("--db", help="database to copy for the in-process server (default: generate one)")
+    parser.add_argument("--workers", type=int, default=4, help="API worker threads (in-process server)")
+    parser.add_argument("--no-group-commit", action="store_true", help="in-process server commits every scan alone")
+    parser.add_argument("--kiosks", type=int, default=16, help="concurrent keep-alive clients")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--books", type=int, help="highest book_id to scan (default: from the database)")
+    parser.add_argument("--students", type=int, default=1000, help="student IDs to scan for")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.url:
+            host, _, port = args.url.rpartition(":")
+            host, port = host or "127.0.0.1", int(port)
+            max_book = args.books or 1000
+            students = [f"S{n:07d}" for n in range(1, args.students + 1)]
+        else:
+            db_file = os.path.join(tmp, "api_load.db")
+            if args.db:
+                shutil.copy(args.db, db_file)
+            else:
+                generate(db_file, books=5000, students=args.students, loans=20000, years=2, seed=1)
+            conn = sqlite3.connect(db_file)
+            max_book = args.books or conn.execute("SELECT MAX(book_id) FROM Books").fetchone()[0]
+            students = [r[0] for r in conn.execute("SELECT student_id FROM Student LIMIT ?", (args.students,))]
+            conn.close()
+            host, port = start_server(db_file, args.workers, not args.no_group_commit)
+
+        issue_times, return_times, errors, elapsed = asyncio.run(
+            load(host, port, students, max_book, args.kiosks, args.seconds))
+
+    print(f"{args.kiosks} kiosks, {elapsed:.1f} s, {len(errors)} scans refused (no copy left or unknown ID)")
+    print(f"{'request':<10} {'count':>8} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, times in (("issue", issue_times), ("return", return_times)):
+        if times:
+            print(f"{name:<10} {len(times):>8} {len(times) / elapsed:>9.1f} {percentile(times, 0.5) * 1000:>9.2f} "
+                  f"{percentile(times, 0.95) * 1000:>9.2f} {percentile(times, 0.99) * 1000:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
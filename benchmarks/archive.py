@@ -0,0 +1,104 @@
+"""Before/after measurements for archiving old returned loans (lms_archive).
+
+Generates a database with several years of loans, measures the live
+database size and the latency of the loan queries, archives every loan
+returned more than --older-than-days ago, compacts the live database and
+measures again. "full history" reads IssueTable alone before the archive
+run and IssueTable plus history.IssueHistory after it, as the student
+history page does.
+
+    python -m benchmarks.archive --loans 500000 --years 5
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.datagen import generate
+from benchmarks.harness import percentile
+from lms_archive import archive_pool, archive_report, archive_returned, ensure_archive
+from lms_circulation import issue_books, return_books
+from lms_fines import fines_summary_query
+from lms_queries import issue_history_conditions, issue_history_pager
+
+
+def cases(pool, include_archive):
+    conn = pool.reader()
+    max_book = conn.execute("SELECT MAX(book_id) FROM Books").fetchone()[0]
+    students = [r[0] for r in conn.execute("SELECT student_id FROM Student ORDER BY student_id LIMIT 5000")]
+
+    def student(rng):
+        return students[int(len(students) * rng.random() ** 2)]  # Busy students more often
+
+    def open_loans(rng):
+        conn.execute(*issue_history_pager().query(*issue_history_conditions(student(rng), "Not returned"))).fetchall()
+
+    def full_history(rng):
+        pager = issue_history_pager(include_archive=include_archive)
+        conn.execute(*pager.query(*issue_history_conditions(student(rng)))).fetchall()
+
+    def fines_summary(rng):
+        conn.execute(*fines_summary_query()).fetchall()
+
+    def issue_and_return(rng):
+        outcome = issue_books(pool, student(rng), [rng.randint(1, max_book)])[0]
+        if outcome.ok:
+            return_books(pool, [outcome.issue_id])
+
+    return {"open loans page": open_loans, "full history page": full_history,
+            "fines summary": fines_summary, "issue + return": issue_and_return}
+
+
+def measure(pool, include_archive, iterations, seed):
+    results = {}
+    for name, case in cases(pool, include_archive).items():
+        rng = random.Random(seed)
+        case(rng)
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            case(rng)
+            samples.append(time.perf_counter() - start)
+        results[name] = (percentile(samples, 0.5) * 1000, percentile(samples, 0.99) * 1000)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--books", type=int, default=20000)
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--loans", type=int, default=500000)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--older-than-days", type=int, default=365)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "live.db")
+        generate(db_file, args.books, args.students, args.loans, args.years, args.seed)
+        pool = archive_pool(db_file, os.path.join(tmp, "history.db"))
+        ensure_archive(pool)
+        pool.write_connection().execute("VACUUM main")  # Same starting point as after the run
+        before = archive_report(pool), measure(pool, False, args.iterations, args.seed)
+
+        stats = archive_returned(pool, args.older_than_days)
+        pool.write_connection().execute("VACUUM main")
+        after = archive_report(pool), measure(pool, True, args.iterations, args.seed)
+        pool.close_all()
+
+    print(f"Archived {stats.moved:,} loans in {stats.batches} batches ({stats.seconds:.1f} s)")
+    print(f"{'':<20} {'before':>16} {'after':>16}")
+    for key in ("live_loans", "open_loans", "archived_loans"):
+        print(f"{key:<20} {before[0][key]:>16,} {after[0][key]:>16,}")
+    for key in ("live_bytes", "archive_bytes"):
+        print(f"{key.replace('bytes', 'MiB'):<20} {before[0][key] / 2**20:>16.1f} {after[0][key] / 2**20:>16.1f}")
+    print(f"{'p50 / p99 ms':<20}")
+    for name, (p50, p99) in before[1].items():
+        new50, new99 = after[1][name]
+        print(f"{name:<20} {p50:>7.3f} / {p99:>6.3f} {new50:>7.3f} / {new99:>6.3f}")
+
+
+if __name__ == "__main__":
+    main()
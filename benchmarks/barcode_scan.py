@@ -0,0 +1,75 @@
+"""Scan-to-issue and scan-to-return latency against a large copy inventory.
+
+Generates a database (about three copies per book, so --books 700000 gives
+roughly 2M copies), then times issuing a shelf copy by barcode to a random
+student and returning it by barcode, each one transaction. Runs with the
+warmed ScanCache and without it (one barcode index lookup per scan). The
+target is under 5 ms per scan.
+
+    python -m benchmarks.barcode_scan --books 700000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.datagen import generate, student_id
+from benchmarks.harness import percentile
+from lms_circulation import issue_copies, return_copies
+from lms_db import ConnectionPool
+from lms_inventory import ScanCache
+
+
+def scan_cycle(pool, barcodes, students, cache, rng):
+    """Issues and returns each barcode once; returns (issue samples, return samples) in seconds."""
+    issues, returns = [], []
+    for barcode in barcodes:
+        start = time.perf_counter()
+        outcome = issue_copies(pool, student_id(rng.randint(1, students)), [barcode], cache=cache)[0]
+        issues.append(time.perf_counter() - start)
+        if not outcome.ok:
+            raise SystemExit(f"Scan failed: {outcome.error}")
+        start = time.perf_counter()
+        outcome = return_copies(pool, [barcode], cache=cache)[0]
+        returns.append(time.perf_counter() - start)
+        if not outcome.ok:
+            raise SystemExit(f"Scan failed: {outcome.error}")
+    return issues, returns
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--books", type=int, default=700000)
+    parser.add_argument("--students", type=int, default=50000)
+    parser.add_argument("--loans", type=int, default=1000000)
+    parser.add_argument("--scans", type=int, default=2000, help="copies issued and returned per mode")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "scan.db")
+        generate(db_file, args.books, args.students, args.loans, 2, args.seed)
+        pool = ConnectionPool(db_file)
+        conn = pool.reader()
+        copies = conn.execute("SELECT COUNT(*) FROM Copies").fetchone()[0]
+        shelf = [r[0] for r in conn.execute("SELECT barcode FROM Copies WHERE status = 'shelf'")]
+
+        cache = ScanCache()
+        start = time.perf_counter()
+        warmed = cache.warm(conn)
+        print(f"{copies:,} copies; ScanCache warmed with {warmed:,} barcodes in {time.perf_counter() - start:.2f} s")
+
+        rng = random.Random(args.seed)
+        print(f"{'mode':<22} {'issue p50/p99 ms':>18} {'return p50/p99 ms':>19}")
+        for label, scan_cache in (("warmed cache", cache), ("barcode index only", None)):
+            barcodes = rng.sample(shelf, args.scans)
+            issues, returns = scan_cycle(pool, barcodes, args.students, scan_cache, rng)
+            print(f"{label:<22} {percentile(issues, 0.5) * 1000:>8.3f} / {percentile(issues, 0.99) * 1000:>7.3f}"
+                  f" {percentile(returns, 0.5) * 1000:>8.3f} / {percentile(returns, 0.99) * 1000:>7.3f}")
+        print(f"cache hits {cache.hits:,}, misses {cache.misses:,}")
+        pool.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Staleness check for the query cache against commits from other connections.
+
+Reads go through the same steps as lms2.execute_query (sync, get, then
+snapshot, read and put on a miss), each on a new thread as Streamlit runs
+every rerun. Between reads another connection, standing in for another
+process such as lms_api or an import, inserts a row. The run fails if any
+read still returns the count from before the insert, or if one external
+commit flushes the cache more than once.
+
+Then the pool itself writes, as the app's issue and return do: a write to
+another table must leave the cached count in place, and a write to Books
+must invalidate it without flushing the rest of the cache.
+
+    python -m benchmarks.cache_sync --rounds 20
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+
+from lms_cache import QueryCache
+from lms_db import ConnectionPool
+
+COUNT = "SELECT COUNT(*) FROM Books"
+
+
+def cached_count(pool, cache):
+    """The read path of lms2.execute_query for one scalar query."""
+    cache.sync(pool.data_version())
+    result = cache.get(COUNT, ())
+    if result is None:
+        generations = cache.snapshot(COUNT)
+        result = pool.reader().execute(COUNT).fetchone()[0]
+        cache.put(COUNT, (), generations, result)
+    return result
+
+
+def on_new_thread(fn, *args):
+    result = []
+    worker = threading.Thread(target=lambda: result.append(fn(*args)))
+    worker.start()
+    worker.join()
+    return result[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--readers", type=int, default=4, help="new-thread reads after each external commit")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache.db")
+        external = sqlite3.connect(path)
+        external.execute("CREATE TABLE Books (book_id INTEGER PRIMARY KEY, title TEXT)")
+        external.execute("CREATE TABLE Admin (admin_id INTEGER PRIMARY KEY, username TEXT)")
+        external.commit()
+
+        pool = ConnectionPool(path)
+        cache = QueryCache()
+        pool.add_commit_listener(cache.invalidate)
+        stale = 0
+        on_new_thread(cached_count, pool, cache)  # Warm the cache before the first external commit
+        flushes = cache.stats()["epoch"]
+        for expected in range(1, args.rounds + 1):
+            external.execute("INSERT INTO Books (title) VALUES ('x')")
+            external.commit()
+            # The main thread (long-lived, like the API server), then one new thread per rerun
+            seen = [cached_count(pool, cache)] + [on_new_thread(cached_count, pool, cache) for _ in range(args.readers)]
+            stale += sum(count != expected for count in seen)
+        stats = cache.stats()
+        flushes = stats["epoch"] - flushes
+
+        # The pool's own commits: one to a table the count does not read, one to Books
+        own = []
+        for table, expected in (("Admin", args.rounds), ("Books", args.rounds + 1)):
+            with pool.writer() as conn:
+                conn.execute(f"INSERT INTO {table} DEFAULT VALUES")
+            misses = cache.stats()["misses"]
+            count = on_new_thread(cached_count, pool, cache)
+            own.append((table, count == expected, cache.stats()["misses"] - misses))
+        own_flushes = cache.stats()["epoch"] - stats["epoch"]
+        pool.close_all()
+        external.close()
+
+    print(f"{args.rounds} external commits, {args.rounds * (args.readers + 1)} reads: {stale} stale, "
+          f"{flushes} flushes, cache hits {stats['hits']}, misses {stats['misses']}")
+    for table, fresh, misses in own:
+        print(f"pool write to {table}: count {'fresh' if fresh else 'STALE'}, {misses} cache misses")
+    print(f"pool writes: {own_flushes} flushes")
+    if stale or flushes != args.rounds:
+        raise SystemExit("FAIL: the query cache missed or over-counted commits from another connection")
+    if own_flushes or not all(fresh for _, fresh, _ in own) or [misses for _, _, misses in own] != [0, 1]:
+        raise SystemExit("FAIL: the pool's own writes flushed the cache or did not invalidate by table")
+    print("OK: every read after an external commit was fresh, the pool's writes invalidated only what they touched")
+
+
+if __name__ == "__main__":
+    main()
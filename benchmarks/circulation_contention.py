@@ -0,0 +1,129 @@
+"""Contention check and throughput benchmark for the circulation engine.
+
+Many desks race to issue the same few titles. The run fails if more loans
+are recorded than copies existed (a lost update) or if copies_available ever
+disagrees with the open loans. The old read-modify-write sequence from
+issue_book_form is run alongside for comparison.
+
+    python -m benchmarks.circulation_contention --desks 8 --copies 200
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from lms_circulation import issue_books, return_books
+from lms_db import ConnectionPool
+from lms_inventory import add_copies
+from lms_migrations import migrate
+
+
+def build_db(path, titles, copies, students):
+    """The app's schema with ``titles`` books of ``copies`` copies each and ``students`` students."""
+    pool = ConnectionPool(path)
+    migrate(pool)
+    with pool.writer() as conn:
+        for i in range(1, titles + 1):
+            conn.execute("INSERT INTO Books VALUES (?, ?, 'Author', 'Pub', 2020, 0, 0)", (i, f"Title {i}"))
+            add_copies(conn, i, copies)
+        conn.executemany("INSERT INTO Student VALUES (?, ?, 'x')", ((f"S{i:05d}", f"Student {i}") for i in range(students)))
+    pool.close_all()
+
+
+def naive_issue(conn, book_id, student_id):
+    """The pre-engine issue_book_form: read, decide in Python, write back."""
+    row = conn.execute("SELECT copies_available FROM Books WHERE book_id = ?", (book_id,)).fetchone()
+    if row is None or row[0] <= 0:
+        return False
+    with conn:
+        conn.execute("INSERT INTO IssueTable (book_id, student_id, issue_date, due_date, is_returned) "
+                     "VALUES (?, ?, date('now'), date('now', '+15 days'), 0)", (book_id, student_id))
+    time.sleep(0)  # Let another desk run between the read and the write, as Streamlit threads do
+    with conn:
+        conn.execute("UPDATE Books SET copies_available = ? WHERE book_id = ?", (row[0] - 1, book_id))
+    return True
+
+
+def race(path, desks, titles, batch, naive):
+    pool = ConnectionPool(path)
+    issued = [0] * desks
+
+    def desk(idx):
+        student_id = f"S{idx:05d}"
+        conn = sqlite3.connect(path, timeout=30) if naive else None
+        offset = idx
+        misses = 0  # Titles asked for in a row without getting a copy
+        while misses < titles:  # Stop once every title has come up empty since the last success
+            wanted = [((offset + k) % titles) + 1 for k in range(batch)]
+            offset += batch
+            if naive:
+                got = sum(naive_issue(conn, book_id, student_id) for book_id in wanted)
+            else:
+                got = sum(o.ok for o in issue_books(pool, student_id, wanted))
+            misses = 0 if got else misses + batch
+            issued[idx] += got
+
+    threads = [threading.Thread(target=desk, args=(i,)) for i in range(desks)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    pool.close_all()
+    return sum(issued), elapsed
+
+
+def check(path, titles, copies):
+    conn = sqlite3.connect(path)
+    loans = conn.execute("SELECT COUNT(*) FROM IssueTable WHERE is_returned = 0").fetchone()[0]
+    mismatched = conn.execute("""
+        SELECT COUNT(*) FROM Books b
+        WHERE b.copies_available != b.total_copies
+            - (SELECT COUNT(*) FROM IssueTable it WHERE it.book_id = b.book_id AND it.is_returned = 0)
+    """).fetchone()[0]
+    conn.close()
+    return loans, loans - titles * copies, mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--desks", type=int, default=8)
+    parser.add_argument("--titles", type=int, default=5)
+    parser.add_argument("--copies", type=int, default=200)
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 10])
+    args = parser.parse_args()
+
+    runs = [("naive", 1, True)] + [(f"engine batch={b}", b, False) for b in args.batch]
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'mode':<18} {'issued':>7} {'over-issued':>12} {'mismatched':>11} {'issues/s':>10}")
+        for label, batch, naive in runs:
+            path = os.path.join(tmp, f"{label.replace(' ', '_')}.db")
+            build_db(path, args.titles, args.copies, args.desks)
+            issued, elapsed = race(path, args.desks, args.titles, batch, naive)
+            loans, over, mismatched = check(path, args.titles, args.copies)
+            print(f"{label:<18} {loans:>7} {over:>12} {mismatched:>11} {issued / elapsed:>10.1f}")
+            if not naive and (over > 0 or mismatched):
+                failed = True
+
+        # Drop-box return of every open loan in one commit.
+        pool = ConnectionPool(path)
+        open_ids = [r[0] for r in pool.reader().execute("SELECT issue_id FROM IssueTable WHERE is_returned = 0")]
+        start = time.perf_counter()
+        returned = sum(o.ok for o in return_books(pool, open_ids))
+        elapsed = time.perf_counter() - start
+        pool.close_all()
+        loans, _, mismatched = check(path, args.titles, args.copies)
+        print(f"{'bulk return':<18} {returned:>7} {'':>12} {mismatched:>11} {returned / elapsed:>10.1f}")
+        failed = failed or loans or mismatched
+
+    if failed:
+        raise SystemExit("FAIL: lost updates detected in the circulation engine")
+    print("OK: no lost updates")
+
+
+if __name__ == "__main__":
+    main()
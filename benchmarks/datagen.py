@@ -0,0 +1,136 @@
+"""Synthetic database generator with the app's schema and realistic skew.
+
+Book popularity and student activity follow a power law (a few titles and
+students account for most loans), loans are spread over several years in
+issue order, older loans are almost all returned with fines for late
+returns, and copy counts agree with the open loans.
+
+    python -m benchmarks.datagen bench.db --books 1000000 --students 200000 --loans 20000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+
+from lms_db import ConnectionPool
+from lms_fines import DEFAULT_POLICY
+from lms_migrations import migrate
+
+CHUNK = 100000
+LOAN_DAYS = 15
+
+WORDS = ("history data river garden shadow empire python music ocean silent winter machine theory market "
+         "journey stone letters modern light forest secret island algebra biology chemistry physics poetry "
+         "kingdom night city mountain storm glass memory engine dream fire").split()
+FIRST = "Aarav Priya Rahul Ananya John Maria Wei Yuki Olu Fatima Lukas Sofia Diego Amara Ivan Mei".split()
+LAST = "Sharma Rao Smith Garcia Chen Müller Okafor Tanaka Silva Novak Haddad Kumar Das Iyer Brown".split()
+PUBLISHERS = [f"{w.title()} Press" for w in WORDS[:20]]
+
+
+def skewed(rng, n, skew):
+    """1-based ID in [1, n], heavily biased towards low IDs for skew > 1."""
+    return 1 + int(n * rng.random() ** skew)
+
+
+def student_id(number):
+    return f"S{number:07d}"
+
+
+def generate(path, books, students, loans, years, seed, today=None):
+    today = today or date.today()
+    rng = random.Random(seed)
+    if os.path.exists(path):
+        sys.exit(f"{path} already exists")
+
+    # Base tables only; search index and secondary indexes are built after loading.
+    pool = ConnectionPool(path)
+    migrate(pool, target=1)
+    pool.close_all()
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA synchronous = OFF")
+    started = time.perf_counter()
+
+    def load(table, sql, rows, total):
+        batch = []
+        for count, row in enumerate(rows, 1):
+            batch.append(row)
+            if len(batch) == CHUNK or count == total:
+                conn.executemany(sql, batch)
+                conn.commit()
+                batch.clear()
+                print(f"\r{table}: {count:,}/{total:,}", end="", file=sys.stderr, flush=True)
+        print(file=sys.stderr)
+
+    load("Books", "INSERT INTO Books VALUES (?, ?, ?, ?, ?, ?, ?)", (
+        (i, f"{' '.join(rng.choices(WORDS, k=rng.randint(1, 4))).title()} {i}",
+         f"{rng.choice(FIRST)} {rng.choice(LAST)}", rng.choice(PUBLISHERS), rng.randint(1950, today.year),
+         copies, copies)
+        for i in range(1, books + 1) for copies in (rng.randint(1, 5),)), books)
+
+    load("Student", "INSERT INTO Student VALUES (?, ?, ?)", (
+        (student_id(i), f"{rng.choice(FIRST)} {rng.choice(LAST)}", f"pw{i}") for i in range(1, students + 1)),
+        students)
+
+    span = years * 365
+    first_day = today - timedelta(days=span)
+    days = [(first_day + timedelta(days=d)).isoformat() for d in range(span + LOAN_DAYS + 60)]
+    today_index = span
+
+    def loan_rows():
+        for i in range(loans):
+            issued = min(int(i * span / loans) + rng.randint(0, 2), span)
+            due = issued + LOAN_DAYS
+            # Loans older than six weeks are nearly all back; recent ones are mostly still out.
+            returned = rng.random() < (0.99 if today_index - issued > 42 else 0.3)
+            if returned:
+                back = min(issued + rng.randint(1, LOAN_DAYS + 20), today_index)
+                fine = max(back - due - DEFAULT_POLICY.grace_days, 0) * DEFAULT_POLICY.rate_per_day
+                yield (skewed(rng, books, 3), student_id(skewed(rng, students, 2)), days[issued], days[due],
+                       days[back], fine, 1)
+            else:
+                yield (skewed(rng, books, 3), student_id(skewed(rng, students, 2)), days[issued], days[due],
+                       None, 0.0, 0)
+
+    load("IssueTable", "INSERT INTO IssueTable (book_id, student_id, issue_date, due_date, return_date, "
+         "fine_amount, is_returned) VALUES (?, ?, ?, ?, ?, ?, ?)", loan_rows(), loans)
+
+    # Make copy counts agree with the open loans: popular titles get enough copies.
+    conn.executescript("""
+    CREATE TEMP TABLE open_loans (book_id INTEGER PRIMARY KEY, n INTEGER NOT NULL);
+    INSERT INTO open_loans SELECT book_id, COUNT(*) FROM IssueTable WHERE is_returned = 0 GROUP BY book_id;
+    UPDATE Books SET
+        total_copies = MAX(total_copies, (SELECT n FROM open_loans o WHERE o.book_id = Books.book_id)),
+        copies_available = MAX(total_copies, (SELECT n FROM open_loans o WHERE o.book_id = Books.book_id))
+            - (SELECT n FROM open_loans o WHERE o.book_id = Books.book_id)
+    WHERE book_id IN (SELECT book_id FROM open_loans);
+    DROP TABLE open_loans;
+    """)
+    conn.commit()
+    conn.close()
+
+    # Remaining migrations build the search index, secondary indexes and any derived tables.
+    pool = ConnectionPool(path)
+    applied = migrate(pool)
+    pool.close_all()
+    print(f"{path}: {books:,} books, {students:,} students, {loans:,} loans in "
+          f"{time.perf_counter() - started:.0f} s (migrations {applied} applied after loading)", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output", help="new SQLite database file")
+    parser.add_argument("--books", type=int, default=1000000)
+    parser.add_argument("--students", type=int, default=200000)
+    parser.add_argument("--loans", type=int, default=20000000)
+    parser.add_argument("--years", type=int, default=5, help="years of circulation history")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    generate(args.output, args.books, args.students, args.loans, args.years, args.seed)
+
+
+if __name__ == "__main__":
+    main()
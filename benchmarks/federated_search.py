@@ -0,0 +1,64 @@
+"""Federated search latency as the number of branch shards grows.
+
+Builds N branch databases with the same number of books each and times
+BranchRegistry.search over 1, 2, 4, ... shards against searching the same
+shards one after another. Parallel fan-out keeps latency close to the
+slowest shard as long as there are cores to run the shards on (SQLite
+releases the GIL while it executes).
+
+    python -m benchmarks.federated_search --shards 1 2 4 8 --books 50000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.fts_search import TERMS, build_db
+from benchmarks.harness import percentile
+from lms_branches import SEARCH_COLUMNS, BranchRegistry
+from lms_db import ConnectionPool
+from lms_search import search_query
+
+
+def sequential(registry, term):
+    query = search_query(term, SEARCH_COLUMNS, with_score=True)
+    for pool in registry.pools.values():
+        pool.reader().execute(*query).fetchall()
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        for term in TERMS[:-1]:
+            start = time.perf_counter()
+            fn(term)
+            samples.append(time.perf_counter() - start)
+    return percentile(samples, 0.5) * 1000, percentile(samples, 0.99) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--books", type=int, default=50000, help="books per shard")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.books:,} books per shard")
+    print(f"{'shards':>6} {'federated p50/p99 ms':>22} {'sequential p50/p99 ms':>23} {'hits':>6}")
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for n in range(max(args.shards)):
+            paths.append(os.path.join(tmp, f"branch{n}.db"))
+            build_db(paths[-1], args.books).close()
+        for count in args.shards:
+            registry = BranchRegistry({f"B{n}": ConnectionPool(path) for n, path in enumerate(paths[:count])})
+            hits = len(registry.search(TERMS[0], timeout=60).hits)
+            fed = timed(lambda term: registry.search(term, timeout=60), args.repeat)
+            seq = timed(lambda term: sequential(registry, term), args.repeat)
+            print(f"{count:>6} {fed[0]:>12.2f} / {fed[1]:>7.2f} {seq[0]:>13.2f} / {seq[1]:>7.2f} {hits:>6}")
+            for pool in registry.pools.values():
+                pool.close_all()
+
+
+if __name__ == "__main__":
+    main()
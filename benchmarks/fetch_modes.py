@@ -0,0 +1,114 @@
+"""Microbenchmark of the lms_fetch result modes against Row -> dict -> DataFrame.
+
+Each mode reads the first N rows of a Books-shaped table at N = 1, 1k and
+1M, through a pooled read connection (row_factory = sqlite3.Row, as in the
+app). Reports the median time per call and the peak Python memory
+allocated during one call (tracemalloc). Modes whose library is missing
+(pandas for the DataFrame modes) are skipped.
+
+    python -m benchmarks.fetch_modes
+    python -m benchmarks.fetch_modes --sizes 1 1000 --repeat 20
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from lms_db import ConnectionPool
+from lms_fetch import fetch_columns, fetch_frame, fetch_lists, fetch_one, fetch_scalar
+
+QUERY = "SELECT book_id, title, author, year, copies_available FROM Books ORDER BY book_id LIMIT ?"
+
+
+def build_db(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute("""CREATE TABLE Books (book_id INTEGER PRIMARY KEY, title TEXT, author TEXT,
+                    year INTEGER, copies_available INTEGER)""")
+    conn.executemany("INSERT INTO Books VALUES (?, ?, ?, ?, ?)",
+                     ((i, f"Title {i}", f"Author {i % 997}", 1950 + i % 70, i % 5) for i in range(1, rows + 1)))
+    conn.commit()
+    conn.close()
+
+
+def legacy_frame(conn, query, params):
+    """The pre-lms_fetch _fetch_dataframe: every Row becomes a dict, then a DataFrame."""
+    import pandas as pd
+
+    data = conn.execute(query, params).fetchall()
+    return pd.DataFrame([dict(row) for row in data]) if data else pd.DataFrame()
+
+
+def row_dicts(conn, query, params):
+    """The same without pandas: the per-row dicts the DataFrame was built from."""
+    return [dict(row) for row in conn.execute(query, params).fetchall()]
+
+
+def row_objects(conn, query, params):
+    return conn.execute(query, params).fetchall()
+
+
+MODES = [
+    ("Row -> dict -> DataFrame", legacy_frame, "pandas"),
+    ("Row -> dict", row_dicts, None),
+    ("sqlite3.Row fetchall", row_objects, None),
+    ("scalar", fetch_scalar, None),
+    ("one", fetch_one, None),
+    ("lists", fetch_lists, None),
+    ("columns", fetch_columns, None),
+    ("frame", fetch_frame, "pandas"),
+]
+
+
+def available(module):
+    try:
+        __import__(module)
+        return True
+    except ImportError:
+        return False
+
+
+def measure(fn, conn, params, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(conn, QUERY, params)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn(conn, QUERY, params)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(times), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 1000, 1000000])
+    parser.add_argument("--repeat", type=int, default=5, help="timed calls per mode and size (1 for 1M rows)")
+    args = parser.parse_args()
+
+    numpy = "NumPy arrays" if available("numpy") else "lists (NumPy not installed)"
+    print(f"columns mode returns {numpy}")
+    print(f"{'rows':>9} {'mode':<26} {'median ms':>10} {'us/row':>8} {'peak KiB':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "fetch.db")
+        build_db(path, max(args.sizes))
+        pool = ConnectionPool(path)
+        conn = pool.reader()
+        for size in args.sizes:
+            repeat = 1 if size >= 1000000 else args.repeat
+            for label, fn, needs in MODES:
+                if label in ("scalar", "one") and size > 1:
+                    continue  # Single-row modes only read the first row
+                if needs and not available(needs):
+                    print(f"{size:>9} {label:<26} {'skipped (' + needs + ' not installed)':>30}")
+                    continue
+                seconds, peak = measure(fn, conn, (size,), repeat)
+                print(f"{size:>9} {label:<26} {seconds * 1000:>10.3f} {seconds * 1e6 / size:>8.2f} {peak / 1024:>10.0f}")
+        pool.close_all()
+
+
+if __name__ == "__main__":
+    main()
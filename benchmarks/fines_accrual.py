@@ -0,0 +1,88 @@
+"""Fine accrual over every open loan: per-row Python vs one SQL statement.
+
+Builds a database of open loans with scattered due dates, then times the
+per-row arithmetic return_book_form used, the SQL aggregate and nightly
+snapshot from lms_fines and, if pandas is installed, the vectorized
+FinePolicy.accrue used by the issue-history page.
+
+    python -m benchmarks.fines_accrual --loans 5000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from lms_db import ConnectionPool
+from lms_fines import FinePolicy, fines_summary_query, snapshot_accruals
+from lms_migrations import migrate
+
+TODAY = date(2025, 6, 1)
+
+
+def build_db(pool, loans):
+    rng = random.Random(loans)
+    with pool.writer() as conn:
+        conn.execute("INSERT INTO Student VALUES ('S0', 'Student', 'x')")
+        conn.execute("INSERT INTO Books VALUES (1, 'Title', 'Author', 'Pub', 2020, 0, 1)")
+    batch = 100000
+    for start in range(0, loans, batch):
+        rows = []
+        for _ in range(min(batch, loans - start)):
+            due = TODAY + timedelta(days=rng.randint(-60, 15))
+            rows.append((1, f"S{rng.randint(0, 199999)}", (due - timedelta(days=15)).isoformat(), due.isoformat()))
+        with pool.writer() as conn:
+            conn.executemany("INSERT INTO IssueTable (book_id, student_id, issue_date, due_date, is_returned) "
+                             "VALUES (?, ?, ?, ?, 0)", rows)
+
+
+def timed(label, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"{label:<34} {time.perf_counter() - start:>9.3f} s   {result}")
+
+
+def per_row(conn, policy):
+    total = 0.0
+    for (due_date,) in conn.execute("SELECT due_date FROM IssueTable WHERE is_returned = 0"):
+        days_overdue = (TODAY - date.fromisoformat(due_date)).days
+        if days_overdue > policy.grace_days:
+            fine = (days_overdue - policy.grace_days) * policy.rate_per_day
+            total += fine if policy.max_fine is None else min(fine, policy.max_fine)
+    return f"total={total:.2f}"
+
+
+def vectorized(conn, policy):
+    import pandas as pd
+    df = pd.read_sql_query("SELECT due_date FROM IssueTable WHERE is_returned = 0", conn)
+    days = (pd.Timestamp(TODAY) - pd.to_datetime(df['due_date'])).dt.days
+    return f"total={policy.accrue(days).sum():.2f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--loans", type=int, default=5000000)
+    args = parser.parse_args()
+    policy = FinePolicy(rate_per_day=5.0, grace_days=2, max_fine=200.0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = ConnectionPool(os.path.join(tmp, "fines.db"))
+        migrate(pool)
+        start = time.perf_counter()
+        build_db(pool, args.loans)
+        print(f"built {args.loans} open loans in {time.perf_counter() - start:.1f} s\n")
+        conn = pool.reader()
+
+        timed("per-row Python loop", lambda: per_row(conn, policy))
+        timed("SQL aggregate (fines_summary)", lambda: dict(conn.execute(*fines_summary_query(policy, TODAY)).fetchone()))
+        timed("nightly snapshot (rows written)", lambda: snapshot_accruals(pool, policy, TODAY))
+        try:
+            timed("pandas FinePolicy.accrue", lambda: vectorized(conn, policy))
+        except ImportError:
+            print("pandas FinePolicy.accrue            skipped (pandas not installed)")
+        pool.close_all()
+
+
+if __name__ == "__main__":
+    main()
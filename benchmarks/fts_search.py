@@ -0,0 +1,71 @@
+"""Catalog search latency: LIKE '%term%' scan vs the FTS5 index.
+
+Builds a synthetic Books table at each size, then times the query
+view_books used to run against the BM25-ranked FTS5 query it runs now.
+
+    python -m benchmarks.fts_search --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from lms_search import ensure_search_index, search_query
+
+WORDS = ("history data river garden shadow empire python music ocean silent winter machine "
+         "theory market journey stone letters modern light forest secret island").split()
+SURNAMES = "Sharma Rao Smith Garcia Chen Müller Okafor Tanaka Silva Novak Haddad Kumar".split()
+TERMS = ["river", "shad", "modern theory", "Tanaka", "secret isl", "zzz"]
+COLUMNS = ["book_id", "title", "author", "publisher", "year", "copies_available"]
+LIKE = ("SELECT book_id, title, author, publisher, year, copies_available FROM Books "
+        "WHERE title LIKE ? OR author LIKE ?")
+
+
+def build_db(path, rows):
+    rng = random.Random(rows)
+    conn = sqlite3.connect(path)
+    conn.execute("""
+    CREATE TABLE Books (
+        book_id INTEGER PRIMARY KEY, title TEXT NOT NULL, author TEXT NOT NULL,
+        publisher TEXT, year INTEGER, copies_available INTEGER NOT NULL, total_copies INTEGER NOT NULL
+    )""")
+    conn.executemany("INSERT INTO Books VALUES (?, ?, ?, ?, ?, ?, ?)", (
+        (i, " ".join(rng.choices(WORDS, k=rng.randint(2, 5))).title() + f" {i}",
+         f"{rng.choice(SURNAMES)} {rng.choice(SURNAMES)}", f"Press {i % 50}", 1950 + i % 75, 1, 1)
+        for i in range(1, rows + 1)))
+    ensure_search_index(conn)
+    conn.commit()
+    return conn
+
+
+def timed(conn, query, params, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(query, params).fetchall()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'term':<14} {'LIKE ms':>9} {'FTS ms':>9} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.sizes:
+            conn = build_db(os.path.join(tmp, f"books_{rows}.db"), rows)
+            for term in TERMS:
+                like = timed(conn, LIKE, (f"%{term}%", f"%{term}%"), args.repeat)
+                fts = timed(conn, *search_query(term, COLUMNS), args.repeat)
+                print(f"{rows:>9} {term:<14} {like:>9.2f} {fts:>9.2f} {like / fts:>7.1f}x")
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Commits per second with and without the group-commit write queue.
+
+Desk threads each issue and return single books as fast as they can, waiting
+for every operation to finish as a Streamlit form would. Without the queue
+each operation is its own transaction; with it, operations from all desks
+share group commits. Both are run at every durability level.
+
+    python -m benchmarks.group_commit --desks 16 --ops 200
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from benchmarks.circulation_contention import build_db
+from lms_circulation import issue_books, return_books
+from lms_db import ConnectionPool
+from lms_writequeue import SYNCHRONOUS, WriteQueue
+
+
+def circulate(run, student_id, book_id):
+    outcome = run(issue_books, student_id, [book_id])[0]
+    if outcome.ok:
+        run(return_books, [outcome.issue_id])
+
+
+def race(path, desks, ops, titles, durability, grouped):
+    pool = ConnectionPool(path)
+    write_queue = WriteQueue(pool, durability=durability) if grouped else None
+    if grouped:
+        def run(fn, *args):
+            return write_queue.submit(fn, *args).result()
+    else:
+        pool.pragmas["synchronous"] = SYNCHRONOUS[durability]
+
+        def run(fn, *args):
+            return fn(pool, *args)
+
+    def desk(idx):
+        for k in range(ops):
+            circulate(run, f"S{idx:05d}", (idx * ops + k) % titles + 1)
+
+    threads = [threading.Thread(target=desk, args=(i,)) for i in range(desks)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    operations = desks * ops * 2
+    commits = write_queue.commits if grouped else operations
+    if grouped:
+        write_queue.close()
+    pool.close_all()
+    return operations, commits, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--desks", type=int, default=16)
+    parser.add_argument("--ops", type=int, default=200, help="issue+return pairs per desk")
+    parser.add_argument("--titles", type=int, default=50)
+    parser.add_argument("--durability", nargs="+", choices=list(SYNCHRONOUS), default=["full", "normal"])
+    args = parser.parse_args()
+
+    print(f"{'durability':<11} {'mode':<9} {'operations':>10} {'commits':>8} {'ops/s':>9} {'commits/s':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for durability in args.durability:
+            for grouped in (False, True):
+                path = os.path.join(tmp, f"{durability}_{grouped}.db")
+                build_db(path, args.titles, args.desks, args.desks)
+                operations, commits, elapsed = race(path, args.desks, args.ops, args.titles, durability, grouped)
+                print(f"{durability:<11} {'grouped' if grouped else 'single':<9} {operations:>10} {commits:>8} "
+                      f"{operations / elapsed:>9.0f} {commits / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""Benchmark harness for the app's query paths, run without Streamlit.
+
+Runs the same queries view_books, student_view_available,
+student_view_issued, issue_book_form and return_book_form run (built by
+lms_queries, lms_search and lms_circulation) against a database from
+benchmarks.datagen, and reports p50/p99 latency and throughput per path.
+Results can be saved as a baseline and later runs compared against it;
+the comparison exits non-zero on a regression.
+
+    python -m benchmarks.harness bench.db --save-baseline benchmarks/baseline.json
+    python -m benchmarks.harness bench.db --compare benchmarks/baseline.json
+
+Issue/return cases write to the database (each issued copy is returned again).
+The history database (--archive, created empty if missing) is attached as in
+the app, so the issue-history cases read archived loans as well.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import time
+
+from lms_archive import archive_pool, ensure_archive
+from lms_circulation import issue_books, return_books
+from lms_pagination import PageCursor
+from lms_queries import (
+    AVAILABLE_COLUMNS, CATALOG_COLUMNS, catalog_conditions, catalog_pager, catalog_search,
+    issue_history_conditions, issue_history_pager,
+)
+
+SEARCH_TERMS = ["river", "shad", "modern theory", "Tanaka", "secret isl", "poetry night", "Sharma", "alg"]
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class Cases:
+    """Each case method takes a Random and runs one request's worth of queries."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.conn = pool.reader()
+        self.max_book = self.conn.execute("SELECT MAX(book_id) FROM Books").fetchone()[0]
+        self.students = [r[0] for r in self.conn.execute("SELECT student_id FROM Student ORDER BY student_id LIMIT 5000")]
+        self.issued = []  # issue IDs created by the issue case, returned by the return case
+
+    def fetch(self, query, params):
+        return self.conn.execute(query, params).fetchall()
+
+    def page(self, pager, conditions, params, cursor=None):
+        return self.fetch(*pager.query(conditions, params, cursor))
+
+    def _history(self, student, show):
+        # As student_view_issued: archived loans are all returned, so "Not returned" reads IssueTable alone
+        self.page(issue_history_pager(include_archive=show != "Not returned"), *issue_history_conditions(student, show))
+
+    def view_books_first_page(self, rng):
+        self.page(catalog_pager(CATALOG_COLUMNS, "Title"), [], [])
+
+    def view_books_deep_page(self, rng):
+        book_id = rng.randint(1, self.max_book)
+        row = self.conn.execute("SELECT title FROM Books WHERE book_id >= ? LIMIT 1", (book_id,)).fetchone()
+        self.page(catalog_pager(CATALOG_COLUMNS, "Title"), [], [], PageCursor((row[0], book_id)))
+
+    def view_books_search(self, rng):
+        self.fetch(*catalog_search(rng.choice(SEARCH_TERMS), CATALOG_COLUMNS))
+
+    def view_books_search_by_year(self, rng):
+        conditions, params = catalog_conditions(rng.choice(SEARCH_TERMS))
+        self.page(catalog_pager(CATALOG_COLUMNS, "Year", descending=True), conditions, params)
+
+    def student_view_available_search(self, rng):
+        self.fetch(*catalog_search(rng.choice(SEARCH_TERMS), AVAILABLE_COLUMNS, available_only=True))
+
+    def student_view_available_browse(self, rng):
+        conditions, params = catalog_conditions("", available_only=True)
+        self.page(catalog_pager(AVAILABLE_COLUMNS, "Book ID"), conditions, params)
+
+    def student_view_issued(self, rng):
+        student = self.students[int(len(self.students) * rng.random() ** 2)]
+        self.fetch("SELECT student_name FROM Student WHERE student_id = ?", (student,))
+        self._history(student, "All")
+
+    def student_view_issued_open(self, rng):
+        student = self.students[int(len(self.students) * rng.random() ** 2)]
+        self._history(student, "Not returned")
+
+    def issue_book_form(self, rng):
+        for outcome in issue_books(self.pool, rng.choice(self.students), [rng.randint(1, self.max_book)]):
+            if outcome.ok:
+                self.issued.append(outcome.issue_id)
+
+    def return_book_form(self, rng):
+        if self.issued:
+            return_books(self.pool, [self.issued.pop()])
+
+
+CASES = [name for name in vars(Cases) if not name.startswith("_") and name not in ("fetch", "page")]
+
+
+def run(db_file, iterations, seed, only=None, archive_file=None):
+    pool = archive_pool(db_file, archive_file or history_file(db_file))
+    ensure_archive(pool)
+    cases = Cases(pool)
+    results = {}
+    for name in CASES:
+        if only and name not in only:
+            continue
+        rng = random.Random(seed)
+        case = getattr(cases, name)
+        case(rng)  # Warm-up: statement cache and page cache
+        samples = []
+        began = time.perf_counter()
+        for _ in range(iterations):
+            start = time.perf_counter()
+            case(rng)
+            samples.append(time.perf_counter() - start)
+        elapsed = time.perf_counter() - began
+        results[name] = {
+            "p50_ms": percentile(samples, 0.50) * 1000,
+            "p99_ms": percentile(samples, 0.99) * 1000,
+            "ops_per_s": iterations / elapsed,
+        }
+    while cases.issued:  # Put back anything the return case did not get to
+        cases.return_book_form(None)
+    pool.close_all()
+    return results
+
+
+def history_file(db_file):
+    """Default history database of a benchmark database: bench.db -> bench_history.db."""
+    return f"{os.path.splitext(db_file)[0]}_history.db"
+
+
+def compare(results, baseline, threshold, min_delta_ms=1.0):
+    """Returns (name, metric, before, after) for every metric worse than the baseline.
+
+    A metric regresses when it is more than ``threshold`` (relative) and
+    ``min_delta_ms`` (absolute, per operation) worse; the absolute floor
+    keeps scheduler noise on sub-millisecond queries from failing the run.
+    """
+    regressions = []
+    for name, now in results.items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        for metric in ("p50_ms", "p99_ms"):
+            if now[metric] > before[metric] * (1 + threshold) and now[metric] - before[metric] > min_delta_ms:
+                regressions.append((name, metric, before[metric], now[metric]))
+        ms_before, ms_now = 1000 / before["ops_per_s"], 1000 / now["ops_per_s"]
+        if ms_now > ms_before * (1 + threshold) and ms_now - ms_before > min_delta_ms:
+            regressions.append((name, "ops_per_s", before["ops_per_s"], now["ops_per_s"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("db", help="database built by benchmarks.datagen")
+    parser.add_argument("--archive", help="history database (default: <db>_history.db next to the database)")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--case", action="append", choices=CASES, help="run only this case (repeatable)")
+    parser.add_argument("--save-baseline", metavar="JSON")
+    parser.add_argument("--compare", metavar="JSON", help="baseline to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown (default 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    results = run(args.db, args.iterations, args.seed, args.case, args.archive)
+    print(f"{'case':<34} {'p50 ms':>9} {'p99 ms':>9} {'ops/s':>10}")
+    for name, r in results.items():
+        print(f"{name:<34} {r['p50_ms']:>9.3f} {r['p99_ms']:>9.3f} {r['ops_per_s']:>10.1f}")
+
+    if args.save_baseline:
+        counts = sqlite3.connect(args.db).execute(
+            "SELECT (SELECT COUNT(*) FROM Books), (SELECT COUNT(*) FROM Student), (SELECT COUNT(*) FROM IssueTable)"
+        ).fetchone()
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "db": {"books": counts[0], "students": counts[1], "loans": counts[2]},
+                "python": platform.python_version(),
+                "sqlite": sqlite3.sqlite_version,
+                "iterations": args.iterations,
+                "results": results,
+            }, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        for name, metric, before, after in regressions:
+            print(f"REGRESSION {name} {metric}: {before:.3f} -> {after:.3f}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Hold queue costs at growing queue depths (lms_holds).
+
+For each depth, fills Holds with that many waiting holds on the most popular
+books (10% faculty), then measures:
+
+    return        return_books on a held book; the copy goes to the next hold
+    position      a student's queue position (student_holds_query)
+    sweep         expire_holds with 1% of the holds past their deadline
+
+Return latency should stay flat as the queue grows, because the next hold
+is found with one descent of idx_holds_queue.
+
+    python -m benchmarks.holds --depths 0 1000 100000
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import date, timedelta
+
+from benchmarks.datagen import generate, skewed, student_id
+from benchmarks.harness import percentile
+from lms_circulation import return_books
+from lms_db import ConnectionPool
+from lms_holds import expire_holds, student_holds_query
+from lms_inventory import add_copies
+
+HELD_BOOKS = 100
+
+
+def fill(pool, depth, students, iterations, today, rng):
+    """Adds ``depth`` waiting holds and ``iterations`` open loans of held books (each of a new copy).
+
+    Returns (issue IDs, students with holds).
+    """
+    expires = (today + timedelta(days=30)).isoformat()
+    expired = (today - timedelta(days=1)).isoformat()
+    holds = [(skewed(rng, HELD_BOOKS, 2), student_id(rng.randint(1, students)), int(rng.random() >= 0.1),
+              today.isoformat(), expired if rng.random() < 0.01 else expires) for _ in range(depth)]
+    with pool.writer() as conn:
+        conn.executemany(
+            "INSERT INTO Holds (book_id, student_id, priority, placed_date, status, expires) VALUES (?, ?, ?, ?, 'waiting', ?)",
+            holds)
+        issue_ids = []
+        for _ in range(iterations):
+            book_id = skewed(rng, HELD_BOOKS, 2)
+            (copy_id, _), = add_copies(conn, book_id, 1, status="loaned")
+            issue_ids.append(conn.execute(
+                "INSERT INTO IssueTable (book_id, student_id, issue_date, due_date, is_returned, copy_id) "
+                "VALUES (?, ?, ?, ?, 0, ?)",
+                (book_id, student_id(rng.randint(1, students)), today.isoformat(), expires, copy_id)).lastrowid)
+    return issue_ids, sorted({h[1] for h in holds}) or [student_id(1)]
+
+
+def timed(fn, args_list):
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - start)
+    return percentile(samples, 0.5) * 1000, percentile(samples, 0.99) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--depths", type=int, nargs="+", default=[0, 1000, 100000])
+    parser.add_argument("--books", type=int, default=20000)
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--loans", type=int, default=100000)
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    today = date.today()
+    print(f"{'waiting holds':>13} {'return p50/p99 ms':>19} {'position p50/p99 ms':>21} {'sweep ms':>9}  handed to holds")
+    with tempfile.TemporaryDirectory() as tmp:
+        base = os.path.join(tmp, "base.db")
+        generate(base, args.books, args.students, args.loans, 2, args.seed)
+        for depth in args.depths:
+            db_file = os.path.join(tmp, f"holds_{depth}.db")
+            shutil.copy(base, db_file)
+            rng = random.Random(args.seed)
+            pool = ConnectionPool(db_file)
+            issue_ids, holders = fill(pool, depth, args.students, args.iterations, today, rng)
+            conn = pool.reader()
+
+            handed = []
+            returned = timed(lambda i: handed.append(return_books(pool, [i], today)[0].hold_id is not None),
+                             [(i,) for i in issue_ids])
+            position = timed(lambda s: conn.execute(*student_holds_query(s)).fetchall(),
+                             [(rng.choice(holders),) for _ in range(args.iterations)])
+            start = time.perf_counter()
+            expire_holds(pool, today)
+            sweep = (time.perf_counter() - start) * 1000
+            pool.close_all()
+            print(f"{depth:>13,} {returned[0]:>9.3f} / {returned[1]:>7.3f} {position[0]:>10.3f} / {position[1]:>8.3f}"
+                  f" {sweep:>9.1f}  {sum(handed)}/{len(handed)}")
+
+
+if __name__ == "__main__":
+    main()
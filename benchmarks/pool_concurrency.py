@@ -0,0 +1,146 @@
+"""Concurrency benchmark: one shared connection vs the WAL connection pool.
+
+Each simulated session loops over the circulation desk mix: a catalog LIKE
+scan, a point lookup by book_id and, every tenth operation, a copy-count
+update. Throughput is reported for N simultaneous sessions.
+
+A second table runs every request on a new thread, as Streamlit runs every
+rerun, and compares opening fresh connections for each thread (the pool with
+no idle connections) against reusing the connections of ended threads.
+
+    python -m benchmarks.pool_concurrency --books 50000 --seconds 3
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from lms_db import ConnectionPool
+
+SCAN = "SELECT book_id, title, author, publisher, year, copies_available FROM Books WHERE title LIKE ? OR author LIKE ?"
+LOOKUP = "SELECT copies_available FROM Books WHERE book_id = ?"
+UPDATE = "UPDATE Books SET copies_available = copies_available WHERE book_id = ?"
+
+
+def build_db(path, books):
+    conn = sqlite3.connect(path)
+    conn.execute("""
+    CREATE TABLE Books (
+        book_id INTEGER PRIMARY KEY, title TEXT NOT NULL, author TEXT NOT NULL,
+        publisher TEXT, year INTEGER, copies_available INTEGER NOT NULL, total_copies INTEGER NOT NULL
+    )""")
+    conn.executemany(
+        "INSERT INTO Books VALUES (?, ?, ?, ?, ?, ?, ?)",
+        ((i, f"Title {i}", f"Author {i % 997}", "Pub", 2000 + i % 25, 3, 3) for i in range(1, books + 1)),
+    )
+    conn.commit()
+    conn.close()
+
+
+class SharedConnection:
+    """The old get_db_connection(): one connection for every session."""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+
+    def read(self, query, params):
+        with self.lock:
+            return self.conn.execute(query, params).fetchall()
+
+    def write(self, query, params):
+        with self.lock, self.conn:
+            self.conn.execute(query, params)
+
+
+class Pooled:
+    def __init__(self, path, max_idle=None):
+        self.pool = ConnectionPool(path) if max_idle is None else ConnectionPool(path, max_idle=max_idle)
+
+    def read(self, query, params):
+        return self.pool.reader().execute(query, params).fetchall()
+
+    def write(self, query, params):
+        with self.pool.writer() as conn:
+            conn.execute(query, params)
+
+
+def session(backend, books, deadline, counts, idx):
+    rng = random.Random(idx)
+    ops = 0
+    while time.perf_counter() < deadline:
+        term = f"%{rng.randint(1, 997)}%"
+        backend.read(SCAN, (term, term))
+        book_id = rng.randint(1, books)
+        backend.read(LOOKUP, (book_id,))
+        if ops % 10 == 0:
+            backend.write(UPDATE, (book_id,))
+        ops += 2
+    counts[idx] = ops
+
+
+def request(backend, books, rng):
+    """One rerun's worth of work: a point lookup and, now and then, an update."""
+    book_id = rng.randint(1, books)
+    backend.read(LOOKUP, (book_id,))
+    if rng.random() < 0.1:
+        backend.write(UPDATE, (book_id,))
+
+
+def thread_per_request(backend, books, deadline, counts, idx):
+    rng = random.Random(idx)
+    requests = 0
+    while time.perf_counter() < deadline:
+        worker = threading.Thread(target=request, args=(backend, books, rng))
+        worker.start()
+        worker.join()
+        requests += 1
+    counts[idx] = requests
+
+
+def run(backend, sessions, books, seconds, target=session):
+    counts = [0] * sessions
+    deadline = time.perf_counter() + seconds
+    threads = [threading.Thread(target=target, args=(backend, books, deadline, counts, i)) for i in range(sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(counts) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--books", type=int, default=50000)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        build_db(path, args.books)
+        print(f"{'sessions':>8} {'shared ops/s':>14} {'pooled ops/s':>14} {'speedup':>8}")
+        for n in args.sessions:
+            shared = run(SharedConnection(path), n, args.books, args.seconds)
+            pooled_backend = Pooled(path)
+            pooled = run(pooled_backend, n, args.books, args.seconds)
+            pooled_backend.pool.close_all()
+            print(f"{n:>8} {shared:>14.1f} {pooled:>14.1f} {pooled / shared:>7.2f}x")
+
+        print(f"\nnew thread per request\n{'sessions':>8} {'fresh req/s':>14} {'reused req/s':>14} {'speedup':>8} {'opened':>7}")
+        for n in args.sessions:
+            fresh_backend = Pooled(path, max_idle=0)  # Every thread opens its own connections, as before
+            fresh = run(fresh_backend, n, args.books, args.seconds, thread_per_request)
+            fresh_backend.pool.close_all()
+            reused_backend = Pooled(path)
+            reused = run(reused_backend, n, args.books, args.seconds, thread_per_request)
+            opened = reused_backend.pool.opened
+            reused_backend.pool.close_all()
+            print(f"{n:>8} {fresh:>14.1f} {reused:>14.1f} {reused / fresh:>7.2f}x {opened:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Build time, memory and size of the co-borrowing model (lms_recommend).
+
+For each history size, generates a database, then measures:
+
+    build     a full build, run as ``python -m lms_recommend build`` in a child
+              process: its peak RSS, and its peak anonymous memory sampled from
+              /proc (RSS also counts the file pages SQLite's sorter maps while
+              merging its spill files)
+    size      the model tables on disk (dbstat)
+    refresh   folding in --new-loans loans recorded after the build
+    read      one book's recommendations (also_borrowed_query)
+
+    python -m benchmarks.recommend --loans 1000000 20000000 --students 200000 --books 100000
+"""
+import argparse
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+
+from benchmarks.datagen import generate, skewed, student_id
+from benchmarks.harness import percentile
+from lms_archive import archive_pool
+from lms_recommend import MODEL_TABLES, also_borrowed_query, refresh_recommendations
+
+
+def add_loans(pool, count, books, students, rng):
+    today = date.today().isoformat()
+    with pool.writer() as conn:
+        conn.executemany(
+            "INSERT INTO IssueTable (book_id, student_id, issue_date, due_date, is_returned) VALUES (?, ?, ?, ?, 0)",
+            [(skewed(rng, books, 3), student_id(skewed(rng, students, 2)), today, today) for _ in range(count)])
+
+
+def peak_anonymous_mb(proc, interval=0.2):
+    """Waits for ``proc``, sampling its anonymous resident memory; returns the peak in MB (None off Linux)."""
+    peak = None
+    while proc.poll() is None:
+        try:
+            with open(f"/proc/{proc.pid}/status") as status:
+                for line in status:
+                    if line.startswith("RssAnon:"):
+                        peak = max(peak or 0, int(line.split()[1]) / 1024)
+        except OSError:
+            pass
+        time.sleep(interval)
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--loans", type=int, nargs="+", default=[1000000, 20000000])
+    parser.add_argument("--books", type=int, default=100000)
+    parser.add_argument("--students", type=int, default=200000)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--new-loans", type=int, default=10000, help="loans folded in by the refresh")
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--dir", default=None, help="where to put the databases (default: a temporary directory)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        for loans in args.loans:
+            db_file = os.path.join(tmp, f"recommend_{loans}.db")
+            archive_file = os.path.join(tmp, f"recommend_{loans}_history.db")
+            generate(db_file, args.books, args.students, loans, args.years, args.seed)
+
+            started = time.perf_counter()
+            build = subprocess.Popen(
+                [sys.executable, "-m", "lms_recommend", "build", "--db", db_file, "--archive", archive_file],
+                stdout=subprocess.PIPE, text=True)
+            anonymous_mb = peak_anonymous_mb(build)
+            seconds = time.perf_counter() - started
+            if build.returncode:
+                sys.exit(f"build failed with exit code {build.returncode}")
+            built = build.stdout.read().strip()
+            peak_mb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024  # Largest child so far
+
+            pool = archive_pool(db_file, archive_file)
+            conn = pool.reader()
+            sizes = dict(conn.execute(
+                f"SELECT name, SUM(pgsize) FROM dbstat WHERE name IN ({', '.join('?' * len(MODEL_TABLES))}) "
+                "OR name = 'idx_student_books_seq' GROUP BY name", MODEL_TABLES).fetchall())
+            rows = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                    for table in ("StudentBooks", "CoBorrow", "Recommendations")}
+
+            rng = random.Random(args.seed)
+            add_loans(pool, args.new_loans, args.books, args.students, rng)
+            refreshed = refresh_recommendations(pool)
+
+            samples = []
+            for _ in range(args.iterations):
+                query, params = also_borrowed_query(skewed(rng, args.books, 3))
+                start = time.perf_counter()
+                conn.execute(query, params).fetchall()
+                samples.append(time.perf_counter() - start)
+            pool.close_all()
+
+            print(f"\n{loans:,} loans, {args.students:,} students, {args.books:,} books")
+            anonymous = f", peak anonymous {anonymous_mb:.0f} MB" if anonymous_mb is not None else ""
+            print(f"build:   {seconds:.1f} s, peak RSS {peak_mb:.0f} MB{anonymous} ({built})")
+            print("size:    " + ", ".join(f"{name} {size / 2**20:.1f} MB" for name, size in sorted(sizes.items())))
+            print("rows:    " + ", ".join(f"{table} {count:,}" for table, count in rows.items()))
+            print(f"refresh: {refreshed.seconds:.2f} s for {args.new_loans:,} new loans "
+                  f"({refreshed.new_entries:,} new entries, {refreshed.books_ranked:,} books re-ranked)")
+            print(f"read:    p50 {percentile(samples, 0.5) * 1000:.3f} ms, p99 {percentile(samples, 0.99) * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Cold start and rerun cost of the Streamlit entry point (lms2.py).
+
+Measures, against a generated database:
+
+    import     ``python -X importtime -c "import <module>"`` in a fresh interpreter:
+               wall time, the module's cumulative import time, its heaviest
+               dependencies, and whether pandas/NumPy were loaded
+    bootstrap  the once-per-process startup work (migrations, archive schema,
+               scan cache warm-up) on first use and repeated
+    app        the first script run (first paint) and later reruns of the login
+               page, through streamlit.testing.v1.AppTest
+
+Parts that need Streamlit are skipped when it is not installed. To compare
+against an older entry point, write it next to lms2.py and pass it along:
+
+    git show HEAD~1:lms2.py > lms2_before.py
+    python -m benchmarks.startup lms2_before.py lms2.py
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.datagen import generate
+from benchmarks.harness import percentile
+from lms_archive import archive_pool, ensure_archive
+from lms_inventory import ScanCache
+from lms_migrations import ensure_migrated
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+HEAVY = ("pandas", "numpy", "pyarrow")
+
+
+def import_cost(module, top=8):
+    """Imports ``module`` in a fresh interpreter; prints wall time and its heaviest imports."""
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if proc.returncode != 0:
+        print(f"import {module}: skipped ({proc.stderr.strip().splitlines()[-1]})")
+        return
+    cumulative = {}  # Module -> microseconds including its own imports (nested ones count in their parents too)
+    for match in IMPORT_LINE.finditer(proc.stderr):
+        _, total, _, name = match.groups()
+        cumulative[name] = int(total)
+    loaded = [name for name in HEAVY if name in cumulative]
+    print(f"import {module}: {wall * 1000:.0f} ms wall, {cumulative.get(module, 0) / 1000:.0f} ms in imports, "
+          f"heavy modules loaded: {', '.join(loaded) or 'none'}")
+    heaviest = sorted((item for item in cumulative.items() if item[0] != module), key=lambda item: -item[1])
+    for name, total in heaviest[:top]:
+        print(f"    {total / 1000:8.1f} ms  {name}")
+
+
+def bootstrap_cost(db_file):
+    """The steps of lms2.bootstrap(), on first use and repeated (as every rerun would without the cache)."""
+    pool = archive_pool(db_file, os.path.join(os.path.dirname(db_file), "lms_history.db"))
+    steps = [
+        ("migrations", lambda: ensure_migrated(pool)),
+        ("archive schema", lambda: ensure_archive(pool)),
+        ("scan cache warm-up", lambda: ScanCache().warm(pool.reader())),
+    ]
+    for label in ("first use", "repeated"):
+        timings = []
+        for name, step in steps:
+            started = time.perf_counter()
+            step()
+            timings.append(f"{name} {(time.perf_counter() - started) * 1000:.1f} ms")
+        print(f"bootstrap, {label}: {', '.join(timings)}")
+    pool.close_all()
+
+
+def app_runs(app, reruns):
+    """First run and reruns of ``app`` (a path) through AppTest, from the current directory's database."""
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        print(f"app {os.path.basename(app)}: skipped (Streamlit is not installed)")
+        return
+    at = AppTest.from_file(app, default_timeout=120)
+    started = time.perf_counter()
+    at.run()
+    first = time.perf_counter() - started
+    samples = []
+    for _ in range(reruns):
+        started = time.perf_counter()
+        at.run()
+        samples.append(time.perf_counter() - started)
+    errors = [e.value for e in at.exception]
+    print(f"app {os.path.basename(app)}: first run {first * 1000:.0f} ms, rerun p50 "
+          f"{percentile(samples, 0.5) * 1000:.1f} ms, p99 {percentile(samples, 0.99) * 1000:.1f} ms"
+          + (f", errors: {errors}" if errors else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("apps", nargs="*", default=["lms2.py"], help="entry points to run (default: lms2.py)")
+    parser.add_argument("--modules", nargs="+", default=["lms2", "lms_service"], help="modules to time importing")
+    parser.add_argument("--books", type=int, default=20000)
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--loans", type=int, default=100000)
+    parser.add_argument("--reruns", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    for module in args.modules:
+        import_cost(module)
+
+    apps = [os.path.abspath(os.path.join(ROOT, app)) for app in args.apps]
+    with tempfile.TemporaryDirectory() as tmp:
+        # lms2 opens lms_data.db in the working directory
+        db_file = os.path.join(tmp, "lms_data.db")
+        generate(db_file, args.books, args.students, args.loans, 2, args.seed)
+        bootstrap_cost(db_file)
+        os.chdir(tmp)
+        for app in apps:
+            app_runs(app, args.reruns)
+
+
+if __name__ == "__main__":
+    main()
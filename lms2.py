@@ -1,11 +1,56 @@
 import streamlit as st
 import sqlite3 # CHANGED from pymysql
-import pandas as pd
-from datetime import date, timedelta
+from datetime import date
 import os # Added for path handling
+import io
+import tempfile
+import time
+
+import lms_service
+from lms_analytics import dashboard_queries, rebuild
+from lms_archive import ARCHIVE_FILE, ARCHIVE_SCHEMA, ensure_archive
+from lms_branches import BRANCHES, BranchRegistry
+from lms_cache import QueryCache
+from lms_db import DB_FILE, ConnectionPool
+from lms_export import export_formats, start_export
+from lms_fetch import fetch, fetch_lists, lists_frame, read_only, result_count, result_size
+from lms_fines import DEFAULT_POLICY, accrued_fines_query, fines_summary_query, snapshot_accruals
+from lms_holds import HOLD_PICKUP_DAYS, HOLD_PRIORITIES, cancel_hold, expire_holds, student_holds_query
+from lms_import import RowError, import_csv
+from lms_inventory import ScanCache, add_book, delete_book
+from lms_metrics import METRICS, SLOW_QUERY_LOG
+from lms_migrations import ensure_migrated
+from lms_queries import (
+    AVAILABLE_COLUMNS, CATALOG_COLUMNS, ISSUE_FILTERS, catalog_conditions, catalog_pager, catalog_sorts,
+    catalog_search, issue_history_conditions, issue_history_pager,
+)
+from lms_recommend import also_borrowed_query, recent_books_query, refresh_recommendations
+from lms_search import match_condition
+from lms_writequeue import WriteQueue
+
+# Bundled images, served from disk so the app starts without network access (e.g. on kiosks)
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+LOGO_IMAGE = os.path.join(ASSET_DIR, "front.jpg")
+ADMIN_IMAGE = os.path.join(ASSET_DIR, "admin.png")
+STUDENT_IMAGE = os.path.join(ASSET_DIR, "student.jpg")
+LOGO_WIDTH = 600 # Sidebar width at 2x pixel density
 
-# SQLite Database File Path
-DB_FILE = "lms_data.db" 
+@st.cache_resource
+def asset_image(path, width):
+    """A bundled image scaled down to ``width`` pixels, as bytes; computed once per process.
+
+    st.image decodes, resizes and re-encodes a file wider than it is shown on
+    every rerun; an image that already fits is passed through untouched.
+    """
+    from PIL import Image # Installed with Streamlit
+
+    with Image.open(path) as image:
+        fmt = image.format
+        if image.width > width:
+            image = image.resize((width, round(image.height * width / image.width)), Image.BILINEAR)
+        buffer = io.BytesIO()
+        image.save(buffer, format=fmt, quality=90)
+    return buffer.getvalue()
 
 # --- 1. SESSION STATE MANAGEMENT ---
 
@@ -28,126 +73,158 @@ def logout():
 
 @st.cache_resource
 def get_db_connection():
-    """Establishes and returns an SQLite database connection."""
+    """Creates the process-wide SQLite connection pool (connections are reused from one rerun thread to the next)."""
     try:
-        # Connect using the file path. check_same_thread=False is essential for Streamlit.
-        conn = sqlite3.connect(DB_FILE, check_same_thread=False)
-        # Use row factory to access columns by name (like dictionaries)
-        conn.row_factory = sqlite3.Row 
-        return conn
+        return ConnectionPool(DB_FILE, attach={ARCHIVE_SCHEMA: ARCHIVE_FILE}, metrics=METRICS)
     except Exception as e:
         st.error(f"Error connecting to SQLite: {e}")
         return None
 
+@st.cache_resource
+def get_query_cache():
+    """Creates the process-wide read cache, invalidated by every committed write on the pool.
+
+    Commits by other processes are caught by QueryCache.sync() in execute_query.
+    """
+    cache = QueryCache(sizeof=result_size)
+    pool = get_db_connection()
+    if pool:
+        pool.add_commit_listener(cache.invalidate)
+    return cache
+
+@st.cache_resource
+def get_branches():
+    """Creates the branch registry; the branch on DB_FILE shares the main pool."""
+    main_pool = get_db_connection()
+    return BranchRegistry({
+        name: main_pool if os.path.abspath(path) == os.path.abspath(DB_FILE) else ConnectionPool(path, metrics=METRICS)
+        for name, path in BRANCHES.items()
+    })
+
+@st.cache_resource
+def get_scan_cache():
+    """Creates the process-wide barcode -> copy map, warmed with the copies on loan and the newest copies."""
+    cache = ScanCache()
+    pool = get_db_connection()
+    if pool:
+        ensure_migrated(pool)
+        cache.warm(pool.reader())
+    return cache
+
+@st.cache_resource
+def get_write_queue():
+    """Creates the process-wide group-commit queue that issues and returns go through."""
+    pool = get_db_connection()
+    return WriteQueue(pool) if pool else None
+
 def execute_query(query, params=(), fetch=False, commit=False):
-    """Executes a SQL query and handles connection/cursor."""
-    conn = get_db_connection()
-    if not conn:
+    """Executes a SQL query on a pooled connection.
+
+    ``fetch`` picks the result: True or "frame" for a DataFrame, "scalar"
+    for the first value, "one" for the first row as a tuple, "columns" for
+    {name: array} (see lms_fetch).
+
+    Pure reads (fetch without commit) use the thread's read-only connection
+    and are served from the query cache while the tables they read are
+    unchanged and no other connection has committed; everything else runs in
+    a write transaction that commits on success.
+    """
+    pool = get_db_connection()
+    if not pool:
         return None
+    mode = "frame" if fetch is True else fetch
 
     try:
-        with conn: # Use connection as context manager for auto-commit/rollback
-            cursor = conn.cursor()
-            cursor.execute(query, params)
-            
-            if commit:
-                # Changes are committed automatically by the context manager on success
-                pass
-            
+        if fetch and not commit:
+            cache = get_query_cache()
+            cache.sync(pool.data_version()) # Another process (lms_api, a batch job) may have written
+            # Each mode caches its own result; the SQL comment keeps the cached query readable.
+            cache_query = query if mode == "frame" else f"-- {mode}\n{query}"
+            result = cache.get(cache_query, params)
+            if result is not None and METRICS.enabled:
+                METRICS.record_cache_hit(query, params)
+            if result is None:
+                generations = cache.snapshot(query) # Taken before reading, so a racing write makes it stale
+                result = _fetch(pool.reader(), query, params, mode)
+                if mode == "columns":
+                    result = read_only(result) # Shared by every caller that hits the cache
+                cache.put(cache_query, params, generations, result)
+            if mode == "frame":
+                return result.copy(deep=False) # Callers may add columns without touching the cached frame
+            return dict(result) if mode == "columns" else result
+
+        with pool.writer() as conn: # Commits on success, rolls back on error
             if fetch:
-                # Get column names (already handled by row_factory, but good for Pandas)
-                data = cursor.fetchall()
-                if data:
-                    # Convert list of Row objects to list of dictionaries for DataFrame
-                    data_dicts = [dict(row) for row in data]
-                    return pd.DataFrame(data_dicts)
-                return pd.DataFrame() # Return empty DataFrame if no data
-            
+                return _fetch(conn, query, params, mode)
+            conn.execute(query, params) # Timed by the pool
             return True # For commit/non-fetch operations
 
     except sqlite3.Error as e: # CHANGED from pymysql.MySQLError
         st.error(f"Database Error: {e}")
         st.toast(f"SQL Error: {e}", icon="🚫")
         return None
+
+def _fetch(conn, query, params, mode):
+    """Runs a query and returns its result in ``mode``, timing the fetch and DataFrame build when metrics are on."""
+    started = METRICS.enabled and time.perf_counter()
+    if mode == "frame":
+        names, columns = fetch_lists(conn, query, params)
+        fetched = METRICS.enabled and time.perf_counter()
+        result = lists_frame(names, columns)
+    else:
+        result = fetch(conn, query, params, mode)
+        fetched = METRICS.enabled and time.perf_counter()
+    if started:
+        METRICS.record_query(query, params, result_count(result, mode), fetched - started, time.perf_counter() - fetched)
+    return result
         
-def create_tables():
-    """Initializes the SQLite database tables."""
-    conn = get_db_connection()
-    if not conn: return
+@st.cache_resource(show_spinner="Preparing the library database...")
+def bootstrap():
+    """Startup work done once per process: migrations on every branch, the archive schema, the scan cache warm-up.
+
+    Returns the migration versions applied. Reruns get the cached result
+    without touching the database; a failure raises and is not cached, so
+    the next run tries again. The session whose run applied migration 1 is
+    the one told about the default admin.
+    """
+    pool = get_db_connection()
+    if not pool:
+        get_db_connection.clear() # Reconnect on the next run too
+        raise sqlite3.OperationalError(f"Cannot open {DB_FILE}")
+    applied = ensure_migrated(pool)
+    st.session_state['default_admin_notice'] = 1 in applied
+    ensure_archive(pool)
+    for branch_pool in get_branches().pools.values():
+        ensure_migrated(branch_pool)
+    get_scan_cache() # Warmed before the first scan
+    return applied
 
-    # Ensure the tables exist with initial data (Admin user)
-    # Using """ allows multi-line SQL
-    
-    # 1. Admin Table
-    execute_query("""
-    CREATE TABLE IF NOT EXISTS Admin (
-        admin_id INTEGER PRIMARY KEY,
-        username TEXT UNIQUE NOT NULL,
-        password TEXT NOT NULL
-    )
-    """, commit=True)
-
-    # 2. Student Table
-    execute_query("""
-    CREATE TABLE IF NOT EXISTS Student (
-        student_id TEXT PRIMARY KEY,
-        student_name TEXT NOT NULL,
-        student_pass TEXT NOT NULL
-    )
-    """, commit=True)
-    
-    # 3. Books Table
-    execute_query("""
-    CREATE TABLE IF NOT EXISTS Books (
-        book_id INTEGER PRIMARY KEY,
-        title TEXT NOT NULL,
-        author TEXT NOT NULL,
-        publisher TEXT,
-        year INTEGER,
-        copies_available INTEGER NOT NULL,
-        total_copies INTEGER NOT NULL
-    )
-    """, commit=True)
-
-    # 4. Issue Table
-    execute_query("""
-    CREATE TABLE IF NOT EXISTS IssueTable (
-        issue_id INTEGER PRIMARY KEY,
-        book_id INTEGER NOT NULL,
-        student_id TEXT NOT NULL,
-        issue_date TEXT NOT NULL,
-        due_date TEXT NOT NULL,
-        return_date TEXT,
-        fine_amount REAL DEFAULT 0.0,
-        is_returned BOOLEAN DEFAULT 0,
-        FOREIGN KEY (book_id) REFERENCES Books(book_id),
-        FOREIGN KEY (student_id) REFERENCES Student(student_id)
-    )
-    """, commit=True)
-
-    # Insert a default Admin if one doesn't exist
+def create_tables():
+    """Brings the database schema up to date through bootstrap() (reruns return its cached result)."""
     try:
-        # Check if the default admin exists
-        check_admin = execute_query("SELECT * FROM Admin WHERE username = ?", ("admin",), fetch=True) 
-        if check_admin is None or check_admin.empty:
-            execute_query("INSERT INTO Admin (username, password) VALUES (?, ?)", ("admin", "admin123"), commit=True)
-            st.toast("Default Admin created: admin/admin123", icon="🔒")
+        bootstrap()
     except sqlite3.Error as e:
-         st.error(f"Could not initialize default admin: {e}")
+        st.error(f"Could not initialize the database: {e}")
+        return
+
+    if st.session_state.pop('default_admin_notice', False):
+        st.toast("Default Admin created: admin/admin123", icon="🔒")
 
 
 # --- 3. LOGIN FUNCTIONS ---
 
 def admin_login(username, password):
     """Handles admin login."""
-    # CHANGED: Replaced %s with ? in the query
-    query = "SELECT admin_id FROM Admin WHERE username = ? AND password = ?"
-    result = execute_query(query, (username, password), fetch=True)
+    try:
+        admin_id = lms_service.admin_login(get_db_connection(), username, password)
+    except sqlite3.Error as e:
+        st.error(f"Database Error: {e}")
+        return
 
-    if result is not None and not result.empty:
+    if admin_id is not None:
         st.session_state['logged_in'] = True
         st.session_state['user_role'] = 'Admin'
-        st.session_state['user_id'] = result.iloc[0]['admin_id']
+        st.session_state['user_id'] = admin_id
         st.toast(f"Welcome Admin!", icon="🚀")
         st.rerun()
     else:
@@ -156,15 +233,17 @@ def admin_login(username, password):
 
 def student_login(student_id):
     """Handles student login."""
-    # CHANGED: Replaced %s with ? in the query
-    query = "SELECT student_id, student_name FROM Student WHERE student_id = ?"
-    result = execute_query(query, (student_id,), fetch=True)
+    try:
+        student = lms_service.student_login(get_db_connection(), student_id)
+    except sqlite3.Error as e:
+        st.error(f"Database Error: {e}")
+        return
 
-    if result is not None and not result.empty:
+    if student is not None:
         st.session_state['logged_in'] = True
         st.session_state['user_role'] = 'Student'
-        st.session_state['user_id'] = result.iloc[0]['student_id']
-        st.toast(f"Welcome {result.iloc[0]['student_name']}!", icon="📚")
+        st.session_state['user_id'] = student['student_id']
+        st.toast(f"Welcome {student['student_name']}!", icon="📚")
         st.rerun()
     else:
         st.error("Invalid Student ID")
@@ -182,40 +261,87 @@ def add_book_form():
         publisher = st.text_input("Publisher")
         year = st.number_input("Publication Year", min_value=1900, max_value=date.today().year, value=date.today().year)
         total_copies = st.number_input("Total Copies", min_value=1, step=1)
+        barcodes_text = st.text_area("Copy Barcodes (optional)", placeholder="One per copy; leave empty to print new labels")
 
         if st.form_submit_button("Add Book", type="primary"):
-            if all([book_id, title, author, total_copies]):
-                # CHANGED: Replaced %s with ? in the query
-                query = "INSERT INTO Books (book_id, title, author, publisher, year, copies_available, total_copies) VALUES (?, ?, ?, ?, ?, ?, ?)"
-                params = (book_id, title, author, publisher, year, total_copies, total_copies)
-                if execute_query(query, params, commit=True):
-                    st.success(f"Book '{title}' added successfully!")
+            barcodes = lms_service.parse_barcodes(barcodes_text) or None
+            if barcodes and len(barcodes) != total_copies:
+                st.error(f"Scan one barcode per copy: {len(barcodes)} barcodes for {total_copies} copies.")
+            elif all([book_id, title, author, total_copies]):
+                # The book and one Copies row per copy; the copy counters follow the copies
+                try:
+                    labels = add_book(get_db_connection(), book_id, title, author, publisher, year, total_copies, barcodes)
+                except sqlite3.Error as e:
+                    st.error(f"Database Error: {e}")
+                    return
+                st.success(f"Book '{title}' added successfully! Copy barcodes: {', '.join(labels)}")
             else:
                 st.warning("Please fill in all required fields.")
 
 
+def show_paged(pager, conditions, params, state_key, view, index, decorate=None):
+    """Shows one keyset page with Previous/Next buttons; returns False if there are no rows.
+
+    The page cursor is kept in session state under ``state_key`` and reset
+    whenever ``view`` (the search/sort/filter settings) changes. ``decorate``
+    may add derived columns to the page before it is shown.
+    """
+    if st.session_state.get(f"{state_key}_view") != view:
+        st.session_state[f"{state_key}_view"] = view
+        st.session_state[state_key] = None
+    cursor = st.session_state.get(state_key)
+
+    query, query_params = pager.query(conditions, params, cursor)
+    page = pager.page(execute_query(query, query_params, fetch=True), cursor)
+    if page is None:
+        if cursor is not None: # The page emptied under us (e.g. deletions); start over
+            st.session_state[state_key] = None
+            st.rerun()
+        return False
+
+    rows = decorate(page.rows) if decorate else page.rows
+    st.dataframe(rows.set_index(index), width="stretch")
+    col_prev, col_next = st.columns(2)
+    if col_prev.button("◀ Previous", key=f"{state_key}_prev", disabled=not page.has_prev):
+        st.session_state[state_key] = page.prev_cursor()
+        st.rerun()
+    if col_next.button("Next ▶", key=f"{state_key}_next", disabled=not page.has_next):
+        st.session_state[state_key] = page.next_cursor()
+        st.rerun()
+    return True
+
+def show_catalog(state_key, columns, available_only=False):
+    """Searches, sorts and pages through Books; returns False if nothing matched."""
+    search_term = st.text_input("Search by Title, Author or Publisher", key=f"{state_key}_search")
+    match = match_condition(search_term)
+
+    col_sort, col_order, col_available = st.columns(3)
+    sort_label = col_sort.selectbox("Sort by", (["Relevance"] if match else []) + catalog_sorts(columns), key=f"{state_key}_sort")
+    descending = col_order.checkbox("Descending", key=f"{state_key}_desc")
+    if not available_only:
+        available_only = col_available.checkbox("Available only", key=f"{state_key}_available")
+
+    if sort_label == "Relevance":
+        # Best FTS5 matches first; the result is already bounded by the search limit
+        query, params = catalog_search(search_term, columns, available_only=available_only)
+        df = execute_query(query, params, fetch=True)
+        if df is None or df.empty:
+            return False
+        st.dataframe(df.set_index('book_id'), width="stretch")
+        return True
+
+    conditions, params = catalog_conditions(search_term, available_only)
+    pager = catalog_pager(columns, sort_label, descending)
+    view = (search_term, sort_label, descending, available_only)
+    return show_paged(pager, conditions, params, state_key, view, 'book_id')
+
 def view_books():
     st.subheader("📖 View and Search Books")
-    search_term = st.text_input("Search by Title or Author")
-    
-    # SQLite LIKE searches are case-insensitive by default, but we'll use wildcards
-    search_param = f"%{search_term}%"
+    found = show_catalog("books_page", CATALOG_COLUMNS)
 
-    if search_term:
-        # CHANGED: Replaced %s with ? in the query
-        query = "SELECT book_id, title, author, publisher, year, copies_available FROM Books WHERE title LIKE ? OR author LIKE ?"
-        params = (search_param, search_param)
-    else:
-        query = "SELECT book_id, title, author, publisher, year, copies_available FROM Books"
-        params = ()
-
-    df = execute_query(query, params, fetch=True)
-    
-    if df is not None and not df.empty:
-        st.dataframe(df.set_index('book_id'), use_container_width=True)
-    elif search_term:
-        st.info(f"No books found matching '{search_term}'.")
-    else:
+    if not found and st.session_state.get("books_page_search"):
+        st.info(f"No books found matching '{st.session_state['books_page_search']}'.")
+    elif not found:
         st.info("No books available in the library.")
 
 
@@ -228,13 +354,17 @@ def delete_book_form():
         
         if st.form_submit_button("Delete Book", type="secondary"):
             if book_id:
-                # CHANGED: Replaced %s with ? in the query
-                query = "DELETE FROM Books WHERE book_id = ?"
-                if execute_query(query, (book_id,), commit=True):
+                # The copies go with the book, and their barcodes leave the scan cache
+                try:
+                    deleted = delete_book(get_db_connection(), book_id, cache=get_scan_cache())
+                except sqlite3.Error as e:
+                    st.error(f"Failed to delete book ID {book_id}. It might be issued. ({e})")
+                    return
+                if deleted:
                     st.success(f"Book ID {book_id} deleted successfully.")
                     st.rerun()
                 else:
-                    st.error(f"Failed to delete book ID {book_id}. It might be issued.")
+                    st.error(f"Book ID {book_id} does not exist.")
             else:
                 st.warning("Please enter a Book ID.")
 
@@ -277,110 +407,382 @@ def add_admin_form():
             else:
                 st.warning("Please fill in all fields.")
 
+# --- BULK IMPORT ---
+
+def bulk_import_form():
+    st.subheader("📥 Bulk Import")
+    kind = st.radio("Import", ["books", "students"], horizontal=True, format_func=str.title, key="import_kind")
+    if kind == "books":
+        st.caption("CSV columns: book_id, title, author, total_copies; optional publisher, year, copies_available.")
+    else:
+        st.caption("CSV columns: student_id, student_name, student_pass.")
+    st.caption("Existing IDs are updated in place.")
+    uploaded = st.file_uploader("CSV file", type=["csv"], key="import_file")
+
+    if uploaded is not None and st.button("Import", type="primary"):
+        bar = st.progress(0.0, text="Importing...")
+
+        def report(stats):
+            # Rows are streamed, so progress is measured in bytes consumed
+            bar.progress(min(uploaded.tell() / max(uploaded.size, 1), 1.0),
+                         text=f"{stats.read:,} rows read, {stats.imported:,} imported, {stats.rejected:,} rejected")
+
+        rejects = io.StringIO()
+        try:
+            text = io.TextIOWrapper(uploaded, encoding="utf-8-sig", newline="")
+            stats = import_csv(get_db_connection(), kind, text, rejects=rejects, progress=report,
+                               cache=get_scan_cache())
+        except (RowError, UnicodeDecodeError, sqlite3.Error) as e:
+            st.error(f"Import failed: {e}")
+            return
+        bar.progress(1.0, text="Done")
+
+        st.success(f"Imported {stats.imported:,} of {stats.read:,} {kind} in {stats.seconds:.1f} s "
+                   f"({stats.rows_per_second:,.0f} rows/s).")
+        if stats.rejected:
+            st.warning(f"{stats.rejected:,} rows were rejected.")
+            st.download_button("Download Rejected Rows", rejects.getvalue(), file_name=f"rejected_{kind}.csv", mime="text/csv")
+
+# --- HISTORY EXPORT ---
+
+def export_history_form():
+    st.subheader("📤 Export Circulation History")
+    formats = export_formats()
+    if "parquet" not in formats:
+        st.caption("Parquet export needs pyarrow (pip install pyarrow); CSV is available.")
+    with st.form("export_history_form"):
+        fmt = st.radio("Format", formats, horizontal=True, format_func=str.upper)
+        col1, col2 = st.columns(2)
+        start = col1.date_input("Issued from", value=None)
+        end = col2.date_input("Issued to", value=None)
+        student_id = st.text_input("Student ID (optional)")
+
+        if st.form_submit_button("Start Export", type="primary"):
+            # A private file per export: concurrent exports never write to or hand out each other's file
+            fd, path = tempfile.mkstemp(prefix="lms_history_", suffix=f".{fmt}")
+            os.close(fd)
+            file_name = f"lms_history_{date.today().isoformat()}.{fmt}"
+            st.session_state.pop('export_data', None)
+            # Runs in a background thread on its own read-only connection; the app stays responsive
+            st.session_state['export_job'] = (start_export(path, fmt, DB_FILE, start, end, student_id.strip() or None), path, file_name)
+
+    job = st.session_state.get('export_job')
+    if not job:
+        return
+    stats, path, file_name = job
+    if stats.error:
+        if os.path.exists(path):
+            os.remove(path)
+        st.error(f"Export failed: {stats.error}")
+    elif not stats.done:
+        st.info(f"Exporting... {stats.rows:,} rows so far ({stats.rows_per_second:,.0f} rows/s).")
+        st.button("Refresh")
+    else:
+        st.success(f"Exported {stats.rows:,} rows in {stats.seconds:.1f} s ({stats.rows_per_second:,.0f} rows/s).")
+        if 'export_data' not in st.session_state: # Read once; the temp file is removed right away
+            with open(path, "rb") as f:
+                st.session_state['export_data'] = f.read()
+            os.remove(path)
+        st.download_button("Download Export", st.session_state['export_data'], file_name=file_name)
+
+def branch_search_page():
+    st.subheader("🏛️ Search All Branches")
+    branches = get_branches()
+    search_term = st.text_input("Search by Title, Author or Publisher", key="branch_search")
+    available_only = st.checkbox("On the shelf somewhere", key="branch_available")
+    if not search_term:
+        st.info(f"Searches the catalogs of {', '.join(branches.pools)} at once.")
+        return
+
+    result = branches.search(search_term, available_only=available_only)
+    for branch, reason in result.missing.items():
+        st.warning(f"{branch}: {reason}; its books are not listed.")
+    if not result.hits:
+        st.info(f"No books found matching '{search_term}'.")
+        return
+    # One column per branch: copies on the shelf there, blank where the branch has no copy
+    rows = [{"title": h.title, "author": h.author, "year": h.year,
+             **{branch: h.available.get(branch) for branch in branches.pools}} for h in result.hits]
+    st.dataframe(rows, width="stretch", hide_index=True) # Streamlit builds the table from the dicts
+
+
+def _desk_branch(key):
+    """Branch picker for typed IDs and unprefixed labels (shown only with several branches); returns its name."""
+    branches = get_branches()
+    if len(branches.pools) == 1:
+        return next(iter(branches.pools))
+    return st.selectbox("Branch for typed IDs", list(branches.pools), key=key,
+                        help="Scanned barcodes go to the branch that printed them; IDs and unprefixed labels to this one.")
+
+def _desk(pool):
+    """write_queue and cache arguments for circulation on a branch pool; both run on the main pool only."""
+    main = pool is get_db_connection()
+    return {"write_queue": get_write_queue() if main else None, "cache": get_scan_cache() if main else None}
+
+
 # --- ISSUE/RETURN MANAGEMENT ---
 
 def issue_book_form():
     st.subheader("➡️ Issue Book")
-    today = date.today().isoformat()
-    due_date = (date.today() + timedelta(days=15)).isoformat()
     
     with st.form("issue_book_form"):
-        book_id = st.number_input("Book ID to Issue", min_value=1, step=1)
+        branch = _desk_branch("issue_branch")
+        barcodes_text = st.text_input("Scan Copy Barcode(s)", placeholder="Scan each copy, or type Book IDs below")
+        book_ids_text = st.text_input("Book ID(s) to Issue", placeholder="e.g. 101 or 101, 102, 103")
         student_id = st.text_input("Student ID")
+        col_hold, col_priority = st.columns(2)
+        hold_unavailable = col_hold.checkbox("Place a hold on books that are out", value=True)
+        priority = col_priority.selectbox("Hold priority", list(HOLD_PRIORITIES), index=list(HOLD_PRIORITIES).index("student"))
         
         if st.form_submit_button("Issue Book", type="primary"):
-            if book_id and student_id:
-                # 1. Check if book exists and is available
-                # CHANGED: Replaced %s with ? in the query
-                book_query = "SELECT copies_available FROM Books WHERE book_id = ?"
-                book_result = execute_query(book_query, (book_id,), fetch=True)
-                
-                if book_result is None or book_result.empty or book_result.iloc[0]['copies_available'] <= 0:
-                    st.error(f"Book ID {book_id} is not available or does not exist.")
+            barcodes = lms_service.parse_barcodes(barcodes_text)
+            book_ids = lms_service.parse_ids(book_ids_text)
+            if book_ids is None:
+                st.error("Book IDs must be positive whole numbers.")
+            elif (barcodes or book_ids) and student_id:
+                # Availability check, copy checkout and IssueTable insert run in one transaction
+                pool = get_branches().pool(branch)
+                write_queue = _desk(pool)["write_queue"]
+                try:
+                    if barcodes: # Each copy is issued at the branch that owns it
+                        outcomes = lms_service.issue_scanned_at(get_branches(), branch, student_id, barcodes, desk=_desk)
+                    else:
+                        outcomes = lms_service.issue(pool, student_id, book_ids, write_queue=write_queue)
+                except sqlite3.Error as e:
+                    st.error(f"Failed to issue book: {e}")
                     return
 
-                # 2. Check if student exists
-                # CHANGED: Replaced %s with ? in the query
-                student_query = "SELECT student_id FROM Student WHERE student_id = ?"
-                student_result = execute_query(student_query, (student_id,), fetch=True)
-                
-                if student_result is None or student_result.empty:
-                    st.error(f"Student ID {student_id} does not exist.")
-                    return
-                
-                # 3. Issue the book
-                # CHANGED: Replaced %s with ? in the query
-                issue_query = "INSERT INTO IssueTable (book_id, student_id, issue_date, due_date, is_returned) VALUES (?, ?, ?, ?, 0)"
-                issue_params = (book_id, student_id, today, due_date)
-                
-                if execute_query(issue_query, issue_params, commit=True):
-                    # 4. Update book copy count
-                    new_copies = book_result.iloc[0]['copies_available'] - 1
-                    # CHANGED: Replaced %s with ? in the query
-                    update_book_query = "UPDATE Books SET copies_available = ? WHERE book_id = ?"
-                    execute_query(update_book_query, (new_copies, book_id), commit=True)
-                    
-                    st.success(f"Book ID {book_id} issued to Student {student_id}. Due: {due_date}")
+                issued = [o for o in outcomes if o['ok']]
+                failed = [o for o in outcomes if not o['ok']]
+                # Books with no copy left join their hold queue instead of being turned away
+                holds = lms_service.hold(pool, student_id, [o['book_id'] for o in failed], priority, write_queue) if hold_unavailable and not barcodes else []
+                for outcome, hold in zip(failed, holds or [None] * len(failed)):
+                    if hold and hold['ok']:
+                        st.info(f"Book ID {hold['book_id']} is out; Student {student_id} is number {hold['position']} in its hold queue (Hold ID {hold['hold_id']}).")
+                    else:
+                        st.error(outcome['error'])
+                if issued:
+                    listed = ", ".join(f"{o['book_id']} (copy {o['barcode']}, Issue ID {o['issue_id']})" for o in issued)
+                    st.success(f"Book ID {listed} issued to Student {student_id}. Due: {issued[0]['due_date']}")
                     st.balloons()
-                else:
-                    st.error("Failed to issue book.")
+            else:
+                st.warning("Please scan a copy or enter a Book ID, and enter a Student ID.")
 
 def return_book_form():
     st.subheader("⬅️ Return Book")
-    today = date.today().isoformat()
     
     with st.form("return_book_form"):
-        issue_id = st.number_input("Enter Issue ID to Return", min_value=1, step=1)
+        branch = _desk_branch("return_branch")
+        barcodes_text = st.text_input("Scan Copy Barcode(s)", placeholder="Scan each returned copy, or type Issue IDs below")
+        issue_ids_text = st.text_input("Enter Issue ID(s) to Return", placeholder="e.g. 7 or 7, 8, 9")
         
         if st.form_submit_button("Return Book", type="secondary"):
-            if issue_id:
-                # 1. Get issue information
-                # CHANGED: Replaced %s with ? in the query
-                issue_query = "SELECT book_id, due_date, is_returned FROM IssueTable WHERE issue_id = ?"
-                issue_info = execute_query(issue_query, (issue_id,), fetch=True)
-                
-                if issue_info is None or issue_info.empty:
-                    st.error(f"Issue ID {issue_id} not found.")
+            barcodes = lms_service.parse_barcodes(barcodes_text)
+            issue_ids = lms_service.parse_ids(issue_ids_text)
+            if issue_ids is None:
+                st.error("Issue IDs must be positive whole numbers.")
+            elif barcodes or issue_ids:
+                # Closing the loan, fine and copy check-in run in one transaction
+                pool = get_branches().pool(branch)
+                try:
+                    if barcodes: # Each copy goes back to the branch that owns it
+                        outcomes = lms_service.return_scanned_at(get_branches(), branch, barcodes, desk=_desk)
+                    else:
+                        outcomes = lms_service.return_loans(pool, issue_ids, write_queue=_desk(pool)["write_queue"])
+                except sqlite3.Error as e:
+                    st.error(f"Failed to process return: {e}")
                     return
-                
-                info = issue_info.iloc[0]
-                if info['is_returned']:
-                    st.warning("This book has already been returned.")
-                    return
-                
-                due_date = date.fromisoformat(info['due_date'])
-                current_date = date.fromisoformat(today)
-                book_id = info['book_id']
-                fine = 0.0
-
-                if current_date > due_date:
-                    days_overdue = (current_date - due_date).days
-                    fine = days_overdue * 5.0 # Example fine: $5.00 per day
-                    st.warning(f"Book is {days_overdue} days overdue. Fine: ₹{fine:.2f}")
-
-                # 2. Update Issue Table
-                # CHANGED: Replaced %s with ? in the query
-                update_issue_query = "UPDATE IssueTable SET return_date = ?, fine_amount = ?, is_returned = 1 WHERE issue_id = ?"
-                issue_params = (today, fine, issue_id)
-                
-                if execute_query(update_issue_query, issue_params, commit=True):
-                    # 3. Update book copies
-                    # Get current copies available
-                    book_copies_query = "SELECT copies_available FROM Books WHERE book_id = ?"
-                    book_result = execute_query(book_copies_query, (book_id,), fetch=True)
-                    
-                    if book_result is not None and not book_result.empty:
-                        new_copies = book_result.iloc[0]['copies_available'] + 1
-                        # CHANGED: Replaced %s with ? in the query
-                        update_book_query = "UPDATE Books SET copies_available = ? WHERE book_id = ?"
-                        execute_query(update_book_query, (new_copies, book_id), commit=True)
-                    
-                    st.success(f"Book (Issue ID {issue_id}) returned successfully. Fine charged: ₹{fine:.2f}")
-                    st.rerun()
-                else:
-                    st.error("Failed to process return.")
+
+                for outcome in outcomes:
+                    if not outcome['ok']:
+                        st.warning(outcome['error'])
+                    elif outcome['days_overdue']:
+                        st.warning(f"Issue ID {outcome['issue_id']} is {outcome['days_overdue']} days overdue. Fine: ₹{outcome['fine']:.2f}")
+                for outcome in outcomes:
+                    if outcome['ok']:
+                        st.success(f"Book (Issue ID {outcome['issue_id']}) returned successfully. Fine charged: ₹{outcome['fine']:.2f}")
+                    if outcome['held_for']:
+                        st.info(f"Keep Book ID {outcome['book_id']} at the desk: it is held for Student {outcome['held_for']} (Hold ID {outcome['hold_id']}) for {HOLD_PICKUP_DAYS} days.")
             else:
-                st.warning("Please enter an Issue ID.")
+                st.warning("Please scan a copy or enter an Issue ID.")
+
+
+def holds_page():
+    st.subheader("📌 Holds")
+    counts = execute_query("SELECT status, COUNT(*) AS holds FROM Holds WHERE status IN ('waiting', 'ready') GROUP BY status", fetch="columns")
+    counts = dict(zip(counts['status'], counts['holds'])) if counts else {}
+    col1, col2 = st.columns(2)
+    col1.metric("Waiting", counts.get('waiting', 0))
+    col2.metric("Ready for Pickup", counts.get('ready', 0))
+
+    df = execute_query("""
+    SELECT h.hold_id, h.student_id, h.book_id, b.title, h.ready_date, h.expires AS collect_by
+    FROM Holds h JOIN Books b ON b.book_id = h.book_id
+    WHERE h.status = 'ready' ORDER BY h.expires, h.hold_id
+    """, fetch=True)
+    if df is not None and not df.empty:
+        st.dataframe(df.set_index('hold_id'), width="stretch")
+
+    st.caption(f"Ready holds not collected within {HOLD_PICKUP_DAYS} days expire in the sweep and pass the copy on.")
+    if st.button("Run Expiry Sweep"):
+        try:
+            stats = expire_holds(get_db_connection())
+        except sqlite3.Error as e:
+            st.error(f"Could not run the sweep: {e}")
+            return
+        st.success(f"Expired {stats.expired_ready} uncollected and {stats.expired_waiting} stale holds; "
+                   f"{stats.passed_on + stats.filled_from_shelf} copies passed to the next hold, {stats.shelved} reshelved.")
+
+
+# --- FINES ---
+
+FINES_LIST_LIMIT = 500
+
+def fines_page():
+    st.subheader("💰 Fines")
+    policy = DEFAULT_POLICY
+    cap = f", capped at ₹{policy.max_fine:.2f}" if policy.max_fine is not None else ""
+    st.caption(f"Policy: ₹{policy.rate_per_day:.2f} per day after {policy.grace_days} grace days{cap}.")
+
+    # One aggregate over all open loans, computed inside SQLite
+    summary = execute_query(*fines_summary_query(policy), fetch="one")
+    if summary:
+        open_loans, overdue_loans, total_accrued = summary
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Open Loans", open_loans)
+        col2.metric("Overdue Loans", overdue_loans)
+        col3.metric("Accrued Fines", f"₹{total_accrued:.2f}")
+
+    df = execute_query(*accrued_fines_query(policy, limit=FINES_LIST_LIMIT), fetch=True)
+    if df is not None and not df.empty:
+        st.dataframe(df.set_index('issue_id'), width="stretch")
+    else:
+        st.info("No overdue loans.")
+
+    if st.button("Record Today's Accrual Snapshot"):
+        try:
+            written = snapshot_accruals(get_db_connection(), policy)
+            st.success(f"Recorded {written} accruals for {date.today().isoformat()}.")
+        except sqlite3.Error as e:
+            st.error(f"Could not record the snapshot: {e}")
+
+
+# --- ANALYTICS ---
+
+def analytics_page():
+    st.subheader("📈 Circulation Analytics")
+    # Every query reads the summary tables only, so the page costs the same however long the history gets
+    queries = dashboard_queries()
+
+    kpis = execute_query(*queries["kpis"], fetch="one")
+    if kpis:
+        issued_today, returned_today, open_loans, overdue_loans, active_borrowers = kpis
+        col1, col2, col3, col4, col5 = st.columns(5)
+        col1.metric("Issued Today", issued_today)
+        col2.metric("Returned Today", returned_today)
+        col3.metric("Open Loans", open_loans)
+        col4.metric("Overdue Loans", overdue_loans)
+        col5.metric("Active Borrowers", active_borrowers)
+
+    st.markdown("#### Daily Volume (90 days)")
+    df = execute_query(*queries["daily volume"], fetch=True)
+    if df is not None and not df.empty:
+        st.line_chart(df.set_index('day')[['issues', 'returns']])
+        st.caption(f"Fines charged at return over the period: ₹{df['fines'].sum():.2f}")
+    else:
+        st.info("No loans in the last 90 days.")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("#### Top Titles (30 days)")
+        df = execute_query(*queries["top titles (30 days)"], fetch=True)
+        if df is not None and not df.empty:
+            st.dataframe(df.set_index('book_id'), width="stretch")
+    with col2:
+        st.markdown("#### Top Titles (all time)")
+        df = execute_query(*queries["top titles (all time)"], fetch=True)
+        if df is not None and not df.empty:
+            st.dataframe(df.set_index('book_id'), width="stretch")
+
+    st.markdown("#### Top Borrowers")
+    df = execute_query(*queries["top borrowers"], fetch=True)
+    if df is not None and not df.empty:
+        st.dataframe(df.set_index('student_id'), width="stretch")
+
+    st.markdown("#### Overdue Rate by Issue Month (%)")
+    df = execute_query(*queries["overdue rate by cohort"], fetch=True)
+    if df is not None and not df.empty:
+        st.bar_chart(df.set_index('cohort')['overdue_rate'])
+        st.dataframe(df.set_index('cohort'), width="stretch")
+
+    st.caption("The summaries are updated with every issue and return. Rebuilding recomputes them from all loans, "
+               "archived ones included.")
+    if st.button("Rebuild and Verify Summaries"):
+        try:
+            differences = rebuild(get_db_connection())
+        except sqlite3.Error as e:
+            st.error(f"Could not rebuild the summaries: {e}")
+            return
+        if any(differences.values()):
+            st.warning("Corrected " + ", ".join(f"{rows} rows of {table}" for table, rows in differences.items() if rows) + ".")
+        else:
+            st.success("Summaries verified: they match the loans.")
+
+    if st.button("Update Recommendations"):
+        try:
+            stats = refresh_recommendations(get_db_connection())
+        except sqlite3.Error as e:
+            st.error(f"Could not update the recommendations: {e}")
+            return
+        st.success(f"Folded in {stats.loans} new loans; re-ranked {stats.books_ranked} books in {stats.seconds:.1f} s.")
+
+
+# --- DIAGNOSTICS ---
+
+def diagnostics_page():
+    import pandas as pd # Deferred until this page needs it; the login page never loads pandas
+
+    st.subheader("🩺 Diagnostics")
+
+    st.markdown("#### Query Cache")
+    stats = get_query_cache().stats()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Hit Rate", f"{stats['hit_rate']:.0%}")
+    col2.metric("Hits / Misses", f"{stats['hits']} / {stats['misses']}")
+    col3.metric("Evictions", stats['evictions'])
+    col4.metric("Memory", f"{stats['bytes'] / 2**20:.1f} / {stats['max_bytes'] / 2**20:.0f} MB")
+    st.caption(f"{stats['entries']} cached results, {stats['invalidations']} dropped after a write.")
+    if stats['generations']:
+        st.dataframe(
+            pd.DataFrame(sorted(stats['generations'].items()), columns=["table", "generation"]).set_index("table"),
+            width="stretch",
+        )
+
+    st.markdown("#### Query Latency")
+    if not METRICS.enabled:
+        st.info("Instrumentation is off (LMS_METRICS=0).")
+        return
+    queries = METRICS.query_report()
+    if queries:
+        st.dataframe(pd.DataFrame(queries).set_index("query"), width="stretch")
+    else:
+        st.info("No queries recorded yet.")
+
+    st.markdown("#### Page Render Latency")
+    pages = METRICS.page_report()
+    if pages:
+        st.dataframe(pd.DataFrame(pages).set_index("page"), width="stretch")
+
+    st.caption(f"Queries slower than {METRICS.slow_query_seconds * 1000:.0f} ms are logged to {SLOW_QUERY_LOG}.")
+    col1, col2 = st.columns(2)
+    if col1.button("Write Prometheus Metrics File"):
+        try:
+            st.success(f"Metrics written to {METRICS.write_prometheus()}.")
+        except OSError as e:
+            st.error(f"Could not write metrics: {e}")
+    if col2.button("Reset Metrics"):
+        METRICS.reset()
+        st.rerun()
 
 
 # --- 5. STUDENT PORTAL PAGES ---
@@ -388,53 +790,81 @@ def return_book_form():
 def student_view_issued():
     st.subheader("📚 Your Issued Books")
     student_id = st.session_state['user_id']
+    show = st.radio("Show", list(ISSUE_FILTERS), horizontal=True, key="issued_filter")
     
-    # Query to join IssueTable and Books
-    # CHANGED: Replaced %s with ? in the query
-    query = """
-    SELECT 
-        it.issue_id, b.title, b.author, it.issue_date, it.due_date, 
-        CASE WHEN it.is_returned = 0 THEN 'No' ELSE 'Yes' END AS Returned, 
-        it.fine_amount
-    FROM IssueTable it
-    JOIN Books b ON it.book_id = b.book_id
-    WHERE it.student_id = ? 
-    ORDER BY it.issue_date DESC
-    """
-    
-    df = execute_query(query, (student_id,), fetch=True)
+    # Loans joined to Books, newest first, one page at a time; archived loans are all returned
+    pager = issue_history_pager(include_archive=show != "Not returned")
+    conditions, params = issue_history_conditions(student_id, show)
+
+    def add_overdue(df):
+        import pandas as pd # Already loaded: df is a DataFrame
+
+        # Whole-column date arithmetic; each loan is compared against its own due date
+        today = pd.Timestamp(date.today())
+        days_overdue = (today - pd.to_datetime(df['due_date'])).dt.days
+        overdue = (df['Returned'] == 'No') & (days_overdue > 0)
+        df['Overdue'] = overdue.map({True: 'Yes', False: 'No'})
+        df['fine_due'] = DEFAULT_POLICY.accrue(days_overdue).where(overdue, 0.0)
+        return df
     
-    if df is not None and not df.empty:
-        df['Overdue'] = df['Returned'].apply(
-            lambda x: 'Yes' if x == 'No' and date.fromisoformat(df[df['Returned'] == 'No']['due_date'].iloc[0]) < date.today() else 'No'
-        )
-        st.dataframe(df.set_index('issue_id'), use_container_width=True)
-    else:
+    if not show_paged(pager, conditions, params, "issued_page", (student_id, show), 'issue_id', decorate=add_overdue):
         st.info("You currently have no recorded issue history.")
 
 
 def student_view_available():
     st.subheader("🔎 Search Available Books")
-    search_term = st.text_input("Search by Title or Author")
-    
-    search_param = f"%{search_term}%"
+    found = show_catalog("available_page", AVAILABLE_COLUMNS, available_only=True)
 
-    if search_term:
-        # CHANGED: Replaced %s with ? in the query
-        query = "SELECT book_id, title, author, copies_available FROM Books WHERE copies_available > 0 AND (title LIKE ? OR author LIKE ?)"
-        params = (search_param, search_param)
+    if not found and st.session_state.get("available_page_search"):
+        st.info(f"No available books found matching '{st.session_state['available_page_search']}'.")
+    elif not found:
+        st.info("No books are currently available.")
+
+    st.markdown("#### 📖 Students Who Borrowed This Also Borrowed")
+    recent = execute_query(*recent_books_query(st.session_state['user_id']), fetch=True)
+    if recent is not None and not recent.empty:
+        titles = dict(zip(recent['book_id'], recent['title']))
+        book_id = st.selectbox("Because you borrowed", list(titles), format_func=titles.get, key="recommend_book")
     else:
-        query = "SELECT book_id, title, author, copies_available FROM Books WHERE copies_available > 0"
-        params = ()
+        book_id = st.number_input("Book ID", min_value=1, step=1, key="recommend_book_id")
+    # One read of the precomputed neighbours (lms_recommend)
+    df = execute_query(*also_borrowed_query(int(book_id)), fetch=True)
+    if df is not None and not df.empty:
+        st.dataframe(df.set_index('book_id'), width="stretch")
+    else:
+        st.info("No recommendations for this book yet.")
 
-    df = execute_query(query, params, fetch=True)
-    
+def student_view_holds():
+    st.subheader("📌 Your Holds")
+    student_id = st.session_state['user_id']
+
+    # Queue positions come from the hold index; there is no need to watch the catalog for returns
+    df = execute_query(*student_holds_query(student_id), fetch=True)
     if df is not None and not df.empty:
-        st.dataframe(df.set_index('book_id'), use_container_width=True)
-    elif search_term:
-        st.info(f"No available books found matching '{search_term}'.")
+        ready = df[df['status'] == 'ready']
+        for row in ready.itertuples():
+            st.success(f"'{row.title}' is waiting for you at the desk until {row.expires}.")
+        st.dataframe(df.set_index('hold_id'), width="stretch")
+        with st.form("cancel_hold_form"):
+            hold_id = st.selectbox("Hold", df['hold_id'].tolist())
+            if st.form_submit_button("Cancel Hold"):
+                if cancel_hold(get_db_connection(), int(hold_id), student_id):
+                    st.rerun()
+                st.error("That hold is no longer active.")
     else:
-        st.info("No books are currently available.")
+        st.info("You have no holds.")
+
+    st.markdown("#### Reserve a Book That Is Out")
+    show_catalog("holds_catalog", AVAILABLE_COLUMNS)
+    with st.form("place_hold_form"):
+        book_id = st.number_input("Book ID", min_value=1, step=1)
+        if st.form_submit_button("Place Hold", type="primary"):
+            outcome = lms_service.hold(get_db_connection(), student_id, [int(book_id)], write_queue=get_write_queue())[0]
+            if outcome['ok']:
+                st.success(f"You are number {outcome['position']} in the queue for Book ID {outcome['book_id']}.")
+            else:
+                st.error(outcome['error'])
+
 
 def student_portal():
     st.title("Welcome to the Student Portal")
@@ -442,18 +872,21 @@ def student_portal():
     student_id = st.session_state['user_id']
     # CHANGED: Replaced %s with ? in the query
     query = "SELECT student_name FROM Student WHERE student_id = ?"
-    name_df = execute_query(query, (student_id,), fetch=True)
-    student_name = name_df.iloc[0]['student_name'] if name_df is not None and not name_df.empty else student_id
+    student_name = execute_query(query, (student_id,), fetch="scalar") or student_id
 
     st.markdown(f"### 👋 Hello, {student_name} ({student_id})")
 
     st.sidebar.subheader("Student Menu")
-    student_page = st.sidebar.radio("Go to:", ["Issued Books", "Search Books"], key="student_page")
+    student_page = st.sidebar.radio("Go to:", ["Issued Books", "Search Books", "My Holds"], key="student_page")
     
-    if student_page == "Issued Books":
-        student_view_issued()
-    elif student_page == "Search Books":
-        student_view_available()
+    # Time the page render for the Diagnostics page
+    with METRICS.page_timer(f"student/{student_page}"):
+        if student_page == "Issued Books":
+            student_view_issued()
+        elif student_page == "Search Books":
+            student_view_available()
+        elif student_page == "My Holds":
+            student_view_holds()
 
 
 def admin_portal():
@@ -461,25 +894,41 @@ def admin_portal():
     st.sidebar.subheader("Admin Menu")
     
     admin_page = st.sidebar.radio("Go to:", [
-        "View/Search Books", "Add Book", "Delete Book", 
-        "Issue Book", "Return Book", 
-        "Add Student", "Add Admin"
+        "View/Search Books", "All Branches", "Add Book", "Delete Book", 
+        "Issue Book", "Return Book", "Holds",
+        "Fines", "Analytics", "Add Student", "Add Admin", "Bulk Import", "Export History", "Diagnostics"
     ], key="admin_page")
 
-    if admin_page == "View/Search Books":
-        view_books()
-    elif admin_page == "Add Book":
-        add_book_form()
-    elif admin_page == "Delete Book":
-        delete_book_form()
-    elif admin_page == "Issue Book":
-        issue_book_form()
-    elif admin_page == "Return Book":
-        return_book_form()
-    elif admin_page == "Add Student":
-        add_student_form()
-    elif admin_page == "Add Admin":
-        add_admin_form()
+    # Time the page render for the Diagnostics page
+    with METRICS.page_timer(f"admin/{admin_page}"):
+        if admin_page == "View/Search Books":
+            view_books()
+        elif admin_page == "All Branches":
+            branch_search_page()
+        elif admin_page == "Add Book":
+            add_book_form()
+        elif admin_page == "Delete Book":
+            delete_book_form()
+        elif admin_page == "Issue Book":
+            issue_book_form()
+        elif admin_page == "Return Book":
+            return_book_form()
+        elif admin_page == "Holds":
+            holds_page()
+        elif admin_page == "Fines":
+            fines_page()
+        elif admin_page == "Analytics":
+            analytics_page()
+        elif admin_page == "Add Student":
+            add_student_form()
+        elif admin_page == "Add Admin":
+            add_admin_form()
+        elif admin_page == "Bulk Import":
+            bulk_import_form()
+        elif admin_page == "Export History":
+            export_history_form()
+        elif admin_page == "Diagnostics":
+            diagnostics_page()
 
 # --- MAIN APP EXECUTION ---
 
@@ -492,7 +941,7 @@ def login_ui():
     
     with col1:
         st.subheader("👑 Admin Login")
-        st.image("https://placehold.co/400x200/4c0e66/ffffff?text=Admin+Access", use_container_width=True)
+        st.image(asset_image(ADMIN_IMAGE, 200), width=200)
         with st.form("admin_login_form"):
             admin_user = st.text_input("Username", key="al_user", value="admin")
             admin_pass = st.text_input("Password", type="password", key="al_pass", value="admin123")
@@ -501,7 +950,7 @@ def login_ui():
 
     with col2:
         st.subheader("🧑‍🎓 Student Login")
-        st.image("https://placehold.co/400x200/004d40/ffffff?text=Student+Access", use_container_width=True)
+        st.image(asset_image(STUDENT_IMAGE, 200), width=200)
         with st.form("student_login_form"):
             student_id = st.text_input("Student ID (e.g., S001)", key="sl_id")
             if st.form_submit_button("Login as Student"):
@@ -512,11 +961,12 @@ def login_ui():
 
 def main():
     """Main function to run the Streamlit app."""
-    # Ensure tables and default admin are created on startup (or if DB file is missing)
-    create_tables()
-
+    # Must be the first Streamlit call of the run, before anything renders
     st.set_page_config(layout="wide", page_title="Library System")
 
+    # Ensure tables and default admin are created on startup (or if DB file is missing); cached per process
+    create_tables()
+
     # Sidebar for logout
     with st.sidebar:
         st.header("LMS Navigation")
@@ -525,7 +975,7 @@ def main():
         else:
             st.info("Please log in to proceed.")
             # Simple logo/info
-            st.image("https://placehold.co/150x50/f97316/ffffff?text=Library+System", use_container_width=True)
+            st.image(asset_image(LOGO_IMAGE, LOGO_WIDTH), width="stretch")
     
     # Content Area
     if not st.session_state['logged_in']:
@@ -0,0 +1,328 @@
+"""Circulation analytics over small summary tables.
+
+Triggers on IssueTable keep the summaries current in the same transaction
+as every issue and return, so the dashboard never reads IssueTable:
+
+    DailyBookCirculation  issues and returns per day and book
+    DailyCirculation      issues, returns and fines charged per day
+    BookCirculation       all-time issues and returns per book
+    StudentCirculation    per-student issues, returns, open loans, late returns, fines
+    LoanCohorts           loans per issue month, returned late / on time
+    OpenLoansByDue        open loans per issue month and due date (overdue counts)
+
+The summaries count every loan ever recorded: archiving (lms_archive) moves
+returned loans out of IssueTable without touching them. The rebuild command
+recomputes every summary from the live and archived loans, reports the rows
+that differed, and replaces them:
+
+    python -m lms_analytics verify
+    python -m lms_analytics rebuild
+"""
+import argparse
+from datetime import date, timedelta
+
+from lms_db import DB_FILE
+
+SUMMARY_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS DailyBookCirculation (
+        day TEXT NOT NULL,
+        book_id INTEGER NOT NULL,
+        issues INTEGER NOT NULL DEFAULT 0,
+        returns INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, book_id)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS DailyCirculation (
+        day TEXT PRIMARY KEY,
+        issues INTEGER NOT NULL DEFAULT 0,
+        returns INTEGER NOT NULL DEFAULT 0,
+        fines REAL NOT NULL DEFAULT 0.0
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS BookCirculation (
+        book_id INTEGER PRIMARY KEY,
+        issues INTEGER NOT NULL DEFAULT 0,
+        returns INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS StudentCirculation (
+        student_id TEXT PRIMARY KEY,
+        issues INTEGER NOT NULL DEFAULT 0,
+        returns INTEGER NOT NULL DEFAULT 0,
+        open_loans INTEGER NOT NULL DEFAULT 0,
+        late_returns INTEGER NOT NULL DEFAULT 0,
+        fines REAL NOT NULL DEFAULT 0.0
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS LoanCohorts (
+        cohort TEXT PRIMARY KEY,
+        issued INTEGER NOT NULL DEFAULT 0,
+        returned_late INTEGER NOT NULL DEFAULT 0,
+        returned_on_time INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS OpenLoansByDue (
+        cohort TEXT NOT NULL,
+        due_date TEXT NOT NULL,
+        loans INTEGER NOT NULL,
+        PRIMARY KEY (cohort, due_date)
+    ) WITHOUT ROWID
+    """,
+    # Top titles and top borrowers of all time
+    "CREATE INDEX IF NOT EXISTS idx_book_circulation_issues ON BookCirculation (issues DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_student_circulation_issues ON StudentCirculation (issues DESC)",
+]
+
+# Students with a loan out (active borrowers on the KPI row); created by migration 11
+ACTIVE_BORROWERS_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_student_circulation_open ON StudentCirculation (open_loans) WHERE open_loans > 0
+"""
+
+# Summaries with one row per day or month (per month and due date for open loans): they stay small
+# however long the history grows, so the dashboard reads them whole
+CALENDAR_TABLES = ("DailyCirculation", "LoanCohorts", "OpenLoansByDue")
+
+# Statements for the loan NEW being issued
+_ISSUE_EVENT = """
+    INSERT INTO DailyBookCirculation (day, book_id, issues) VALUES (NEW.issue_date, NEW.book_id, 1)
+        ON CONFLICT DO UPDATE SET issues = issues + 1;
+    INSERT INTO DailyCirculation (day, issues) VALUES (NEW.issue_date, 1)
+        ON CONFLICT DO UPDATE SET issues = issues + 1;
+    INSERT INTO BookCirculation (book_id, issues) VALUES (NEW.book_id, 1)
+        ON CONFLICT DO UPDATE SET issues = issues + 1;
+    INSERT INTO StudentCirculation (student_id, issues, open_loans) VALUES (NEW.student_id, 1, 1)
+        ON CONFLICT DO UPDATE SET issues = issues + 1, open_loans = open_loans + 1;
+    INSERT INTO LoanCohorts (cohort, issued) VALUES (substr(NEW.issue_date, 1, 7), 1)
+        ON CONFLICT DO UPDATE SET issued = issued + 1;
+    INSERT INTO OpenLoansByDue (cohort, due_date, loans) VALUES (substr(NEW.issue_date, 1, 7), NEW.due_date, 1)
+        ON CONFLICT DO UPDATE SET loans = loans + 1;
+"""
+
+# Statements for the loan NEW being returned, each guarded by {guard}
+_RETURN_EVENT = """
+    INSERT INTO DailyBookCirculation (day, book_id, returns) SELECT NEW.return_date, NEW.book_id, 1 WHERE {guard}
+        ON CONFLICT DO UPDATE SET returns = returns + 1;
+    INSERT INTO DailyCirculation (day, returns, fines) SELECT NEW.return_date, 1, COALESCE(NEW.fine_amount, 0) WHERE {guard}
+        ON CONFLICT DO UPDATE SET returns = returns + 1, fines = fines + excluded.fines;
+    UPDATE BookCirculation SET returns = returns + 1 WHERE book_id = NEW.book_id AND {guard};
+    UPDATE StudentCirculation
+    SET returns = returns + 1, open_loans = open_loans - 1, late_returns = late_returns + (NEW.return_date > NEW.due_date),
+        fines = fines + COALESCE(NEW.fine_amount, 0)
+    WHERE student_id = NEW.student_id AND {guard};
+    UPDATE LoanCohorts
+    SET returned_late = returned_late + (NEW.return_date > NEW.due_date),
+        returned_on_time = returned_on_time + (NEW.return_date <= NEW.due_date)
+    WHERE cohort = substr(NEW.issue_date, 1, 7) AND {guard};
+    UPDATE OpenLoansByDue SET loans = loans - 1
+    WHERE cohort = substr(NEW.issue_date, 1, 7) AND due_date = NEW.due_date AND {guard};
+    DELETE FROM OpenLoansByDue
+    WHERE cohort = substr(NEW.issue_date, 1, 7) AND due_date = NEW.due_date AND loans = 0 AND {guard};
+"""
+
+SUMMARY_TRIGGERS = [
+    # A loan recorded as already returned (e.g. imported history) counts as issued, then returned.
+    f"""
+    CREATE TRIGGER IF NOT EXISTS analytics_issue AFTER INSERT ON IssueTable
+    BEGIN
+    {_ISSUE_EVENT}
+    {_RETURN_EVENT.format(guard="NEW.is_returned = 1")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS analytics_return AFTER UPDATE OF is_returned ON IssueTable
+    WHEN OLD.is_returned = 0 AND NEW.is_returned = 1
+    BEGIN
+    {_RETURN_EVENT.format(guard="1")}
+    END
+    """,
+]
+
+# Each summary recomputed from a loans row source {loans}: (table, key columns, query)
+_RECOMPUTE = [
+    ("DailyBookCirculation", "day, book_id", """
+    SELECT day, book_id, SUM(issues), SUM(returns) FROM (
+        SELECT issue_date AS day, book_id, 1 AS issues, 0 AS returns FROM {loans}
+        UNION ALL
+        SELECT return_date, book_id, 0, 1 FROM {loans} WHERE is_returned = 1
+    ) GROUP BY day, book_id
+    """),
+    ("DailyCirculation", "day", """
+    SELECT day, SUM(issues), SUM(returns), ROUND(SUM(fines), 2) FROM (
+        SELECT issue_date AS day, 1 AS issues, 0 AS returns, 0.0 AS fines FROM {loans}
+        UNION ALL
+        SELECT return_date, 0, 1, COALESCE(fine_amount, 0) FROM {loans} WHERE is_returned = 1
+    ) GROUP BY day
+    """),
+    ("BookCirculation", "book_id", """
+    SELECT book_id, COUNT(*), SUM(is_returned = 1) FROM {loans} GROUP BY book_id
+    """),
+    ("StudentCirculation", "student_id", """
+    SELECT student_id, COUNT(*), SUM(is_returned = 1), SUM(is_returned = 0),
+        SUM(is_returned = 1 AND return_date > due_date),
+        ROUND(SUM(CASE WHEN is_returned = 1 THEN COALESCE(fine_amount, 0) ELSE 0 END), 2)
+    FROM {loans} GROUP BY student_id
+    """),
+    ("LoanCohorts", "cohort", """
+    SELECT substr(issue_date, 1, 7), COUNT(*), SUM(is_returned = 1 AND return_date > due_date),
+        SUM(is_returned = 1 AND return_date <= due_date)
+    FROM {loans} GROUP BY 1
+    """),
+    ("OpenLoansByDue", "cohort, due_date", """
+    SELECT substr(issue_date, 1, 7), due_date, COUNT(*) FROM {loans} WHERE is_returned = 0 GROUP BY 1, 2
+    """),
+]
+
+# REAL columns, compared to the cent (sums of fines differ in the last bits with the order of addition)
+_MONEY = {"fines"}
+
+
+def loan_source(conn):
+    """IssueTable, or IssueTable plus the archived loans when the history database is attached."""
+    from lms_archive import ALL_LOANS, ARCHIVE_SCHEMA  # lms_archive imports lms_migrations, which imports us
+
+    archived = conn.execute(
+        "SELECT 1 FROM pragma_table_list WHERE schema = ? AND name = 'IssueHistory'", (ARCHIVE_SCHEMA,)
+    ).fetchone()
+    return ALL_LOANS if archived else "IssueTable"
+
+
+def refresh_summaries(conn, replace=True, loans=None):
+    """Recomputes every summary from the loans inside the caller's write transaction.
+
+    Returns {table: rows that differed}. With ``replace`` the summaries are
+    overwritten with the recomputed rows; otherwise they are only compared.
+    """
+    loans = loans or loan_source(conn)
+    differences = {}
+    for table, _, query in _RECOMPUTE:
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+        compared = ", ".join(f"ROUND({c}, 2)" if c in _MONEY else c for c in columns)
+        conn.execute(f"DROP TABLE IF EXISTS temp.fresh_{table}")
+        conn.execute(f"CREATE TEMP TABLE fresh_{table} ({', '.join(columns)})")
+        conn.execute(f"INSERT INTO temp.fresh_{table} {query.format(loans=loans)}")
+        differences[table] = conn.execute(f"""
+        SELECT COUNT(*) FROM (
+            SELECT * FROM (SELECT {compared} FROM {table} EXCEPT SELECT {compared} FROM temp.fresh_{table})
+            UNION ALL
+            SELECT * FROM (SELECT {compared} FROM temp.fresh_{table} EXCEPT SELECT {compared} FROM {table})
+        )
+        """).fetchone()[0]
+        if replace:
+            conn.execute(f"DELETE FROM {table}")
+            conn.execute(f"INSERT INTO {table} SELECT * FROM temp.fresh_{table}")
+        conn.execute(f"DROP TABLE temp.fresh_{table}")
+    return differences
+
+
+def rebuild(pool, replace=True):
+    """Recomputes (and with ``replace``, rewrites) the summaries in one write transaction; returns the differences."""
+    with pool.writer() as conn:
+        return refresh_summaries(conn, replace)
+
+
+# --- DASHBOARD QUERIES (summaries only) ---
+
+def kpi_query(today=None):
+    """(query, params) for one row: today's issues and returns, open loans, overdue loans, active borrowers."""
+    today = (today or date.today()).isoformat()
+    return """
+    SELECT
+        COALESCE((SELECT issues FROM DailyCirculation WHERE day = :today), 0) AS issued_today,
+        COALESCE((SELECT returns FROM DailyCirculation WHERE day = :today), 0) AS returned_today,
+        COALESCE((SELECT SUM(loans) FROM OpenLoansByDue), 0) AS open_loans,
+        COALESCE((SELECT SUM(loans) FROM OpenLoansByDue WHERE due_date < :today), 0) AS overdue_loans,
+        (SELECT COUNT(*) FROM StudentCirculation WHERE open_loans > 0) AS active_borrowers
+    """, {"today": today}
+
+
+def daily_volume_query(days=90, today=None):
+    """(query, params) for issues, returns and fines per day over the last ``days`` days."""
+    today = today or date.today()
+    return """
+    SELECT day, issues, returns, fines FROM DailyCirculation WHERE day > ? AND day <= ? ORDER BY day
+    """, ((today - timedelta(days=days)).isoformat(), today.isoformat())
+
+
+def top_titles_query(days=None, limit=10, today=None):
+    """(query, params) for the most borrowed titles, of all time or over the last ``days`` days."""
+    if days is None:
+        return """
+        SELECT bc.book_id, b.title, b.author, bc.issues
+        FROM BookCirculation bc LEFT JOIN Books b ON b.book_id = bc.book_id
+        ORDER BY bc.issues DESC LIMIT ?
+        """, (limit,)
+    since = ((today or date.today()) - timedelta(days=days)).isoformat()
+    return """
+    SELECT d.book_id, b.title, b.author, d.issues
+    FROM (SELECT book_id, SUM(issues) AS issues FROM DailyBookCirculation WHERE day > ?
+          GROUP BY book_id ORDER BY issues DESC LIMIT ?) d
+    LEFT JOIN Books b ON b.book_id = d.book_id
+    ORDER BY d.issues DESC
+    """, (since, limit)
+
+
+def top_borrowers_query(limit=10):
+    """(query, params) for the students with the most loans of all time."""
+    return """
+    SELECT sc.student_id, s.student_name, sc.issues, sc.open_loans, sc.late_returns, sc.fines
+    FROM StudentCirculation sc LEFT JOIN Student s ON s.student_id = sc.student_id
+    ORDER BY sc.issues DESC LIMIT ?
+    """, (limit,)
+
+
+def cohort_overdue_query(months=12, today=None):
+    """(query, params) for the overdue rate of each issue month: late returns plus loans still out past due."""
+    today = today or date.today()
+    year, month = divmod(today.year * 12 + today.month - 1 - (months - 1), 12)  # Back by calendar months
+    first = f"{year:04d}-{month + 1:02d}"
+    return """
+    SELECT c.cohort, c.issued, c.returned_late, COALESCE(o.overdue, 0) AS open_overdue,
+        ROUND(100.0 * (c.returned_late + COALESCE(o.overdue, 0)) / c.issued, 1) AS overdue_rate
+    FROM LoanCohorts c
+    LEFT JOIN (SELECT cohort, SUM(loans) AS overdue FROM OpenLoansByDue WHERE due_date < :today GROUP BY cohort) o
+        ON o.cohort = c.cohort
+    WHERE c.cohort >= :first
+    ORDER BY c.cohort
+    """, {"today": today.isoformat(), "first": first}
+
+
+def dashboard_queries(today=None):
+    """Every analytics page query as {name: (query, params)}, for the page and benchmarks.analytics."""
+    return {
+        "kpis": kpi_query(today),
+        "daily volume": daily_volume_query(today=today),
+        "top titles (30 days)": top_titles_query(30, today=today),
+        "top titles (all time)": top_titles_query(),
+        "top borrowers": top_borrowers_query(),
+        "overdue rate by cohort": cohort_overdue_query(today=today),
+    }
+
+
+def main(argv=None):
+    from lms_archive import ARCHIVE_FILE, archive_pool, ensure_archive
+    from lms_migrations import ensure_migrated
+
+    parser = argparse.ArgumentParser(description="Recompute and check the circulation summary tables.")
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    parser.add_argument("--db", default=DB_FILE, help="SQLite database file (default: %(default)s)")
+    parser.add_argument("--archive", default=ARCHIVE_FILE, help="history database file (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    pool = archive_pool(args.db, args.archive)
+    ensure_migrated(pool)
+    ensure_archive(pool)
+    differences = rebuild(pool, replace=args.command == "rebuild")
+    for table, rows in differences.items():
+        print(f"{table}: {f'{rows} rows differed' if rows else 'OK'}")
+    if args.command == "verify" and any(differences.values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""Headless JSON API over lms_service for kiosks and barcode scanners.
+
+A small asyncio HTTP/1.1 server (keep-alive, JSON bodies). SQLite calls run
+on a bounded thread pool, and each worker thread has its own pooled
+connections, so a scan costs one transaction and not a Streamlit rerun.
+Every route calls lms_service, like the Streamlit pages. Issues, returns and
+holds go through the group-commit write queue (lms_writequeue) unless
+started with --no-group-commit.
+
+    python -m lms_api --port 8080 --workers 4
+
+    POST /login/admin    {"username": ..., "password": ...}
+    POST /login/student  {"student_id": ...}
+    GET  /books?q=river&available=1&limit=25
+    POST /issue          {"student_id": "S001", "book_ids": [101, 102]}
+    POST /return         {"issue_ids": [7, 8]}
+    POST /scan/issue     {"student_id": "S001", "barcodes": ["3FA9C1-C000000101"]}
+    POST /scan/return    {"barcodes": ["3FA9C1-C000000101"]}
+    POST /holds          {"student_id": "S001", "book_ids": [103], "priority": "student"}
+    GET  /holds?student_id=S001
+    GET  /health
+
+Set LMS_API_KEY to require a matching ``X-API-Key`` header on every request.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import lms_service
+from lms_holds import DEFAULT_PRIORITY, HOLD_PRIORITIES
+from lms_inventory import ScanCache
+from lms_db import DB_FILE, ConnectionPool
+from lms_metrics import METRICS
+from lms_migrations import ensure_migrated
+from lms_pagination import PAGE_SIZE
+from lms_search import SEARCH_LIMIT
+from lms_writequeue import WriteQueue
+
+WORKERS = 4
+WRITE_WAITERS = 64  # Threads waiting on the write queue; they hold no connection, so batches can exceed WORKERS
+MAX_BODY = 64 * 1024
+MAX_HEADERS = 100  # Header lines per request (the stream reader already caps a line at 64 KiB)
+API_KEY = os.environ.get("LMS_API_KEY")
+
+
+class ApiError(Exception):
+    """An error reported to the client as ``{"error": message}`` with ``status``."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _ids(body, key):
+    ids = body.get(key)
+    if not isinstance(ids, list) or not ids or not all(isinstance(i, int) and not isinstance(i, bool) and i > 0 for i in ids):
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"{key} must be a non-empty list of positive integers")
+    return ids
+
+
+def _barcodes(body):
+    barcodes = body.get("barcodes")
+    if not isinstance(barcodes, list) or not barcodes or not all(isinstance(b, str) and b for b in barcodes):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "barcodes must be a non-empty list of strings")
+    return barcodes
+
+
+def _text(body, key):
+    value = body.get(key)
+    if not isinstance(value, str) or not value:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"{key} is required")
+    return value
+
+
+def _choice(body, key, choices, default):
+    value = body.get(key, default)
+    if not isinstance(value, str) or value not in choices:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"{key} must be one of {', '.join(choices)}")
+    return value
+
+
+class LibraryApi:
+    """Routes requests to lms_service, running every database call on the worker pool."""
+
+    def __init__(self, pool, workers=WORKERS, api_key=API_KEY, write_queue=None, scan_cache=None):
+        self.pool = pool
+        self.write_queue = write_queue
+        self.scan_cache = scan_cache
+        self.api_key = api_key
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="lms-api")
+        self.write_waiters = ThreadPoolExecutor(max_workers=WRITE_WAITERS, thread_name_prefix="lms-api-write")
+        self.routes = {
+            ("GET", "/health"): self.health,
+            ("POST", "/login/admin"): self.login_admin,
+            ("POST", "/login/student"): self.login_student,
+            ("GET", "/books"): self.books,
+            ("POST", "/issue"): self.issue,
+            ("POST", "/return"): self.return_loans,
+            ("POST", "/scan/issue"): self.scan_issue,
+            ("POST", "/scan/return"): self.scan_return,
+            ("POST", "/holds"): self.place_holds,
+            ("GET", "/holds"): self.holds,
+        }
+
+    async def run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, partial(fn, self.pool, *args))
+
+    async def write(self, fn, *args):
+        """Runs an lms_service write through the write queue if there is one, else on the worker pool."""
+        if self.write_queue is None:
+            return await self.run(fn, *args)
+        return await asyncio.get_running_loop().run_in_executor(
+            self.write_waiters, partial(fn, self.pool, *args, write_queue=self.write_queue))
+
+    async def health(self, query, body):
+        return {"status": "ok"}
+
+    async def login_admin(self, query, body):
+        admin_id = await self.run(lms_service.admin_login, _text(body, "username"), _text(body, "password"))
+        if admin_id is None:
+            raise ApiError(HTTPStatus.UNAUTHORIZED, "Invalid Admin Credentials")
+        return {"admin_id": admin_id}
+
+    async def login_student(self, query, body):
+        student = await self.run(lms_service.student_login, _text(body, "student_id"))
+        if student is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, "Invalid Student ID")
+        return student
+
+    async def books(self, query, body):
+        try:
+            limit = max(1, min(int(query.get("limit", [PAGE_SIZE])[0]), SEARCH_LIMIT))
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "limit must be a whole number") from None
+        available = query.get("available", ["0"])[0] not in ("0", "false", "")
+        books = await self.run(partial(lms_service.search_books, limit=limit), query.get("q", [""])[0], available)
+        return {"books": books}
+
+    async def issue(self, query, body):
+        return {"outcomes": await self.write(lms_service.issue, _text(body, "student_id"), _ids(body, "book_ids"))}
+
+    async def return_loans(self, query, body):
+        return {"outcomes": await self.write(lms_service.return_loans, _ids(body, "issue_ids"))}
+
+    async def scan_issue(self, query, body):
+        issue_scanned = partial(lms_service.issue_scanned, cache=self.scan_cache)
+        return {"outcomes": await self.write(issue_scanned, _text(body, "student_id"), _barcodes(body))}
+
+    async def scan_return(self, query, body):
+        return_scanned = partial(lms_service.return_scanned, cache=self.scan_cache)
+        return {"outcomes": await self.write(return_scanned, _barcodes(body))}
+
+    async def place_holds(self, query, body):
+        student_id, priority = _text(body, "student_id"), _choice(body, "priority", HOLD_PRIORITIES, DEFAULT_PRIORITY)
+        return {"outcomes": await self.write(lms_service.hold, student_id, _ids(body, "book_ids"), priority)}
+
+    async def holds(self, query, body):
+        student_id = query.get("student_id", [""])[0]
+        if not student_id:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "student_id is required")
+        return {"holds": await self.run(lms_service.student_holds, student_id)}
+
+    async def dispatch(self, method, target, headers, raw_body):
+        """Returns (status, payload) for one request."""
+        if self.api_key and headers.get("x-api-key") != self.api_key:
+            return HTTPStatus.UNAUTHORIZED, {"error": "Missing or invalid X-API-Key"}
+        url = urlsplit(target)
+        handler = self.routes.get((method, url.path))
+        if handler is None:
+            known = any(path == url.path for _, path in self.routes)
+            status = HTTPStatus.METHOD_NOT_ALLOWED if known else HTTPStatus.NOT_FOUND
+            return status, {"error": status.phrase}
+        try:
+            body = json.loads(raw_body) if raw_body else {}
+            if not isinstance(body, dict):
+                raise ApiError(HTTPStatus.BAD_REQUEST, "Request body must be a JSON object")
+            return HTTPStatus.OK, await handler(parse_qs(url.query), body)
+        except json.JSONDecodeError as e:
+            return HTTPStatus.BAD_REQUEST, {"error": f"Invalid JSON: {e}"}
+        except ApiError as e:
+            return e.status, {"error": str(e)}
+        except sqlite3.Error as e:
+            return HTTPStatus.SERVICE_UNAVAILABLE, {"error": f"Database Error: {e}"}
+        except Exception:
+            traceback.print_exc()  # A bug, not a bad request: keep the details on the server
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": HTTPStatus.INTERNAL_SERVER_ERROR.phrase}
+
+    async def handle(self, reader, writer):
+        """Serves requests on one connection until the client closes it or asks to."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self.respond(writer, HTTPStatus.BAD_REQUEST, {"error": "Malformed request line"}, False)
+                    break
+                headers, lines = {}, 0
+                while lines <= MAX_HEADERS and (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    lines += 1
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                if lines > MAX_HEADERS:
+                    status = HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE
+                    await self.respond(writer, status, {"error": f"More than {MAX_HEADERS} header lines"}, False)
+                    break
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self.respond(writer, HTTPStatus.BAD_REQUEST, {"error": "Invalid Content-Length"}, False)
+                    break
+                if length > MAX_BODY:
+                    await self.respond(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "Body too large"}, False)
+                    break
+                raw_body = await reader.readexactly(length) if length else b""
+                keep_alive = (headers.get("connection", "").lower() != "close") and version == "HTTP/1.1"
+                status, payload = await self.dispatch(method, target, headers, raw_body)
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except ValueError:  # A line longer than the stream reader's limit
+            await self.respond(writer, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, {"error": "Line too long"}, False)
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode()
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+
+    def close(self):
+        self.write_waiters.shutdown(wait=True)
+        self.executor.shutdown(wait=True)
+
+
+async def serve(api, host="127.0.0.1", port=8080, started=None):
+    """Serves ``api`` until cancelled; ``started(server)`` is called once it is listening."""
+    server = await asyncio.start_server(api.handle, host, port)
+    if started:
+        started(server)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the circulation JSON API.")
+    parser.add_argument("--db", default=DB_FILE, help="SQLite database file (default: %(default)s)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="threads running SQLite calls")
+    parser.add_argument("--no-group-commit", action="store_true", help="commit every issue/return on its own")
+    args = parser.parse_args(argv)
+
+    pool = ConnectionPool(args.db, metrics=METRICS)
+    ensure_migrated(pool)
+    write_queue = None if args.no_group_commit else WriteQueue(pool)
+    scan_cache = ScanCache()
+    scan_cache.warm(pool.reader())
+    api = LibraryApi(pool, args.workers, write_queue=write_queue, scan_cache=scan_cache)
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} workers")
+    try:
+        asyncio.run(serve(api, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.close()
+        if write_queue:
+            write_queue.close()
+        pool.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Hot/cold split of circulation history.
+
+IssueTable keeps the working set: open loans and recently returned ones.
+Returned loans older than ARCHIVE_AFTER_DAYS are moved into IssueHistory in
+a separate history database, ATTACHed to the pooled connections as
+``history``. Each batch is one short write transaction (copy, then delete),
+so the app keeps writing between batches and an interrupted run picks up
+where it stopped.
+
+SQLite does not make a commit across two WAL databases atomic. A crash
+in the middle of a batch can therefore leave its loans in both tables until
+the next run; the combined history below skips archived copies of loans
+that are still live.
+
+    python -m lms_archive run --older-than-days 365 --vacuum
+    python -m lms_archive stats
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from lms_db import DB_FILE, ConnectionPool
+from lms_migrations import ensure_migrated
+
+ARCHIVE_FILE = os.environ.get("LMS_ARCHIVE_DB", "lms_history.db")
+ARCHIVE_AFTER_DAYS = int(os.environ.get("LMS_ARCHIVE_AFTER_DAYS", 365))
+BATCH_SIZE = 5000
+
+# Schema name the history database is attached under.
+ARCHIVE_SCHEMA = "history"
+
+LOAN_COLUMNS = "issue_id, book_id, student_id, issue_date, due_date, return_date, fine_amount, is_returned"
+
+HISTORY_SCHEMA = [
+    f"""
+    CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.IssueHistory (
+        issue_id INTEGER PRIMARY KEY,
+        book_id INTEGER NOT NULL,
+        student_id TEXT NOT NULL,
+        issue_date TEXT NOT NULL,
+        due_date TEXT NOT NULL,
+        return_date TEXT,
+        fine_amount REAL DEFAULT 0.0,
+        is_returned BOOLEAN DEFAULT 1
+    )
+    """,
+    # A student's archived history, newest first (same order as idx_issue_student_date)
+    f"""
+    CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_history_student_date
+    ON IssueHistory (student_id, issue_date DESC, issue_id DESC)
+    """,
+]
+
+# Every loan, live and archived, as one row source for FROM clauses.
+ALL_LOANS = f"""(
+    SELECT {LOAN_COLUMNS} FROM IssueTable
+    UNION ALL
+    SELECT {LOAN_COLUMNS} FROM {ARCHIVE_SCHEMA}.IssueHistory h
+    WHERE NOT EXISTS (SELECT 1 FROM IssueTable live WHERE live.issue_id = h.issue_id)
+)"""
+
+_ensured = set()  # Absolute paths of archive files whose schema exists
+_ensured_lock = threading.Lock()
+
+
+@dataclass
+class ArchiveStats:
+    moved: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+
+
+def archive_pool(db_file=DB_FILE, archive_file=ARCHIVE_FILE, **kwargs):
+    """A ConnectionPool on ``db_file`` with the history database attached."""
+    return ConnectionPool(db_file, attach={ARCHIVE_SCHEMA: archive_file}, **kwargs)
+
+
+def ensure_archive(pool):
+    """Creates IssueHistory in the pool's attached history database, once per process."""
+    key = os.path.abspath(pool.attach[ARCHIVE_SCHEMA])
+    if key in _ensured:
+        return
+    with _ensured_lock:
+        if key in _ensured:
+            return
+        # journal_mode cannot change inside a transaction
+        pool.write_connection().execute(f"PRAGMA {ARCHIVE_SCHEMA}.journal_mode = WAL")
+        with pool.writer() as conn:
+            for statement in HISTORY_SCHEMA:
+                conn.execute(statement)
+            # New loans are numbered past the archived ones, also if this archive was moved in after migration 13
+            conn.execute(f"""
+            UPDATE LoanSequence SET last_issue_id = MAX(last_issue_id,
+                (SELECT COALESCE(MAX(issue_id), 0) FROM {ARCHIVE_SCHEMA}.IssueHistory))
+            WHERE id = 1
+            """)
+        _ensured.add(key)
+
+
+def archive_returned(pool, older_than_days=ARCHIVE_AFTER_DAYS, batch_size=BATCH_SIZE, today=None, progress=None):
+    """Moves loans returned more than ``older_than_days`` ago into IssueHistory.
+
+    Works in transactions of ``batch_size`` loans, oldest returns first;
+    ``progress(stats)`` is called after each. Returns ArchiveStats.
+    """
+    ensure_archive(pool)
+    cutoff = ((today or date.today()) - timedelta(days=older_than_days)).isoformat()
+    stats = ArchiveStats()
+    start = time.perf_counter()
+    while True:
+        with pool.writer() as conn:
+            # Served by the partial index idx_issue_returned
+            ids = [row[0] for row in conn.execute(
+                "SELECT issue_id FROM IssueTable WHERE is_returned = 1 AND return_date < ? "
+                "ORDER BY return_date, issue_id LIMIT ?", (cutoff, batch_size))]
+            if not ids:
+                break
+            batch = json.dumps(ids)
+            # Copy first. A loan already archived by an interrupted run is skipped; any other loan with
+            # an archived issue_id fails the batch on the primary key instead of overwriting history.
+            conn.execute(f"""
+            INSERT INTO {ARCHIVE_SCHEMA}.IssueHistory ({LOAN_COLUMNS})
+            SELECT {LOAN_COLUMNS} FROM IssueTable it WHERE it.issue_id IN (SELECT value FROM json_each(?))
+            AND NOT EXISTS (
+                SELECT 1 FROM {ARCHIVE_SCHEMA}.IssueHistory h
+                WHERE h.issue_id = it.issue_id AND h.book_id = it.book_id AND h.student_id = it.student_id
+                    AND h.issue_date = it.issue_date
+            )
+            """, (batch,))
+            conn.execute("DELETE FROM IssueTable WHERE issue_id IN (SELECT value FROM json_each(?))", (batch,))
+        stats.moved += len(ids)
+        stats.batches += 1
+        stats.seconds = time.perf_counter() - start
+        if progress:
+            progress(stats)
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def archive_report(pool):
+    """Row counts and file sizes of the live and history databases, as a dict."""
+    conn = pool.reader()
+
+    def size(schema):
+        return (conn.execute(f"PRAGMA {schema}.page_count").fetchone()[0]
+                * conn.execute(f"PRAGMA {schema}.page_size").fetchone()[0])
+
+    return {
+        "live_loans": conn.execute("SELECT COUNT(*) FROM IssueTable").fetchone()[0],
+        "open_loans": conn.execute("SELECT COUNT(*) FROM IssueTable WHERE is_returned = 0").fetchone()[0],
+        "archived_loans": conn.execute(f"SELECT COUNT(*) FROM {ARCHIVE_SCHEMA}.IssueHistory").fetchone()[0],
+        "live_bytes": size("main"),
+        "archive_bytes": size(ARCHIVE_SCHEMA),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move old returned loans into the history database.")
+    parser.add_argument("command", choices=["run", "stats"])
+    parser.add_argument("--db", default=DB_FILE, help="SQLite database file (default: %(default)s)")
+    parser.add_argument("--archive", default=ARCHIVE_FILE, help="history database file (default: %(default)s)")
+    parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="loans per transaction")
+    parser.add_argument("--vacuum", action="store_true", help="compact the live database afterwards")
+    args = parser.parse_args(argv)
+
+    pool = archive_pool(args.db, args.archive)
+    ensure_migrated(pool)
+    ensure_archive(pool)
+    if args.command == "run":
+        stats = archive_returned(pool, args.older_than_days, args.batch_size, progress=lambda s: print(
+            f"\r{s.moved:,} loans archived in {s.batches} batches", end="", flush=True))
+        print(f"\r{stats.moved:,} loans archived in {stats.batches} batches ({stats.seconds:.1f} s)")
+        if args.vacuum:
+            pool.write_connection().execute("VACUUM main")
+    for key, value in archive_report(pool).items():
+        print(f"{key}={value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Library branches: one database per branch, searched together.
+
+Branches are configured in LMS_BRANCHES as ``name=path`` pairs separated by
+semicolons, e.g. ``Main=lms_data.db;East=east.db;West=west.db``. Without
+it there is a single branch, Main, on DB_FILE.
+
+Federated search runs the FTS5 search on every branch in parallel, on
+threads of its own so concurrent searches never queue behind each other.
+Shards that miss the deadline are cancelled or interrupted and reported in
+``SearchResult.missing``, so one slow branch cannot stall the search. The
+results are merged by title and author, each with its copies on the shelf
+at every branch.
+
+Issue and return are routed to the branch that owns the copy: a generated
+barcode starts with the prefix of the database that printed it (see
+lms_inventory), and ``route`` maps each prefix to its branch. Book and issue
+IDs, and labels without a prefix, are local to a branch, so for those the
+desk picks the branch (students borrow at branches where they are
+registered).
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+from lms_db import DB_FILE
+from lms_inventory import GENERATED_BARCODE, barcode_prefix
+from lms_search import SEARCH_LIMIT, search_query
+
+SEARCH_TIMEOUT = float(os.environ.get("LMS_BRANCH_TIMEOUT", 2.0))  # Seconds per federated search
+
+SEARCH_COLUMNS = ["book_id", "title", "author", "publisher", "year", "copies_available"]
+
+
+def parse_branches(spec):
+    """Parses ``name=path;name=path`` into an ordered {name: path} dict."""
+    branches = {}
+    for entry in filter(None, (part.strip() for part in spec.split(";"))):
+        name, sep, path = entry.partition("=")
+        if not sep or not name.strip() or not path.strip():
+            raise ValueError(f"Branch entries look like name=path, got {entry!r}")
+        branches[name.strip()] = path.strip()
+    return branches
+
+
+BRANCHES = parse_branches(os.environ.get("LMS_BRANCHES", "")) or {"Main": DB_FILE}
+
+
+@dataclass
+class BranchHit:
+    """One title found at one or more branches."""
+    title: str
+    author: str
+    publisher: str
+    year: int
+    score: float  # Best bm25 rank over the branches holding it (lower is better)
+    available: dict = field(default_factory=dict)  # branch -> copies on the shelf
+    book_ids: dict = field(default_factory=dict)  # branch -> book_id at that branch
+
+
+@dataclass
+class SearchResult:
+    hits: list
+    missing: dict  # branch -> reason it is not in the results (timeout or error)
+
+
+class BranchRegistry:
+    """The branch pools, searched together, and the barcode prefix of each."""
+
+    def __init__(self, pools):
+        self.pools = dict(pools)  # name -> ConnectionPool
+        self._prefixes = None  # barcode prefix -> branch; read on the first route()
+        self._prefixes_lock = threading.Lock()
+
+    def pool(self, branch):
+        try:
+            return self.pools[branch]
+        except KeyError:
+            raise ValueError(f"Unknown branch {branch!r}") from None
+
+    def prefixes(self):
+        """{barcode prefix: branch}; the branch databases must be migrated (lms_migrations)."""
+        with self._prefixes_lock:
+            if self._prefixes is None:
+                self._prefixes = {barcode_prefix(pool.reader()): branch for branch, pool in self.pools.items()}
+            return self._prefixes
+
+    def route(self, barcodes, default):
+        """Groups scanned ``barcodes`` by the branch that owns them, in scan order.
+
+        Labels without a prefix go to the ``default`` branch. Returns
+        ({branch: [barcodes]}, {barcode: error}) where the errors are labels
+        printed by a database that is not a configured branch.
+        """
+        self.pool(default)
+        prefixes = self.prefixes()
+        routed, errors = {}, {}
+        for barcode in barcodes:
+            match = GENERATED_BARCODE.fullmatch(barcode)
+            branch = prefixes.get(match[1]) if match else default
+            if branch is None:
+                errors[barcode] = f"Barcode {barcode} was not printed by any branch of this library."
+            else:
+                routed.setdefault(branch, []).append(barcode)
+        return routed, errors
+
+    def _search_shard(self, branch, query, running, stop):
+        conn = self.pools[branch].reader()
+        running[branch] = conn
+        try:
+            if stop.is_set():  # Started after the deadline: the search no longer wants it
+                return []
+            return conn.execute(*query).fetchall()
+        finally:
+            running.pop(branch, None)
+
+    def search(self, search_term, available_only=False, limit=SEARCH_LIMIT, timeout=SEARCH_TIMEOUT):
+        """Searches every branch in parallel; returns a SearchResult ranked best match first."""
+        query = search_query(search_term, SEARCH_COLUMNS, available_only=available_only, limit=limit, with_score=True)
+        if query is None:
+            return SearchResult([], {})
+        running = {}  # branch -> connection still executing, for interrupting stragglers
+        stop = threading.Event()
+        # One thread per shard for this search alone; they end with it
+        executor = ThreadPoolExecutor(max_workers=len(self.pools), thread_name_prefix="lms-branch")
+        futures = {executor.submit(self._search_shard, b, query, running, stop): b for b in self.pools}
+        done, not_done = wait(futures, timeout=timeout)
+        stop.set()  # Before reading running: a shard that registers later sees it and skips its query
+        missing = {}
+        for future in not_done:
+            branch = futures[future]
+            future.cancel()
+            conn = running.get(branch)
+            if conn is not None:
+                conn.interrupt()  # Stops the query; the shard's rows are dropped
+            missing[branch] = f"timed out after {timeout:g} s"
+        executor.shutdown(wait=False)
+
+        hits = {}
+        for future in done:
+            branch = futures[future]
+            try:
+                rows = future.result()
+            except Exception as e:
+                missing[branch] = str(e)
+                continue
+            for row in rows:
+                key = (row["title"].casefold(), row["author"].casefold())
+                hit = hits.get(key)
+                if hit is None:
+                    hit = hits[key] = BranchHit(row["title"], row["author"], row["publisher"], row["year"], row["score"])
+                hit.score = min(hit.score, row["score"])
+                hit.available[branch] = row["copies_available"]
+                hit.book_ids[branch] = row["book_id"]
+        ranked = sorted(hits.values(), key=lambda h: (h.score, h.title))[:limit]
+        return SearchResult(ranked, missing)
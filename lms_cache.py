@@ -0,0 +1,145 @@
+"""Write-aware cache for read query results.
+
+Every table carries a generation counter. A cached result remembers the
+generations of the tables its query reads; when any write transaction that
+touches one of those tables commits, the pool bumps that table's generation
+and the entry is never served again. Entries are evicted least recently
+used first once the cache grows past its memory cap.
+
+The pool only sees commits made through it. Other processes write the same
+file (lms_api, lms_import, lms_archive, the lms_holds sweep, the lms_fines
+snapshot, the lms_recommend batch job), so ``sync`` is given the pool's
+``data_version()`` before every lookup and compares it with the last value
+any thread saw. The number changes only on a commit from outside the pool,
+which drops the whole cache, once, whichever thread notices it; the pool's
+own commits leave it alone and invalidate by table as above.
+"""
+import re
+import threading
+from collections import OrderedDict
+
+from lms_db import ALL_TABLES
+
+MAX_BYTES = 64 * 1024 * 1024
+
+# Tables read by a query: anything after FROM or JOIN, including subqueries,
+# without the schema name of an attached database.
+_READ_TABLE = re.compile(r"\b(?:FROM|JOIN)\s+(?:\w+\.)?[\"\[`]?(\w+)", re.IGNORECASE)
+
+# Tables whose contents are derived from another table by triggers.
+DERIVED_TABLES = {"BooksFTS": "Books"}
+
+
+def tables_read(query):
+    """Returns the base tables a SELECT reads, or an empty set if none are recognized."""
+    return frozenset(DERIVED_TABLES.get(t, t) for t in _READ_TABLE.findall(query))
+
+
+def _key(query, params):
+    # Named parameters arrive as a dict; positional ones as a sequence.
+    if isinstance(params, dict):
+        return query, tuple(sorted(params.items()))
+    return query, tuple(params)
+
+
+class QueryCache:
+    """LRU cache of query results invalidated by table generation counters.
+
+    ``sizeof(value)`` estimates the memory used by a result; results larger
+    than the whole cap are not cached. Safe to share between threads.
+    """
+
+    def __init__(self, max_bytes=MAX_BYTES, sizeof=None):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda value: 0)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (query, params) -> (generations, value, size)
+        self._generations = {}  # table -> int
+        self._epoch = 0  # Bumped by schema changes and other connections' commits; part of every generation snapshot
+        self._data_version = None  # Last ConnectionPool.data_version() passed to sync()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def sync(self, data_version):
+        """Drops every entry if ``data_version`` differs from the one last synced with, by any thread.
+
+        Call it with ``pool.data_version()`` before get(). The first sync
+        drops everything too, since nothing tells what was committed before it.
+        """
+        with self._lock:
+            if data_version != self._data_version:
+                self._data_version = data_version
+                self._epoch += 1
+
+    def snapshot(self, query):
+        """Current generations of the tables ``query`` reads; take it before running the query."""
+        with self._lock:
+            return self._snapshot(tables_read(query))
+
+    def _snapshot(self, tables):
+        return (self._epoch,) + tuple(sorted((t, self._generations.get(t, 0)) for t in tables))
+
+    def get(self, query, params):
+        """Returns the cached result, or None on a miss or a stale entry."""
+        key = _key(query, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                generations, value, size = entry
+                tables = [table for table, _ in generations[1:]]
+                if generations == self._snapshot(tables):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.bytes -= size
+                self.invalidations += 1
+            self.misses += 1
+            return None
+
+    def put(self, query, params, generations, value):
+        """Stores a result fetched under ``generations`` (see snapshot())."""
+        if len(generations) == 1:
+            return  # No known table read: nothing would ever invalidate it
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        key = _key(query, params)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[2]
+            self._entries[key] = (generations, value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def invalidate(self, tables):
+        """Bumps the generation of each written table; pass to ConnectionPool.add_commit_listener."""
+        with self._lock:
+            if ALL_TABLES in tables:
+                self._epoch += 1
+                return
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "epoch": self._epoch,
+                "generations": dict(self._generations),
+            }
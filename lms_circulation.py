@@ -0,0 +1,233 @@
+"""Circulation engine: issue and return books in single transactions.
+
+Every loan is of one physical copy (lms_inventory). The copy's status
+changes inside the same write transaction as the IssueTable change, and the
+Copies triggers keep the Books counters in step, so two desks can never both
+hand out the last copy. Batches (a stack of books at checkout, a drop-box of
+returns) are committed once for the whole batch.
+
+Books can be issued by book ID (any shelf copy) or by scanning a copy's
+barcode (issue_copies / return_copies): a ScanCache hit or one barcode index
+lookup, then one transaction.
+
+Returns and issues also serve the hold queue (lms_holds): a returned copy
+goes to the next waiting hold instead of the shelf, and issuing a book to
+the student whose hold is ready hands over that held copy.
+"""
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from lms_fines import DEFAULT_POLICY
+from lms_holds import allocate_copy, claim_hold
+from lms_inventory import SHELF_COPY, add_copies, barcode_prefix, foreign_barcode, lookup_copy, move_copy
+
+LOAN_DAYS = 15
+
+# The open loan of a scanned copy: served by the partial index idx_issue_open_copy; the barcode and
+# book checks catch a withdrawn copy
+OPEN_LOAN_OF_COPY = """
+SELECT it.issue_id FROM IssueTable it JOIN Copies c ON c.copy_id = it.copy_id
+WHERE it.copy_id = ? AND it.is_returned = 0 AND c.barcode = ? AND c.book_id = ?
+"""
+
+# Loan ids come from LoanSequence, never from IssueTable's highest id: archived loans leave IssueTable
+NEXT_ISSUE_ID = "UPDATE LoanSequence SET last_issue_id = last_issue_id + 1 WHERE id = 1 RETURNING last_issue_id"
+
+
+@dataclass
+class IssueOutcome:
+    book_id: int
+    issue_id: int = None
+    due_date: str = None
+    barcode: str = None
+    error: str = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+@dataclass
+class ReturnOutcome:
+    issue_id: int
+    book_id: int = None
+    days_overdue: int = 0
+    fine: float = 0.0
+    hold_id: int = None  # Hold the copy was given to, if someone was waiting for it
+    held_for: str = None
+    barcode: str = None
+    error: str = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def _lend(conn, student_id, book_id, copy_id, issue_date, due_date):
+    """Records the loan of one copy; returns an IssueOutcome."""
+    barcode = move_copy(conn, copy_id, "loaned")
+    issue_id = conn.execute(NEXT_ISSUE_ID).fetchone()[0]
+    conn.execute(
+        "INSERT INTO IssueTable (issue_id, book_id, student_id, issue_date, due_date, is_returned, copy_id) "
+        "VALUES (?, ?, ?, ?, ?, 0, ?)",
+        (issue_id, book_id, student_id, issue_date, due_date, copy_id),
+    )
+    return IssueOutcome(book_id, issue_id=issue_id, due_date=due_date, barcode=barcode)
+
+
+def _loan_dates(today):
+    today = today or date.today()
+    return today.isoformat(), (today + timedelta(days=LOAN_DAYS)).isoformat()
+
+
+def _scan(conn, barcodes, cache):
+    """(copy_id, book_id) per barcode, None if unknown; another branch's barcodes are not looked up.
+
+    The desks route scans to the owning branch (lms_branches), so those only
+    arrive here through a single-branch caller such as lms_api.
+
+    Returns (copies, error per barcode that has no copy).
+    """
+    prefix = barcode_prefix(conn)
+    copies, errors = [], {}
+    for barcode in barcodes:
+        if foreign_barcode(barcode, prefix):
+            copies.append(None)
+            errors[barcode] = f"Barcode {barcode} was printed by the branch with prefix {barcode[:6]}, not this one."
+            continue
+        copy = lookup_copy(conn, barcode, cache)
+        copies.append(copy)
+        if copy is None:
+            errors[barcode] = f"Barcode {barcode} is not in the inventory."
+    return copies, errors
+
+
+def issue_books(pool, student_id, book_ids, today=None):
+    """Issues each book in ``book_ids`` to ``student_id`` in one transaction.
+
+    Returns one IssueOutcome per book. Books that are unknown or have no copy
+    left are reported in their outcome and do not affect the rest of the batch.
+    """
+    issue_date, due_date = _loan_dates(today)
+    outcomes = []
+
+    with pool.writer() as conn:
+        student = conn.execute("SELECT 1 FROM Student WHERE student_id = ?", (student_id,)).fetchone()
+        for book_id in book_ids:
+            if student is None:
+                outcomes.append(IssueOutcome(book_id, error=f"Student ID {student_id} does not exist."))
+                continue
+            # The student's ready hold already has a copy set aside; otherwise take any shelf copy
+            # (none means unavailable or unknown).
+            copy_id = claim_hold(conn, student_id, book_id)
+            if copy_id is None:
+                shelf = conn.execute(SHELF_COPY, (book_id,)).fetchone()
+                if shelf is None:
+                    outcomes.append(IssueOutcome(book_id, error=f"Book ID {book_id} is not available or does not exist."))
+                    continue
+                copy_id = shelf[0]
+            outcomes.append(_lend(conn, student_id, book_id, copy_id, issue_date, due_date))
+    return outcomes
+
+
+def issue_copies(pool, student_id, barcodes, today=None, cache=None):
+    """Issues the scanned copies to ``student_id`` in one transaction; returns one IssueOutcome per barcode.
+
+    A copy can be issued if it is on the shelf, or set aside for this
+    student's ready hold.
+    """
+    issue_date, due_date = _loan_dates(today)
+    copies, errors = _scan(pool.reader(), barcodes, cache)  # Before taking the write lock
+    outcomes = []
+
+    with pool.writer() as conn:
+        student = conn.execute("SELECT 1 FROM Student WHERE student_id = ?", (student_id,)).fetchone()
+        for barcode, copy in zip(barcodes, copies):
+            if copy is None:
+                outcomes.append(IssueOutcome(None, barcode=barcode, error=errors[barcode]))
+                continue
+            copy_id, book_id = copy
+            if student is None:
+                outcomes.append(IssueOutcome(book_id, barcode=barcode, error=f"Student ID {student_id} does not exist."))
+                continue
+            row = conn.execute(
+                "SELECT status FROM Copies WHERE copy_id = ? AND barcode = ? AND book_id = ?", (copy_id, barcode, book_id)
+            ).fetchone()
+            status = row[0] if row else None
+            if row is None and cache is not None:
+                cache.discard(barcode)  # Withdrawn since it was cached; the next scan looks it up again
+            if status == "held" and conn.execute(
+                "UPDATE Holds SET status = 'fulfilled' WHERE copy_id = ? AND student_id = ? AND status = 'ready' RETURNING hold_id",
+                (copy_id, student_id),
+            ).fetchone():
+                status = "shelf"  # Held for this student
+            if status != "shelf":
+                reason = {None: "is not in the inventory", "loaned": "is already on loan",
+                          "held": "is held for another student"}.get(status, f"is recorded as {status}")
+                outcomes.append(IssueOutcome(book_id, barcode=barcode, error=f"Copy {barcode} {reason}."))
+                continue
+            outcomes.append(_lend(conn, student_id, book_id, copy_id, issue_date, due_date))
+    return outcomes
+
+
+def return_books(pool, issue_ids, today=None, policy=DEFAULT_POLICY):
+    """Returns each loan in ``issue_ids`` in one transaction, charging fines under ``policy``.
+
+    Returns one ReturnOutcome per issue ID. Unknown or already returned loans
+    are reported in their outcome and do not affect the rest of the batch.
+    """
+    return_date = (today or date.today()).isoformat()
+    close_loan = close_loan_query(policy)
+    with pool.writer() as conn:
+        return [_return_loan(conn, close_loan, issue_id, return_date) for issue_id in issue_ids]
+
+
+def return_copies(pool, barcodes, today=None, policy=DEFAULT_POLICY, cache=None):
+    """Returns the open loans of the scanned copies in one transaction; returns one ReturnOutcome per barcode."""
+    return_date = (today or date.today()).isoformat()
+    close_loan = close_loan_query(policy)
+    copies, errors = _scan(pool.reader(), barcodes, cache)  # Before taking the write lock
+    outcomes = []
+
+    with pool.writer() as conn:
+        for barcode, copy in zip(barcodes, copies):
+            loan = copy and conn.execute(OPEN_LOAN_OF_COPY, (copy[0], barcode, copy[1])).fetchone()
+            if not loan:
+                if copy and cache is not None:
+                    cache.discard(barcode)  # In case it was withdrawn since it was cached
+                error = f"Copy {barcode} is not on loan." if copy else errors[barcode]
+                outcomes.append(ReturnOutcome(None, barcode=barcode, error=error))
+                continue
+            outcomes.append(_return_loan(conn, close_loan, loan[0], return_date))
+    return outcomes
+
+
+def close_loan_query(policy=DEFAULT_POLICY):
+    """Closes one open loan and charges its fine under ``policy``; named parameters today and issue_id."""
+    return f"""
+    UPDATE IssueTable
+    SET return_date = :today, fine_amount = {policy.sql()}, is_returned = 1
+    WHERE issue_id = :issue_id AND is_returned = 0
+    RETURNING book_id, due_date, fine_amount, copy_id
+    """
+
+
+def _return_loan(conn, close_loan, issue_id, return_date):
+    """Closes one loan and passes its copy on; returns a ReturnOutcome."""
+    # Closing the loan only succeeds once, even if two desks scan the same item.
+    closed = conn.execute(close_loan, {"today": return_date, "issue_id": issue_id}).fetchone()
+    if closed is None:
+        known = conn.execute("SELECT 1 FROM IssueTable WHERE issue_id = ?", (issue_id,)).fetchone()
+        error = "This book has already been returned." if known else f"Issue ID {issue_id} not found."
+        return ReturnOutcome(issue_id, error=error)
+    book_id, due_date, fine, copy_id = closed
+    if copy_id is None:
+        # A loan recorded without a copy: the book in hand joins the inventory now.
+        copy_id = add_copies(conn, book_id, 1, status="loaned")[0][0]
+    # The next hold gets the copy; it goes back on the shelf only if nobody is waiting.
+    hold = allocate_copy(conn, book_id, copy_id, return_date)
+    barcode = move_copy(conn, copy_id, "held" if hold else "shelf")
+    days_overdue = max((date.fromisoformat(return_date) - date.fromisoformat(due_date)).days, 0)
+    return ReturnOutcome(issue_id, book_id=book_id, days_overdue=days_overdue, fine=fine,
+                         hold_id=hold and hold[0], held_for=hold and hold[1], barcode=barcode)
+
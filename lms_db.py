@@ -0,0 +1,328 @@
+"""SQLite data-access layer for the Library Management System.
+
+Every thread checks a pair of connections out of the pool: a read-only
+connection for SELECTs and a write connection for changes. When the thread
+ends they go back to the pool for the next thread, so a Streamlit rerun
+(each one runs on a new thread) reuses an open connection instead of
+opening, configuring and ATTACHing a new one. The database runs in WAL mode,
+so readers never wait on a writer and a slow catalog scan in one session no
+longer blocks the others.
+"""
+import re
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+# SQLite Database File Path
+DB_FILE = "lms_data.db"
+
+# Seconds a connection waits on a locked database before raising "database is locked".
+BUSY_TIMEOUT = 5.0
+
+# Idle connections of each kind (read-only, write) kept open for the next thread; more are closed.
+MAX_IDLE = 8
+
+# Applied to every pooled connection. journal_mode is persistent in the file,
+# the rest are per-connection settings, set again when a connection comes back to the pool.
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",  # Safe with WAL: only the last commits can be lost on power failure
+    "cache_size": -64000,  # Negative means KiB, i.e. a 64 MB page cache per connection
+    "mmap_size": 268435456,  # Map up to 256 MB of the file instead of read() syscalls
+    "temp_store": "MEMORY",
+}
+
+# Table changed by a data statement, e.g. "INSERT INTO Books", "UPDATE OR IGNORE IssueTable",
+# "DELETE FROM history.IssueHistory" (the schema name of an attached database is skipped).
+_WRITTEN_TABLE = re.compile(
+    r"^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+(?:\w+\.)?[\"\[`]?(\w+)",
+    re.IGNORECASE,
+)
+_SCHEMA_CHANGE = re.compile(r"^\s*(?:CREATE|DROP|ALTER)\b", re.IGNORECASE)
+
+# Tables written by the statements in a trigger body. Trigger writes do not reach the trace callback.
+_TRIGGER_WRITE = re.compile(
+    r"(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+(?:\w+\.)?[\"\[`]?(\w+)",
+    re.IGNORECASE,
+)
+_TRIGGER_BODY = re.compile(r"\bBEGIN\b(.*)\bEND\s*$", re.IGNORECASE | re.DOTALL)
+
+# Wildcard table name reported to commit listeners after a schema change.
+ALL_TABLES = "*"
+
+
+class TimedConnection(sqlite3.Connection):
+    """A connection that reports each execute() and executemany() to ``metrics`` (an lms_metrics.Metrics).
+
+    SELECTs are timed up to their first row; rows are counted for writes.
+    PRAGMAs (the pool's own settings and data_version checks) are not reported.
+    Reads through a cursor, as lms_fetch does, are timed by their caller.
+    """
+
+    metrics = None
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        cursor = super().execute(sql, parameters)
+        if self.metrics is not None and not sql.lstrip()[:6].upper() == "PRAGMA":
+            self.metrics.record_query(sql, parameters, max(cursor.rowcount, 0), time.perf_counter() - started)
+        return cursor
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        cursor = super().executemany(sql, seq_of_parameters)
+        if self.metrics is not None:
+            self.metrics.record_query(sql, (), max(cursor.rowcount, 0), time.perf_counter() - started)
+        return cursor
+
+
+class _Lease:
+    """The connections a thread has checked out; they go back to the pool when the thread ends."""
+
+    __slots__ = ("connections", "__weakref__")
+
+    def __init__(self):
+        self.connections = {}  # read_only -> connection
+
+
+class ConnectionPool:
+    """Hands out one read and one write connection per thread, reusing the connections of ended threads.
+
+    Reads go through ``reader()``. Writes go through ``writer()``, which
+    opens a ``BEGIN IMMEDIATE`` transaction and commits or rolls back on exit.
+    Writers inside this process queue on a lock instead of spinning in the
+    SQLite busy handler; the busy timeout still covers other processes.
+
+    Functions registered with ``add_commit_listener`` are called after every
+    commit with the set of table names the transaction wrote to, including
+    tables written by triggers.
+
+    ``attach`` maps schema names to database files ATTACHed to every
+    connection, e.g. ``{"history": "lms_history.db"}``.
+
+    Up to ``max_idle`` connections of each kind wait for the next thread;
+    the number open at once follows the number of threads using the pool.
+
+    With ``metrics`` (an lms_metrics.Metrics that is enabled), every
+    statement run on a pooled connection is timed (see TimedConnection).
+    """
+
+    def __init__(self, db_file=DB_FILE, pragmas=None, busy_timeout=BUSY_TIMEOUT, attach=None, max_idle=MAX_IDLE,
+                 metrics=None):
+        self.db_file = db_file
+        self.pragmas = dict(PRAGMAS if pragmas is None else pragmas)
+        self.busy_timeout = busy_timeout
+        self.attach = dict(attach or {})
+        self.max_idle = max_idle
+        self.metrics = metrics if metrics is not None and metrics.enabled else None
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._registry_lock = threading.Lock()
+        self._open = set()  # Every connection not yet closed, checked out or idle
+        self._idle = {True: [], False: []}  # read_only -> connections no thread holds
+        self.opened = 0  # Connections opened so far; the rest of the checkouts reused one
+        self._watch = None  # Connection data_version() reads from
+        self._watch_lock = threading.Lock()
+        self._watch_seen = None  # The watch's PRAGMA data_version when last read, or after the pool's own last commit
+        self._external_commits = 0  # Changes the watch saw that were not the pool's own commits
+        self._commit_listeners = []
+        self._trigger_writes = None  # table -> tables its triggers write to (transitively); None = not loaded
+
+    def _connect(self, read_only):
+        # check_same_thread=False because connections move to another thread when theirs ends;
+        # each one is still used by a single thread at a time.
+        conn = sqlite3.connect(
+            self.db_file,
+            timeout=self.busy_timeout,
+            isolation_level=None,  # Transactions are managed explicitly in writer()
+            check_same_thread=False,
+            factory=TimedConnection if self.metrics else sqlite3.Connection,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout * 1000)}")
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        for schema, path in self.attach.items():
+            conn.execute(f"ATTACH DATABASE ? AS {schema}", (path,))
+        if read_only:
+            conn.execute("PRAGMA query_only = 1")
+        else:
+            # Statements are traced on every execution, including cached prepared statements.
+            conn.set_trace_callback(self._record_write)
+        if self.metrics:
+            conn.metrics = self.metrics
+        return conn
+
+    def _checkout(self, read_only):
+        """This thread's connection of the given kind, taken from the idle ones or newly opened."""
+        lease = getattr(self._local, "lease", None)
+        if lease is None:
+            lease = self._local.lease = _Lease()
+            # Runs when the thread ends and its thread-local state is dropped.
+            weakref.finalize(lease, self._checkin, lease.connections).atexit = False
+        conn = lease.connections.get(read_only)
+        if conn is None:
+            with self._registry_lock:
+                conn = self._idle[read_only].pop() if self._idle[read_only] else None
+            if conn is None:
+                conn = self._connect(read_only)
+                with self._registry_lock:
+                    self._open.add(conn)
+                    self.opened += 1
+            lease.connections[read_only] = conn
+        return conn
+
+    def _checkin(self, connections):
+        """Puts the connections of an ended thread back in the pool, or closes them past ``max_idle``."""
+        for read_only, conn in connections.items():
+            with self._registry_lock:
+                if conn not in self._open:
+                    continue  # Closed by close_all()
+                keep = len(self._idle[read_only]) < self.max_idle
+                if not keep:
+                    self._open.discard(conn)
+            if keep:
+                try:
+                    self._reset(conn)
+                except sqlite3.Error:
+                    keep = False
+                    with self._registry_lock:
+                        self._open.discard(conn)
+            if keep:
+                with self._registry_lock:
+                    self._idle[read_only].append(conn)
+            else:
+                conn.close()
+        connections.clear()
+
+    def _reset(self, conn):
+        # A thread that died inside a transaction, or changed a setting (WriteQueue sets synchronous),
+        # must not pass that on to the next one.
+        if conn.in_transaction:
+            conn.rollback()
+        for name, value in self.pragmas.items():
+            if name != "journal_mode":
+                conn.execute(f"PRAGMA {name} = {value}")
+
+    def _record_write(self, sql):
+        written = getattr(self._local, "written", None)
+        if written is None:
+            return
+        match = _WRITTEN_TABLE.match(sql)
+        if match:
+            written.add(match.group(1))
+            written.update(self._trigger_writes.get(match.group(1).lower(), ()))
+        elif _SCHEMA_CHANGE.match(sql):
+            written.add(ALL_TABLES)
+
+    def _load_trigger_writes(self, conn):
+        direct = {}
+        for table, sql in conn.execute("SELECT tbl_name, sql FROM sqlite_master WHERE type = 'trigger'"):
+            body = _TRIGGER_BODY.search(sql)
+            direct.setdefault(table.lower(), set()).update(_TRIGGER_WRITE.findall(body.group(1) if body else ""))
+        closure = {}
+        for table in direct:
+            seen, pending = set(), list(direct[table])
+            while pending:  # Triggers on the tables a trigger writes fire too
+                target = pending.pop()
+                if target not in seen:
+                    seen.add(target)
+                    pending.extend(direct.get(target.lower(), ()))
+            closure[table] = seen
+        self._trigger_writes = closure
+
+    def data_version(self):
+        """A number that changes whenever a connection outside this pool (another process) commits.
+
+        Read from ``PRAGMA data_version`` of one pool-wide connection. Commits
+        through ``writer()`` change that too, so the value it reads after each
+        of them is remembered and not counted; the commit listeners cover
+        those. Values are only comparable with earlier values from this method.
+        """
+        with self._watch_lock:
+            if self._watch is None:
+                self._watch = self._connect(read_only=True)
+                with self._registry_lock:
+                    self._open.add(self._watch)
+            return self._read_watch()
+
+    def _read_watch(self):
+        # Caller holds _watch_lock and the watch is open
+        seen = self._watch.execute("PRAGMA data_version").fetchone()[0]
+        if seen != self._watch_seen:
+            self._watch_seen = seen
+            self._external_commits += 1
+        return self._external_commits
+
+    def _own_commit(self, conn, before):
+        """Records the watch's data_version after a commit through ``conn`` as the pool's own.
+
+        ``before`` is ``conn``'s data_version inside the transaction, when no
+        other connection could commit. If it has changed by the time the
+        watch has been read, another process committed right after ours and
+        the new value is left for data_version() to count.
+        """
+        with self._watch_lock:
+            if self._watch is None:
+                return
+            seen = self._watch.execute("PRAGMA data_version").fetchone()[0]
+            if conn.execute("PRAGMA data_version").fetchone()[0] == before:
+                self._watch_seen = seen
+
+    def add_commit_listener(self, listener):
+        """Registers ``listener(tables)`` to be called after each committed write transaction."""
+        self._commit_listeners.append(listener)
+
+    def reader(self):
+        """Returns this thread's read-only connection."""
+        return self._checkout(read_only=True)
+
+    def write_connection(self):
+        """Returns this thread's write connection, outside of any transaction management."""
+        return self._checkout(read_only=False)
+
+    @contextmanager
+    def writer(self):
+        """Yields this thread's write connection inside a single transaction."""
+        conn = self.write_connection()
+        if conn.in_transaction:
+            # Nested use joins the outer transaction (the lock is already held).
+            yield conn
+            return
+        with self._write_lock:
+            conn.execute("BEGIN IMMEDIATE")
+            if self._trigger_writes is None:
+                self._load_trigger_writes(conn)
+            with self._watch_lock:
+                if self._watch is not None:
+                    self._read_watch()  # Count what other processes committed before this transaction
+            before = conn.execute("PRAGMA data_version").fetchone()[0]
+            self._local.written = set()
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+                self._own_commit(conn, before)
+            finally:
+                written, self._local.written = self._local.written, None
+                if ALL_TABLES in written:
+                    self._trigger_writes = None  # Triggers may have changed
+        if written:
+            for listener in self._commit_listeners:
+                listener(written)
+
+    def close_all(self):
+        """Closes every connection the pool has opened, checked out or idle."""
+        with self._registry_lock:
+            for conn in self._open:
+                conn.close()
+            self._open.clear()
+            self._idle = {True: [], False: []}
+            self._watch = None
+            self._watch_seen = None
+        self._local = threading.local()
@@ -0,0 +1,206 @@
+"""Streaming export of circulation history (IssueTable) to CSV or Parquet.
+
+Rows come from a generator over a dedicated read-only connection and are
+fetched and written in fixed-size chunks, so memory stays bounded however
+many years of loans there are. In WAL mode the long-running read never
+blocks the live app's writers.
+
+    python -m lms_export history.csv --from 2024-01-01 --to 2024-12-31
+    python -m lms_export history.parquet --format parquet --student S001
+
+Loans moved to the history database by lms_archive are included when that
+database exists (--archive, default lms_history.db).
+
+Parquet output needs pyarrow (``pip install pyarrow``).
+"""
+import argparse
+import csv
+import importlib.util
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+
+from lms_archive import ARCHIVE_FILE, ARCHIVE_SCHEMA
+from lms_db import DB_FILE
+
+CHUNK_SIZE = 10000
+
+HISTORY_COLUMNS = ["issue_id", "book_id", "title", "student_id", "issue_date", "due_date",
+                   "return_date", "fine_amount", "is_returned"]
+
+
+@dataclass
+class ExportStats:
+    rows: int = 0
+    seconds: float = 0.0
+    done: bool = False
+    error: str = None
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def history_query(start=None, end=None, student_id=None, include_archive=False):
+    """Returns (query, params) for IssueTable history in issue_id order with optional filters.
+
+    ``include_archive`` adds history.IssueHistory; both sides are read in
+    issue_id order and merged, so nothing is sorted.
+    """
+    conditions, params = [], []
+    if start is not None:
+        conditions.append("it.issue_date >= ?")
+        params.append(start.isoformat())
+    if end is not None:
+        conditions.append("it.issue_date <= ?")
+        params.append(end.isoformat())
+    if student_id:
+        conditions.append("it.student_id = ?")
+        params.append(student_id)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    # LEFT JOIN: loans of books deleted since are still exported.
+    select = """
+    SELECT it.issue_id, it.book_id, b.title, it.student_id, it.issue_date, it.due_date,
+        it.return_date, it.fine_amount, it.is_returned
+    FROM {table} it
+    LEFT JOIN Books b ON b.book_id = it.book_id
+    {where}
+    """
+    query = select.format(table="IssueTable", where=where)
+    if include_archive:
+        # Skip archived copies of loans still live (an interrupted archive batch)
+        live = "NOT EXISTS (SELECT 1 FROM IssueTable live WHERE live.issue_id = it.issue_id)"
+        archived_where = f"{where} AND {live}" if where else f"WHERE {live}"
+        query += "UNION ALL" + select.format(table=f"{ARCHIVE_SCHEMA}.IssueHistory", where=archived_where)
+        params = params * 2
+    return query + "ORDER BY 1", tuple(params)
+
+
+def iter_history(db_file=DB_FILE, start=None, end=None, student_id=None, chunk_size=CHUNK_SIZE,
+                 archive_file=ARCHIVE_FILE):
+    """Yields lists of at most ``chunk_size`` history rows (tuples in HISTORY_COLUMNS order)."""
+    uri = f"{Path(db_file).resolve().as_uri()}?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    try:
+        conn.execute("PRAGMA query_only = 1")
+        include_archive = bool(archive_file) and Path(archive_file).exists()
+        if include_archive:
+            conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (f"{Path(archive_file).resolve().as_uri()}?mode=ro",))
+            include_archive = conn.execute(
+                f"SELECT 1 FROM {ARCHIVE_SCHEMA}.sqlite_master WHERE name = 'IssueHistory'").fetchone() is not None
+        cursor = conn.execute(*history_query(start, end, student_id, include_archive))
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+
+def write_csv(chunks, path):
+    """Writes each chunk to a CSV file as it arrives, yielding the rows written."""
+    with open(path, "w", newline="", encoding="utf-8") as out:
+        writer = csv.writer(out)
+        writer.writerow(HISTORY_COLUMNS)
+        for rows in chunks:
+            writer.writerows(rows)
+            yield len(rows)
+
+
+def write_parquet(chunks, path):
+    """Writes each chunk as a Parquet row group, yielding the rows written."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("issue_id", pa.int64()), ("book_id", pa.int64()), ("title", pa.string()),
+        ("student_id", pa.string()), ("issue_date", pa.string()), ("due_date", pa.string()),
+        ("return_date", pa.string()), ("fine_amount", pa.float64()), ("is_returned", pa.bool_()),
+    ])
+    with pq.ParquetWriter(path, schema) as writer:
+        for rows in chunks:
+            # One row group per chunk
+            columns = list(zip(*rows))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema))
+            yield len(rows)
+
+
+def export_formats():
+    """The formats export_history can write here: Parquet only when pyarrow is installed (it is not imported)."""
+    return ["csv", "parquet"] if importlib.util.find_spec("pyarrow") else ["csv"]
+
+
+def export_history(path, fmt="csv", db_file=DB_FILE, start=None, end=None, student_id=None,
+                   chunk_size=CHUNK_SIZE, stats=None, progress=None, archive_file=ARCHIVE_FILE):
+    """Writes the filtered history to ``path``; returns ExportStats.
+
+    ``stats`` may be passed in to watch a running export from another
+    thread; ``progress(stats)`` is called after every chunk.
+    """
+    stats = stats or ExportStats()
+    began = time.perf_counter()
+    chunks = iter_history(db_file, start, end, student_id, chunk_size, archive_file)
+    writer = write_parquet if fmt == "parquet" else write_csv
+    try:
+        for count in writer(chunks, path):
+            stats.rows += count
+            stats.seconds = time.perf_counter() - began
+            if progress:
+                progress(stats)
+    except Exception as e:
+        stats.error = str(e)
+        raise
+    finally:
+        chunks.close()  # Releases the read connection even if writing failed
+        stats.seconds = time.perf_counter() - began
+        stats.done = True
+    return stats
+
+
+def start_export(path, fmt="csv", db_file=DB_FILE, start=None, end=None, student_id=None):
+    """Runs export_history in a background thread; returns its ExportStats to poll."""
+    stats = ExportStats()
+
+    def run():
+        try:
+            export_history(path, fmt, db_file, start, end, student_id, stats=stats)
+        except Exception:
+            pass  # Recorded in stats.error
+
+    threading.Thread(target=run, name=f"export-{path}", daemon=True).start()
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export circulation history (IssueTable) to CSV or Parquet.")
+    parser.add_argument("output")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--db", default=DB_FILE, help="SQLite database file (default: %(default)s)")
+    parser.add_argument("--archive", default=ARCHIVE_FILE, help="history database, if any (default: %(default)s)")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, help="first issue date (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, help="last issue date (YYYY-MM-DD)")
+    parser.add_argument("--student", help="only this student's loans")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    def report(stats):
+        print(f"\r{stats.rows:,} rows ({stats.rows_per_second:,.0f} rows/s)", end="", file=sys.stderr, flush=True)
+
+    try:
+        stats = export_history(args.output, args.format, args.db, args.start, args.end, args.student,
+                               args.chunk_size, progress=report, archive_file=args.archive)
+    except ImportError:
+        sys.exit("Parquet export needs pyarrow: pip install pyarrow")
+    print(file=sys.stderr)
+    print(f"Exported {stats.rows:,} rows to {args.output} in {stats.seconds:.1f} s "
+          f"({stats.rows_per_second:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
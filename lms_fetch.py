@@ -0,0 +1,194 @@
+"""Result fetch modes: scalar, one row, columns and DataFrame.
+
+The pooled connections return ``sqlite3.Row`` objects, and turning each row
+into a dict before building a DataFrame costs three allocations per row. The
+modes here read plain tuples straight off a cursor (no row factory) and
+let callers ask for only what they need:
+
+    scalar   first column of the first row, e.g. a student's name
+    one      first row as a tuple, e.g. a one-row aggregate
+    columns  {name: array} filled from the cursor in chunks; NumPy arrays
+             when NumPy is installed, lists otherwise. Each chunk becomes
+             arrays before the next is fetched, so the rows are never held
+             as Python lists of the whole result.
+    frame    a pandas DataFrame built from those columns, without dicts
+
+NumPy and pandas are optional and imported on first use, so pages that
+never ask for columns or frames do not pay for them: ``columns`` falls back
+to lists without NumPy, and pandas is imported when a DataFrame is first
+asked for.
+"""
+import functools
+import sys
+
+CHUNK_SIZE = 10000
+
+FETCH_MODES = ("scalar", "one", "columns", "frame")
+
+
+def _cursor(conn, query, params):
+    cursor = conn.cursor()
+    cursor.row_factory = None  # Plain tuples, whatever the connection's row factory
+    return cursor.execute(query, params)
+
+
+def fetch_scalar(conn, query, params=(), default=None):
+    """First column of the first row, or ``default`` if there are no rows."""
+    row = _cursor(conn, query, params).fetchone()
+    return default if row is None else row[0]
+
+
+def fetch_one(conn, query, params=()):
+    """First row as a tuple, or None if there are no rows."""
+    return _cursor(conn, query, params).fetchone()
+
+
+def fetch_lists(conn, query, params=(), chunk_size=CHUNK_SIZE):
+    """Returns (column names, one list per column), transposing ``chunk_size`` rows at a time."""
+    cursor = _cursor(conn, query, params)
+    names = [d[0] for d in cursor.description]
+    columns = [[] for _ in names]
+    while rows := cursor.fetchmany(chunk_size):
+        for column, values in zip(columns, zip(*rows)):
+            column.extend(values)
+    return names, columns
+
+
+@functools.cache
+def _numpy():
+    """The numpy module, or None if it is not installed."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _dtype(np, kinds):
+    """int64 for whole numbers, float64 (NULL as NaN) for numbers with a float among them, else object."""
+    if kinds <= {int}:
+        return np.int64
+    if kinds <= {int, float, type(None)} and float in kinds:
+        return np.float64
+    return object
+
+
+def _array(np, values, dtype):
+    if dtype is np.float64:
+        values = [float("nan") if v is None else v for v in values]
+    try:
+        return np.array(values, dtype=dtype)
+    except OverflowError:  # Integers beyond 64 bits
+        return np.array(values, dtype=object)
+
+
+class _ColumnChunks:
+    """One column as a list of per-chunk arrays, joined once the cursor is exhausted."""
+
+    def __init__(self):
+        self.kinds = set()  # Python types seen in the whole column
+        self.chunks = []
+
+    def add(self, np, values):
+        kinds = set(map(type, values))
+        self.kinds |= kinds
+        self.chunks.append(_array(np, values, _dtype(np, kinds)))
+
+    def array(self, np):
+        dtype = _dtype(np, self.kinds)
+        if dtype is np.int64 and any(c.dtype == object for c in self.chunks):
+            dtype = object  # Integers beyond 64 bits
+        chunks, self.chunks = self.chunks, []
+        if len(chunks) == 1 and chunks[0].dtype == dtype:
+            return chunks[0]
+        # Copied into one array chunk by chunk, releasing each as it goes, so the column is held
+        # about once; a chunk typed on its own rows is converted to the whole column's type
+        column = np.empty(sum(len(c) for c in chunks), dtype=dtype)
+        start = 0
+        for i, chunk in enumerate(chunks):
+            column[start:start + len(chunk)] = chunk if chunk.dtype == dtype else _retype(np, chunk, dtype)
+            start += len(chunk)
+            chunks[i] = None
+        return column
+
+
+def _retype(np, chunk, dtype):
+    values = chunk.tolist()
+    if chunk.dtype == np.float64 and dtype is object:
+        values = [None if v != v else v for v in values]  # NaN was NULL (SQLite has no NaN)
+    return _array(np, values, dtype)
+
+
+def fetch_columns(conn, query, params=(), chunk_size=CHUNK_SIZE):
+    """Returns {column name: values} with NumPy arrays if NumPy is installed, else lists."""
+    np = _numpy()
+    if np is None:
+        names, columns = fetch_lists(conn, query, params, chunk_size)
+        return dict(zip(names, columns))
+    cursor = _cursor(conn, query, params)
+    names = [d[0] for d in cursor.description]
+    columns = [_ColumnChunks() for _ in names]
+    while rows := cursor.fetchmany(chunk_size):
+        for column, values in zip(columns, zip(*rows)):
+            column.add(np, values)
+    return {name: column.array(np) for name, column in zip(names, columns)}
+
+
+def lists_frame(names, columns):
+    """Builds a pandas DataFrame from fetch_lists() output."""
+    import pandas as pd
+
+    return pd.DataFrame(dict(zip(names, columns)), columns=names)
+
+
+def fetch_frame(conn, query, params=(), chunk_size=CHUNK_SIZE):
+    """Returns a pandas DataFrame with the query's columns (and no rows if it matched none)."""
+    return lists_frame(*fetch_lists(conn, query, params, chunk_size))
+
+
+FETCHERS = {"scalar": fetch_scalar, "one": fetch_one, "columns": fetch_columns, "frame": fetch_frame}
+
+
+def fetch(conn, query, params=(), mode="frame"):
+    """Runs ``query`` and returns its result in ``mode`` (one of FETCH_MODES)."""
+    return FETCHERS[mode](conn, query, params)
+
+
+def result_count(result, mode):
+    """Rows in a result of ``mode``, for metrics."""
+    if mode in ("scalar", "one"):
+        return int(result is not None)
+    if mode == "columns":
+        return len(next(iter(result.values()), ()))
+    return len(result)
+
+
+def _values_size(values):
+    # An object array or a list holds pointers; the strings and numbers they point at count too
+    if hasattr(values, "nbytes"):
+        return values.nbytes + (sum(map(sys.getsizeof, values)) if values.dtype == object else 0)
+    return sys.getsizeof(values) + sum(map(sys.getsizeof, values))
+
+
+def result_size(result):
+    """Approximate bytes held by a fetched result, for the query cache."""
+    if hasattr(result, "memory_usage"):  # DataFrame
+        return int(result.memory_usage(deep=True).sum())
+    if isinstance(result, dict):
+        return sum(_values_size(v) for v in result.values())
+    if isinstance(result, tuple):
+        return _values_size(result)
+    return sys.getsizeof(result)
+
+
+def read_only(result):
+    """A ``columns`` result whose values cannot be changed in place: arrays flagged read-only, lists as tuples.
+
+    The query cache hands the same result to every caller.
+    """
+    for name, values in result.items():
+        if hasattr(values, "flags"):
+            values.flags.writeable = False
+        else:
+            result[name] = tuple(values)
+    return result
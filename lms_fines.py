@@ -0,0 +1,124 @@
+"""Fines engine: overdue days and accrued fines for all open loans at once.
+
+Fines are computed by SQLite over the whole set of open loans in one
+statement (served by the IssueTable(is_returned, due_date) index) instead of
+row by row in Python. ``snapshot_accruals`` persists the day's figures into
+FineAccrual; run it nightly with ``python -m lms_fines snapshot``.
+
+The policy comes from the environment (LMS_FINE_RATE, LMS_FINE_GRACE_DAYS,
+LMS_FINE_CAP) or is passed explicitly.
+"""
+import argparse
+import os
+from dataclasses import dataclass
+from datetime import date
+
+from lms_db import DB_FILE, ConnectionPool
+from lms_migrations import ensure_migrated
+
+
+@dataclass(frozen=True)
+class FinePolicy:
+    """Charge ``rate_per_day`` for every day overdue beyond ``grace_days``, up to ``max_fine``."""
+    rate_per_day: float = 5.0 # Example fine: ₹5.00 per day
+    grace_days: int = 0
+    max_fine: float = None # No cap
+
+    @classmethod
+    def from_env(cls):
+        cap = os.environ.get("LMS_FINE_CAP")
+        return cls(
+            rate_per_day=float(os.environ.get("LMS_FINE_RATE", cls.rate_per_day)),
+            grace_days=int(os.environ.get("LMS_FINE_GRACE_DAYS", cls.grace_days)),
+            max_fine=float(cap) if cap else None,
+        )
+
+    def sql(self, due_date="due_date", today=":today"):
+        """SQL expression for the fine on a loan due ``due_date`` and settled ``today``."""
+        days = f"MAX(CAST(julianday({today}) - julianday({due_date}) AS INTEGER) - {int(self.grace_days)}, 0)"
+        fine = f"{days} * {float(self.rate_per_day)}"
+        return fine if self.max_fine is None else f"MIN({fine}, {float(self.max_fine)})"
+
+    def accrue(self, days_overdue):
+        """Vectorized fine for a NumPy array or pandas Series of days overdue."""
+        fine = (days_overdue - self.grace_days).clip(0, None) * self.rate_per_day
+        return fine if self.max_fine is None else fine.clip(None, self.max_fine)
+
+
+DEFAULT_POLICY = FinePolicy.from_env()
+
+
+def _open_overdue(policy):
+    return f"""
+    SELECT issue_id, student_id, book_id, due_date,
+        CAST(julianday(:today) - julianday(due_date) AS INTEGER) AS days_overdue,
+        {policy.sql()} AS accrued_fine
+    FROM IssueTable
+    WHERE is_returned = 0 AND due_date < :today
+    """
+
+
+def accrued_fines_query(policy=DEFAULT_POLICY, today=None, student_id=None, limit=None):
+    """Returns (query, params) listing every open overdue loan with its accrued fine, largest first."""
+    params = {"today": (today or date.today()).isoformat()}
+    query = _open_overdue(policy)
+    if student_id is not None:
+        query += " AND student_id = :student_id"
+        params["student_id"] = student_id
+    query += " ORDER BY accrued_fine DESC, issue_id"
+    if limit is not None:
+        query += " LIMIT :limit"
+        params["limit"] = limit
+    return query, params
+
+
+def fines_summary_query(policy=DEFAULT_POLICY, today=None):
+    """Returns (query, params) for one row: open loans, overdue loans and total accrued fines."""
+    query = f"""
+    SELECT
+        (SELECT COUNT(*) FROM IssueTable WHERE is_returned = 0) AS open_loans,
+        COUNT(*) AS overdue_loans,
+        COALESCE(SUM({policy.sql()}), 0.0) AS total_accrued
+    FROM IssueTable
+    WHERE is_returned = 0 AND due_date < :today
+    """
+    return query, {"today": (today or date.today()).isoformat()}
+
+
+def snapshot_accruals(pool, policy=DEFAULT_POLICY, today=None):
+    """Records today's accrual for every open overdue loan in one statement; returns rows written."""
+    today = (today or date.today()).isoformat()
+    with pool.writer() as conn:
+        # Re-running on the same day replaces that day's snapshot.
+        conn.execute("DELETE FROM FineAccrual WHERE snapshot_date = ?", (today,))
+        cursor = conn.execute(f"""
+        INSERT INTO FineAccrual (snapshot_date, issue_id, student_id, book_id, days_overdue, accrued_fine)
+        SELECT :today, issue_id, student_id, book_id, days_overdue, accrued_fine
+        FROM ({_open_overdue(policy)})
+        """, {"today": today})
+        return cursor.rowcount
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute or snapshot accrued fines for open loans.")
+    parser.add_argument("command", choices=["summary", "snapshot"])
+    parser.add_argument("--db", default=DB_FILE, help="SQLite database file (default: %(default)s)")
+    parser.add_argument("--date", type=date.fromisoformat, default=None, help="accrual date (default: today)")
+    parser.add_argument("--rate", type=float, default=DEFAULT_POLICY.rate_per_day)
+    parser.add_argument("--grace-days", type=int, default=DEFAULT_POLICY.grace_days)
+    parser.add_argument("--cap", type=float, default=DEFAULT_POLICY.max_fine)
+    args = parser.parse_args(argv)
+
+    policy = FinePolicy(args.rate, args.grace_days, args.cap)
+    pool = ConnectionPool(args.db)
+    ensure_migrated(pool)
+    if args.command == "snapshot":
+        written = snapshot_accruals(pool, policy, args.date)
+        print(f"Recorded {written} accruals for {(args.date or date.today()).isoformat()}")
+    else:
+        row = pool.reader().execute(*fines_summary_query(policy, args.date)).fetchone()
+        print(", ".join(f"{key}={row[key]}" for key in row.keys()))
+
+
+if __name__ == "__main__":
+    main()
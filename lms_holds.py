@@ -0,0 +1,235 @@
+"""Holds: a queue of students waiting for a book with no copy on the shelf.
+
+Holds live in the Holds table. The partial index idx_holds_queue keeps every
+book's waiting holds in serving order (priority class, then first come,
+first served). Finding the next hold is therefore a single B-tree descent,
+O(log n), and it stays consistent with the loans because it runs in the
+same transaction.
+
+A returned copy goes straight to the next waiting hold in the return
+transaction (lms_circulation.return_books) and does not go back on the
+shelf. The hold becomes ``ready`` and records the copy, which waits at the
+desk for HOLD_PICKUP_DAYS (status ``held`` in lms_inventory). Issuing that
+book to that student claims the hold and lends that copy. The expiry sweep runs as a batch, e.g.
+nightly:
+
+    python -m lms_holds sweep
+
+It expires ready holds nobody collected, passing their copies on, and
+expires holds that waited longer than HOLD_WAIT_DAYS.
+"""
+import argparse
+import json
+import os
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from lms_db import DB_FILE, ConnectionPool
+from lms_inventory import SHELF_COPY, move_copy
+from lms_migrations import ensure_migrated
+
+HOLD_PICKUP_DAYS = int(os.environ.get("LMS_HOLD_PICKUP_DAYS", 7))
+HOLD_WAIT_DAYS = int(os.environ.get("LMS_HOLD_WAIT_DAYS", 180))
+
+# Priority classes, served lowest number first; FIFO within a class
+HOLD_PRIORITIES = {"faculty": 0, "student": 1}
+DEFAULT_PRIORITY = "student"
+
+ACTIVE = "status IN ('waiting', 'ready')"  # Same text as the idx_holds_expires WHERE clause
+
+NEXT_HOLD = """
+UPDATE Holds SET status = 'ready', ready_date = :today, expires = :expires, copy_id = :copy_id
+WHERE hold_id = (
+    SELECT hold_id FROM Holds WHERE book_id = :book_id AND status = 'waiting'
+    ORDER BY priority, hold_id LIMIT 1
+)
+RETURNING hold_id, student_id
+"""
+
+CLAIM_HOLD = "UPDATE Holds SET status = 'fulfilled' WHERE student_id = ? AND book_id = ? AND status = 'ready' RETURNING copy_id"
+
+# 1-based place in the book's queue: waiting holds served before this one, plus one
+_POSITION = """
+1 + (SELECT COUNT(*) FROM Holds q
+     WHERE q.book_id = h.book_id AND q.status = 'waiting' AND (q.priority, q.hold_id) < (h.priority, h.hold_id))
+"""
+
+
+@dataclass
+class HoldOutcome:
+    book_id: int
+    hold_id: int = None
+    position: int = None
+    error: str = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+@dataclass
+class SweepStats:
+    expired_waiting: int = 0
+    expired_ready: int = 0
+    passed_on: int = 0  # Uncollected copies given to the next hold
+    shelved: int = 0  # Uncollected copies put back on the shelf
+    filled_from_shelf: int = 0  # Waiting holds given a copy that was on the shelf
+
+
+def allocate_copy(conn, book_id, copy_id, today):
+    """Gives copy ``copy_id`` of ``book_id`` to its next waiting hold, inside the caller's write transaction.
+
+    Returns the (hold_id, student_id) row of that hold, or None if nobody is
+    waiting and the copy belongs on the shelf. The caller sets the copy's status.
+    """
+    expires = (date.fromisoformat(today) + timedelta(days=HOLD_PICKUP_DAYS)).isoformat()
+    return conn.execute(
+        NEXT_HOLD, {"today": today, "expires": expires, "copy_id": copy_id, "book_id": book_id}
+    ).fetchone()
+
+
+def claim_hold(conn, student_id, book_id):
+    """Marks the student's ready hold on ``book_id`` collected; returns the held copy_id, or None if there is none."""
+    row = conn.execute(CLAIM_HOLD, (student_id, book_id)).fetchone()
+    return row[0] if row else None
+
+
+def _release_copy(conn, book_id, copy_id, today):
+    """A held copy came free: give it to the next hold or put it back on the shelf; returns True if passed on."""
+    passed_on = allocate_copy(conn, book_id, copy_id, today) is not None
+    move_copy(conn, copy_id, "held" if passed_on else "shelf")
+    return passed_on
+
+
+def queue_position(conn, hold_id):
+    """1-based place of a waiting hold in its book's queue, or None if it is not waiting."""
+    row = conn.execute(
+        f"SELECT {_POSITION} FROM Holds h WHERE h.hold_id = ? AND h.status = 'waiting'", (hold_id,)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def place_hold(pool, student_id, book_id, priority=DEFAULT_PRIORITY, today=None):
+    """Queues ``student_id`` for the next copy of ``book_id``; returns a HoldOutcome with the queue position.
+
+    Holds are only taken for books with no copy on the shelf, and once per
+    student and book.
+    """
+    if priority not in HOLD_PRIORITIES:
+        return HoldOutcome(book_id, error=f"Unknown priority class {priority!r}.")
+    today = today or date.today()
+    expires = (today + timedelta(days=HOLD_WAIT_DAYS)).isoformat()
+
+    with pool.writer() as conn:
+        if conn.execute("SELECT 1 FROM Student WHERE student_id = ?", (student_id,)).fetchone() is None:
+            return HoldOutcome(book_id, error=f"Student ID {student_id} does not exist.")
+        book = conn.execute("SELECT copies_available FROM Books WHERE book_id = ?", (book_id,)).fetchone()
+        if book is None:
+            return HoldOutcome(book_id, error=f"Book ID {book_id} does not exist.")
+        if book[0] > 0:
+            return HoldOutcome(book_id, error=f"Book ID {book_id} is on the shelf; it can be issued now.")
+        if conn.execute(
+            "SELECT 1 FROM IssueTable WHERE student_id = ? AND book_id = ? AND is_returned = 0", (student_id, book_id)
+        ).fetchone():
+            return HoldOutcome(book_id, error=f"Student {student_id} already has Book ID {book_id}.")
+        if conn.execute(
+            f"SELECT 1 FROM Holds WHERE student_id = ? AND book_id = ? AND {ACTIVE}", (student_id, book_id)
+        ).fetchone():
+            return HoldOutcome(book_id, error=f"Student {student_id} already holds Book ID {book_id}.")
+        hold_id = conn.execute(
+            "INSERT INTO Holds (book_id, student_id, priority, placed_date, status, expires) VALUES (?, ?, ?, ?, 'waiting', ?)",
+            (book_id, student_id, HOLD_PRIORITIES[priority], today.isoformat(), expires),
+        ).lastrowid
+        return HoldOutcome(book_id, hold_id=hold_id, position=queue_position(conn, hold_id))
+
+
+def cancel_hold(pool, hold_id, student_id=None, today=None):
+    """Cancels an active hold (only the student's own if ``student_id`` is given); returns False if there was none.
+
+    A ready hold's copy goes to the next hold or back on the shelf.
+    """
+    today = (today or date.today()).isoformat()
+    with pool.writer() as conn:
+        row = conn.execute(
+            f"UPDATE Holds SET status = 'cancelled' WHERE hold_id = ? AND {ACTIVE} AND student_id = COALESCE(?, student_id) "
+            "RETURNING book_id, copy_id",
+            (hold_id, student_id),
+        ).fetchone()
+        if row is None:
+            return False
+        if row["copy_id"] is not None:
+            _release_copy(conn, row["book_id"], row["copy_id"], today)
+        return True
+
+
+def student_holds_query(student_id):
+    """(query, params) for a student's active holds with their queue positions, ready ones first."""
+    return f"""
+    SELECT h.hold_id, h.book_id, b.title, b.author, h.status, h.placed_date,
+        CASE WHEN h.status = 'waiting' THEN {_POSITION} END AS position,
+        h.expires
+    FROM Holds h JOIN Books b ON b.book_id = h.book_id
+    WHERE h.student_id = ? AND h.{ACTIVE}
+    ORDER BY h.status = 'waiting', h.hold_id
+    """, (student_id,)
+
+
+def expire_holds(pool, today=None):
+    """The expiry sweep, in one write transaction; returns SweepStats.
+
+    Expires holds past their deadline (pickup for ready holds, HOLD_WAIT_DAYS
+    for waiting ones), then hands every freed copy, and any shelf copy of a
+    book that still has a queue (e.g. copies added later), to the next hold.
+    """
+    today = (today or date.today()).isoformat()
+    stats = SweepStats()
+    with pool.writer() as conn:
+        # Served by the partial index idx_holds_expires
+        expired = conn.execute(
+            f"SELECT hold_id, book_id, status, copy_id FROM Holds WHERE {ACTIVE} AND expires < ?", (today,)
+        ).fetchall()
+        conn.execute(
+            "UPDATE Holds SET status = 'expired' WHERE hold_id IN (SELECT value FROM json_each(?))",
+            (json.dumps([row["hold_id"] for row in expired]),),
+        )
+        for row in expired:
+            if row["status"] == "waiting":
+                stats.expired_waiting += 1
+                continue
+            stats.expired_ready += 1
+            if _release_copy(conn, row["book_id"], row["copy_id"], today):
+                stats.passed_on += 1
+            else:
+                stats.shelved += 1
+
+        waiting_with_copies = conn.execute("""
+        SELECT DISTINCT h.book_id FROM Holds h JOIN Books b ON b.book_id = h.book_id
+        WHERE h.status = 'waiting' AND b.copies_available > 0
+        """).fetchall()
+        for (book_id,) in waiting_with_copies:
+            while copy := conn.execute(SHELF_COPY, (book_id,)).fetchone():
+                if allocate_copy(conn, book_id, copy[0], today) is None:
+                    break
+                move_copy(conn, copy[0], "held")
+                stats.filled_from_shelf += 1
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Expire holds and pass their copies on.")
+    parser.add_argument("command", choices=["sweep", "stats"])
+    parser.add_argument("--db", default=DB_FILE, help="SQLite database file (default: %(default)s)")
+    parser.add_argument("--date", type=date.fromisoformat, default=None, help="sweep date (default: today)")
+    args = parser.parse_args(argv)
+
+    pool = ConnectionPool(args.db)
+    ensure_migrated(pool)
+    if args.command == "sweep":
+        stats = expire_holds(pool, args.date)
+        print(", ".join(f"{key}={value}" for key, value in vars(stats).items()))
+    for status, count in pool.reader().execute("SELECT status, COUNT(*) FROM Holds GROUP BY status"):
+        print(f"{status}={count}")
+
+
+if __name__ == "__main__":
+    main()
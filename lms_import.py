@@ -0,0 +1,222 @@
+"""Streaming bulk import of books and students from CSV.
+
+The file is read one row at a time; rows are validated, collected into
+chunks and written with ``executemany``, one transaction per chunk, so memory
+stays flat whatever the file size. Existing IDs are updated in place
+(upsert). Rows that fail validation or the insert are written to an optional
+rejects CSV with the line number and reason. A book's total_copies adds or
+withdraws copies in the per-copy inventory (lms_inventory), which keeps the
+Books counters.
+
+    python -m lms_import books donated.csv --rejects rejected.csv
+    python -m lms_import students roster.csv
+"""
+import argparse
+import csv
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass
+from functools import partial
+
+from lms_db import DB_FILE, ConnectionPool
+from lms_inventory import set_total_copies
+from lms_migrations import ensure_migrated
+
+CHUNK_SIZE = 5000
+
+# Required CSV header columns; books may also have publisher, year and copies_available.
+BOOK_COLUMNS = ["book_id", "title", "author", "total_copies"]
+STUDENT_COLUMNS = ["student_id", "student_name", "student_pass"]
+
+# The copy counters start at zero and follow the copies added by write_books.
+UPSERT_BOOK = """
+INSERT INTO Books (book_id, title, author, publisher, year, copies_available, total_copies)
+VALUES (?, ?, ?, ?, ?, 0, 0)
+ON CONFLICT (book_id) DO UPDATE SET
+    title = excluded.title,
+    author = excluded.author,
+    publisher = excluded.publisher,
+    year = excluded.year
+"""
+
+UPSERT_STUDENT = """
+INSERT INTO Student (student_id, student_name, student_pass) VALUES (?, ?, ?)
+ON CONFLICT (student_id) DO UPDATE SET
+    student_name = excluded.student_name,
+    student_pass = excluded.student_pass
+"""
+
+
+class RowError(ValueError):
+    """A CSV row that cannot be imported."""
+
+
+@dataclass
+class ImportStats:
+    read: int = 0
+    imported: int = 0
+    rejected: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.read / self.seconds if self.seconds else 0.0
+
+
+def _required(row, column):
+    value = (row.get(column) or "").strip()
+    if not value:
+        raise RowError(f"{column} is required")
+    return value
+
+
+def _integer(row, column, minimum, required=True):
+    value = (row.get(column) or "").strip()
+    if not value and not required:
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        raise RowError(f"{column} must be a whole number, got {value!r}") from None
+    if number < minimum:
+        raise RowError(f"{column} must be at least {minimum}")
+    return number
+
+
+def book_params(row):
+    """Validates a Books CSV row and returns (book_id, title, author, publisher, year, copies_available, total_copies)."""
+    total = _integer(row, "total_copies", 1)
+    available = _integer(row, "copies_available", 0, required=False)
+    if available is not None and available > total:
+        raise RowError("copies_available cannot exceed total_copies")
+    return (
+        _integer(row, "book_id", 1),
+        _required(row, "title"),
+        _required(row, "author"),
+        (row.get("publisher") or "").strip() or None,
+        _integer(row, "year", 0, required=False),
+        total if available is None else available,
+        total,
+    )
+
+
+def student_params(row):
+    """Validates a Student CSV row and returns the UPSERT_STUDENT parameters."""
+    return tuple(_required(row, column) for column in STUDENT_COLUMNS)
+
+
+def write_books(conn, rows, cache=None):
+    """Upserts book_params() rows, then adds or withdraws copies to match each total_copies.
+
+    Withdrawn copies are dropped from the ScanCache ``cache`` if given.
+    """
+    conn.executemany(UPSERT_BOOK, (params[:5] for params in rows))
+    for params in rows:
+        set_total_copies(conn, params[0], params[6], params[5], cache)
+
+
+def write_students(conn, rows):
+    conn.executemany(UPSERT_STUDENT, rows)
+
+
+KINDS = {
+    "books": (BOOK_COLUMNS, book_params, write_books),
+    "students": (STUDENT_COLUMNS, student_params, write_students),
+}
+
+
+def import_csv(pool, kind, text_file, chunk_size=CHUNK_SIZE, rejects=None, progress=None, cache=None):
+    """Imports ``kind`` ("books" or "students") rows from an open text file.
+
+    ``rejects`` is an optional text file that receives the rejected rows;
+    ``progress(stats)`` is called after every committed chunk; ``cache`` is
+    the process's ScanCache, if any, to drop withdrawn copies from. Returns
+    the final ImportStats.
+    """
+    columns, to_params, write = KINDS[kind]
+    if write is write_books:
+        write = partial(write_books, cache=cache)
+    reader = csv.DictReader(text_file)
+    missing = [c for c in columns if c not in (reader.fieldnames or [])]
+    if missing:
+        raise RowError(f"CSV header is missing column(s): {', '.join(missing)}")
+
+    stats = ImportStats()
+    reject_writer = None
+    if rejects is not None:
+        reject_writer = csv.writer(rejects)
+        reject_writer.writerow(["line", "error"] + reader.fieldnames)
+
+    def reject(line, error, row):
+        stats.rejected += 1
+        if reject_writer:
+            reject_writer.writerow([line, error] + [row.get(c, "") for c in reader.fieldnames])
+
+    start = time.perf_counter()
+    chunk = []  # (line, row, params)
+
+    def flush():
+        try:
+            with pool.writer() as conn:
+                write(conn, [params for _, _, params in chunk])
+            stats.imported += len(chunk)
+        except sqlite3.IntegrityError:
+            # Find the offending rows one by one; the rest of the chunk still goes in.
+            for line, row, params in chunk:
+                try:
+                    with pool.writer() as conn:
+                        write(conn, [params])
+                    stats.imported += 1
+                except sqlite3.IntegrityError as e:
+                    reject(line, str(e), row)
+        chunk.clear()
+        stats.seconds = time.perf_counter() - start
+        if progress:
+            progress(stats)
+
+    for row in reader:
+        stats.read += 1
+        try:
+            chunk.append((reader.line_num, row, to_params(row)))
+        except RowError as e:
+            reject(reader.line_num, str(e), row)
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk or stats.read == 0:
+        flush()
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import books or students from a CSV file.")
+    parser.add_argument("kind", choices=sorted(KINDS))
+    parser.add_argument("csv_file")
+    parser.add_argument("--db", default=DB_FILE, help="SQLite database file (default: %(default)s)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="rows per transaction")
+    parser.add_argument("--rejects", help="write rejected rows to this CSV file")
+    args = parser.parse_args(argv)
+
+    pool = ConnectionPool(args.db)
+    ensure_migrated(pool)
+
+    def report(stats):
+        print(f"\r{stats.read} read, {stats.imported} imported, {stats.rejected} rejected "
+              f"({stats.rows_per_second:,.0f} rows/s)", end="", file=sys.stderr, flush=True)
+
+    rejects = open(args.rejects, "w", newline="", encoding="utf-8") if args.rejects else None
+    try:
+        with open(args.csv_file, newline="", encoding="utf-8-sig") as f:
+            stats = import_csv(pool, args.kind, f, args.chunk_size, rejects, report)
+    except RowError as e:
+        sys.exit(f"{args.csv_file}: {e}")
+    finally:
+        if rejects:
+            rejects.close()
+    print(file=sys.stderr)
+    print(f"Imported {stats.imported} of {stats.read} {args.kind} in {stats.seconds:.1f} s; {stats.rejected} rejected")
+
+
+if __name__ == "__main__":
+    main()
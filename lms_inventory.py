@@ -0,0 +1,208 @@
+"""Per-copy inventory: every physical copy of a book has a barcode.
+
+Copies holds one row per copy with its status: ``shelf``, ``loaned``,
+``held`` (set aside for a ready hold) or ``missing``. Loans and ready holds
+point at their copy by copy_id. Books.total_copies and copies_available are
+kept in step by triggers on Copies (see lms_migrations), so adding,
+removing or moving a copy updates the counts in the same statement and
+nothing ever recounts them.
+
+Copy ids come from CopySequence and are never reused, so neither are the
+barcodes generated from them, and old loans keep pointing at the copy they
+were of. Every branch database numbers its copies from 1, so generated
+barcodes start with the database's own random prefix (also in CopySequence),
+e.g. ``3FA9C1-C000000101``. The desk sends a scan to the branch whose prefix
+it carries (lms_branches), and a database never resolves another branch's
+label to a local copy with the same number. Labels printed before the
+prefix existed (``C000000101``) still scan at their own branch.
+
+Scanning goes barcode -> copy through ScanCache, an in-process LRU map warmed
+at startup with the copies on loan (the ones coming back to the desk) and
+the newest acquisitions. A hit needs no read at all; a miss is one lookup in
+the barcode index.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+
+SCAN_CACHE_SIZE = int(os.environ.get("LMS_SCAN_CACHE_SIZE", 250000))  # Barcodes kept in memory
+
+# Any shelf copy of a book (served by idx_copies_book)
+SHELF_COPY = "SELECT copy_id FROM Copies WHERE book_id = ? AND status = 'shelf' LIMIT 1"
+COPY_BY_BARCODE = "SELECT copy_id, book_id FROM Copies WHERE barcode = ?"
+
+# A barcode generated by barcode_for; group 1 is the prefix of the database that generated it
+GENERATED_BARCODE = re.compile(r"([0-9A-F]{6})-C\d{9}")
+
+
+def barcode_for(copy_id, prefix):
+    """Barcode printed on labels generated by the system."""
+    return f"{prefix}-C{copy_id:09d}"
+
+
+def barcode_prefix(conn):
+    """This database's prefix for generated barcodes."""
+    return conn.execute("SELECT barcode_prefix FROM CopySequence WHERE id = 1").fetchone()[0]
+
+
+def foreign_barcode(barcode, prefix):
+    """True if ``barcode`` was generated by another branch's database (prefix other than ``prefix``)."""
+    match = GENERATED_BARCODE.fullmatch(barcode)
+    return match is not None and match[1] != prefix
+
+
+def add_copies(conn, book_id, count, status="shelf", barcodes=None):
+    """Adds ``count`` copies of ``book_id`` (with the given ``barcodes``, or generated ones).
+
+    Returns the new copies as (copy_id, barcode) pairs.
+    """
+    if barcodes is not None and len(barcodes) != count:
+        raise ValueError(f"Expected {count} barcodes, got {len(barcodes)}")
+    base, prefix = conn.execute(
+        "UPDATE CopySequence SET last_copy_id = last_copy_id + ? RETURNING last_copy_id - ?, barcode_prefix",
+        (count, count),
+    ).fetchone()
+    rows = [(base + n, barcodes[n - 1] if barcodes else barcode_for(base + n, prefix), book_id, status)
+            for n in range(1, count + 1)]
+    conn.executemany("INSERT INTO Copies (copy_id, barcode, book_id, status) VALUES (?, ?, ?, ?)", rows)
+    return [row[:2] for row in rows]
+
+
+def remove_shelf_copies(conn, book_id, count, cache=None):
+    """Withdraws up to ``count`` of the book's shelf copies, newest first; returns how many went.
+
+    Their barcodes are dropped from ``cache`` if given.
+    """
+    barcodes = [row[0] for row in conn.execute("""
+    DELETE FROM Copies WHERE copy_id IN (
+        SELECT copy_id FROM Copies WHERE book_id = ? AND status = 'shelf' ORDER BY copy_id DESC LIMIT ?
+    )
+    RETURNING barcode
+    """, (book_id, count)).fetchall()]
+    if cache is not None:
+        cache.discard(*barcodes)
+    return len(barcodes)
+
+
+def set_total_copies(conn, book_id, total, available=None, cache=None):
+    """Adds or withdraws copies until the book has ``total``.
+
+    For a book with no copies yet, ``available`` (default: all) says how many
+    are on the shelf; the rest are recorded as missing. Only shelf copies are
+    withdrawn, so copies on loan or held stay counted until they come back.
+    """
+    current = conn.execute("SELECT total_copies FROM Books WHERE book_id = ?", (book_id,)).fetchone()[0]
+    if total > current:
+        missing = total - available if current == 0 and available is not None else 0
+        add_copies(conn, book_id, total - current - missing)
+        add_copies(conn, book_id, missing, status="missing")
+    elif total < current:
+        remove_shelf_copies(conn, book_id, current - total, cache)
+
+
+def move_copy(conn, copy_id, status):
+    """Sets a copy's status (the triggers adjust copies_available); returns its barcode, or None if it is gone."""
+    row = conn.execute("UPDATE Copies SET status = ? WHERE copy_id = ? RETURNING barcode", (status, copy_id)).fetchone()
+    return row[0] if row else None
+
+
+def add_book(pool, book_id, title, author, publisher, year, total_copies, barcodes=None):
+    """Adds a book and its copies in one transaction; returns the copies' barcodes."""
+    with pool.writer() as conn:
+        conn.execute(
+            "INSERT INTO Books (book_id, title, author, publisher, year, copies_available, total_copies) "
+            "VALUES (?, ?, ?, ?, ?, 0, 0)",
+            (book_id, title, author, publisher, year),
+        )
+        return [barcode for _, barcode in add_copies(conn, book_id, total_copies, barcodes=barcodes)]
+
+
+def delete_book(pool, book_id, cache=None):
+    """Deletes a book and its copies; returns False if there is no such book.
+
+    A trigger on Books deletes the copies; their barcodes are dropped from
+    ``cache`` if given.
+    """
+    with pool.writer() as conn:
+        barcodes = [row[0] for row in conn.execute("SELECT barcode FROM Copies WHERE book_id = ?", (book_id,))]
+        deleted = conn.execute("DELETE FROM Books WHERE book_id = ?", (book_id,)).rowcount
+    if cache is not None:
+        cache.discard(*barcodes)
+    return deleted > 0
+
+
+class ScanCache:
+    """Thread-safe LRU map of barcode -> (copy_id, book_id).
+
+    A copy keeps its barcode and book for life. Withdrawing copies or
+    deleting a book through lms_inventory drops their entries; for deletes
+    made elsewhere (another process, or a lookup racing the delete),
+    statements that use a cached copy also check its barcode and book, and
+    the scan drops the entry when the check fails.
+    """
+
+    def __init__(self, max_entries=SCAN_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def put(self, barcode, copy):
+        with self._lock:
+            self._entries[barcode] = copy
+            self._entries.move_to_end(barcode)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, *barcodes):
+        with self._lock:
+            for barcode in barcodes:
+                self._entries.pop(barcode, None)
+
+    def warm(self, conn):
+        """Loads the copies on loan, then the newest copies, up to max_entries; returns the entries loaded."""
+        rows = conn.execute("""
+        SELECT c.barcode, c.copy_id, c.book_id FROM IssueTable it JOIN Copies c ON c.copy_id = it.copy_id
+        WHERE it.is_returned = 0 LIMIT ?
+        """, (self.max_entries,)).fetchall()
+        rows += conn.execute(
+            "SELECT barcode, copy_id, book_id FROM Copies ORDER BY copy_id DESC LIMIT ?",
+            (max(self.max_entries - len(rows), 0),),
+        ).fetchall()
+        with self._lock:
+            # Oldest first, so the copies on loan end up most recently used
+            for barcode, copy_id, book_id in reversed(rows):
+                self._entries[barcode] = (copy_id, book_id)
+                self._entries.move_to_end(barcode)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return len(self._entries)
+
+    def lookup(self, conn, barcode):
+        """(copy_id, book_id) for a barcode, or None if no copy has it."""
+        with self._lock:
+            copy = self._entries.get(barcode)
+            if copy is not None:
+                self._entries.move_to_end(barcode)
+                self.hits += 1
+                return copy
+            self.misses += 1
+        row = conn.execute(COPY_BY_BARCODE, (barcode,)).fetchone()
+        if row is None:
+            return None
+        copy = (row[0], row[1])
+        self.put(barcode, copy)
+        return copy
+
+
+def lookup_copy(conn, barcode, cache=None):
+    """(copy_id, book_id) for a barcode through ``cache`` if given, or None if no copy has it."""
+    if cache is not None:
+        return cache.lookup(conn, barcode)
+    row = conn.execute(COPY_BY_BARCODE, (barcode,)).fetchone()
+    return (row[0], row[1]) if row else None
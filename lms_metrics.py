@@ -0,0 +1,221 @@
+"""In-process query and page-render instrumentation.
+
+``execute_query`` reports every query (normalized SQL, parameter count,
+rows, execution and DataFrame build time) and every result it served from
+the query cache instead; connection pools created with ``metrics=METRICS``
+report the statements run straight on their connections (circulation,
+logins, holds, inventory). The portals report how long each page took to
+render. Timings go into fixed-bucket histograms that the admin Diagnostics
+page reads and that can be written out in Prometheus text format. Queries
+slower than the threshold are also logged to the slow-query log.
+
+Configured from the environment:
+    LMS_METRICS=0              turn instrumentation off (near-zero overhead)
+    LMS_SLOW_QUERY_MS=100      slow-query threshold in milliseconds
+    LMS_SLOW_QUERY_LOG=slow_queries.log
+    LMS_METRICS_FILE=lms_metrics.prom
+"""
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache
+
+# Upper bounds in seconds, Prometheus style (the last bucket is +Inf).
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+SLOW_QUERY_MS = float(os.environ.get("LMS_SLOW_QUERY_MS", 100))
+SLOW_QUERY_LOG = os.environ.get("LMS_SLOW_QUERY_LOG", "slow_queries.log")
+METRICS_FILE = os.environ.get("LMS_METRICS_FILE", "lms_metrics.prom")
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(query):
+    """Collapses whitespace and replaces literals with ? so equivalent queries share one label."""
+    query = _STRING.sub("?", query)
+    query = _NUMBER.sub("?", query)
+    query = _SPACE.sub(" ", query).strip()
+    return _IN_LIST.sub("(?, ...)", query)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram with count, sum and max."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        index = 0
+        while index < len(BUCKETS) and value > BUCKETS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Estimates the q-quantile by linear interpolation inside its bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = BUCKETS[index - 1] if index else 0.0
+                upper = BUCKETS[index] if index < len(BUCKETS) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / bucket_count, self.max)
+            seen += bucket_count
+        return self.max
+
+
+class Metrics:
+    """Thread-safe store of query and page histograms."""
+
+    def __init__(self, enabled=True, slow_query_ms=SLOW_QUERY_MS, slow_query_log=SLOW_QUERY_LOG):
+        self.enabled = enabled
+        self.slow_query_seconds = slow_query_ms / 1000
+        self._lock = threading.Lock()
+        self._queries = {}  # normalized SQL -> {"time", "build", "rows", "cache_hits", "params"}
+        self._pages = {}  # page name -> Histogram
+        # A private logger per store, so each one writes only to its own file.
+        self.slow_log = logging.Logger("lms.slow_query", logging.WARNING)
+        if slow_query_log:
+            handler = logging.FileHandler(slow_query_log, delay=True, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            self.slow_log.addHandler(handler)
+
+    def record_query(self, query, params, rows, seconds, build_seconds=0.0):
+        """Records one executed query; ``build_seconds`` is the DataFrame construction time."""
+        sql = normalize_sql(query)
+        with self._lock:
+            stats = self._queries.get(sql)
+            if stats is None:
+                stats = self._queries[sql] = _query_stats(params)
+            stats["time"].observe(seconds)
+            stats["build"].observe(build_seconds)
+            stats["rows"] += rows
+        if seconds + build_seconds >= self.slow_query_seconds:
+            self.slow_log.warning("%.1f ms (query %.1f ms, DataFrame %.1f ms) rows=%d params=%d %s",
+                                  (seconds + build_seconds) * 1000, seconds * 1000, build_seconds * 1000,
+                                  rows, len(params), sql)
+
+    def record_cache_hit(self, query, params):
+        """Counts one result served from the query cache without running ``query``."""
+        sql = normalize_sql(query)
+        with self._lock:
+            stats = self._queries.get(sql)
+            if stats is None:
+                stats = self._queries[sql] = _query_stats(params)
+            stats["cache_hits"] += 1
+
+    def page_timer(self, page):
+        """Context manager timing one page render; a no-op when disabled."""
+        if not self.enabled:
+            return nullcontext()
+        return self._page_timer(page)
+
+    @contextmanager
+    def _page_timer(self, page):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._pages.setdefault(page, Histogram()).observe(elapsed)
+
+    def query_report(self):
+        """One dict per normalized query, slowest p99 first."""
+        with self._lock:
+            report = [{
+                "query": sql,
+                "count": s["time"].count,
+                "cache_hits": s["cache_hits"],
+                "p50_ms": s["time"].quantile(0.5) * 1000,
+                "p99_ms": s["time"].quantile(0.99) * 1000,
+                "max_ms": s["time"].max * 1000,
+                "build_p50_ms": s["build"].quantile(0.5) * 1000,
+                "avg_rows": s["rows"] / s["time"].count if s["time"].count else 0.0,
+                "params": s["params"],
+            } for sql, s in self._queries.items()]
+        return sorted(report, key=lambda r: r["p99_ms"], reverse=True)
+
+    def page_report(self):
+        with self._lock:
+            report = [{
+                "page": page,
+                "count": h.count,
+                "p50_ms": h.quantile(0.5) * 1000,
+                "p99_ms": h.quantile(0.99) * 1000,
+                "max_ms": h.max * 1000,
+            } for page, h in self._pages.items()]
+        return sorted(report, key=lambda r: r["p99_ms"], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._queries.clear()
+            self._pages.clear()
+
+    def prometheus_text(self):
+        """Renders every histogram in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            queries = {sql: (s["time"], s["build"], s["rows"]) for sql, s in self._queries.items()}
+            hits = {sql: s["cache_hits"] for sql, s in self._queries.items()}
+            pages = dict(self._pages)
+            _histogram_lines(lines, "lms_query_duration_seconds", "SQLite execution time per normalized query",
+                             "query", {sql: t for sql, (t, _, _) in queries.items()})
+            _histogram_lines(lines, "lms_query_dataframe_build_seconds", "DataFrame construction time per query",
+                             "query", {sql: b for sql, (_, b, _) in queries.items()})
+            lines.append("# HELP lms_query_rows_total Rows returned per normalized query")
+            lines.append("# TYPE lms_query_rows_total counter")
+            for sql, (_, _, rows) in queries.items():
+                lines.append(f'lms_query_rows_total{{query="{_escape(sql)}"}} {rows}')
+            lines.append("# HELP lms_query_cache_hits_total Results served from the query cache per normalized query")
+            lines.append("# TYPE lms_query_cache_hits_total counter")
+            for sql, count in hits.items():
+                lines.append(f'lms_query_cache_hits_total{{query="{_escape(sql)}"}} {count}')
+            _histogram_lines(lines, "lms_page_render_seconds", "Streamlit page render time", "page", pages)
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path=METRICS_FILE):
+        """Writes prometheus_text() atomically to ``path`` (e.g. for a node_exporter textfile collector)."""
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)
+        return path
+
+
+def _query_stats(params):
+    return {"time": Histogram(), "build": Histogram(), "rows": 0, "cache_hits": 0, "params": len(params)}
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histogram_lines(lines, name, help_text, label, histograms):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for key, h in histograms.items():
+        key = _escape(key)
+        cumulative = 0
+        for bound, bucket_count in zip(BUCKETS + ("+Inf",), h.counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{{{label}="{key}",le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{label}="{key}"}} {h.sum}')
+        lines.append(f'{name}_count{{{label}="{key}"}} {h.count}')
+
+
+METRICS = Metrics(enabled=os.environ.get("LMS_METRICS", "1") != "0")
@@ -0,0 +1,520 @@
+"""Versioned schema migrations for the Library Management System database.
+
+The schema version lives in ``PRAGMA user_version``. Each migration runs in
+its own write transaction together with the version bump, so a database is
+always at a well-defined version. ``ensure_migrated`` does the work once per
+process and database file; later Streamlit reruns skip it entirely.
+
+Run ``python -m lms_migrations --check-plans`` to migrate a database and fail
+if any hot query has fallen back to a full table scan.
+"""
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import threading
+
+from lms_analytics import ACTIVE_BORROWERS_INDEX, CALENDAR_TABLES, SUMMARY_SCHEMA, SUMMARY_TRIGGERS, refresh_summaries
+from lms_db import DB_FILE, ConnectionPool
+from lms_recommend import RECOMMEND_SCHEMA
+from lms_search import ensure_search_index
+
+BASE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS Admin (
+        admin_id INTEGER PRIMARY KEY,
+        username TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS Student (
+        student_id TEXT PRIMARY KEY,
+        student_name TEXT NOT NULL,
+        student_pass TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS Books (
+        book_id INTEGER PRIMARY KEY,
+        title TEXT NOT NULL,
+        author TEXT NOT NULL,
+        publisher TEXT,
+        year INTEGER,
+        copies_available INTEGER NOT NULL,
+        total_copies INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS IssueTable (
+        issue_id INTEGER PRIMARY KEY,
+        book_id INTEGER NOT NULL,
+        student_id TEXT NOT NULL,
+        issue_date TEXT NOT NULL,
+        due_date TEXT NOT NULL,
+        return_date TEXT,
+        fine_amount REAL DEFAULT 0.0,
+        is_returned BOOLEAN DEFAULT 0,
+        FOREIGN KEY (book_id) REFERENCES Books(book_id),
+        FOREIGN KEY (student_id) REFERENCES Student(student_id)
+    )
+    """,
+]
+
+
+FINE_ACCRUAL_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS FineAccrual (
+        snapshot_date TEXT NOT NULL,
+        issue_id INTEGER NOT NULL,
+        student_id TEXT NOT NULL,
+        book_id INTEGER NOT NULL,
+        days_overdue INTEGER NOT NULL,
+        accrued_fine REAL NOT NULL,
+        PRIMARY KEY (snapshot_date, issue_id)
+    ) WITHOUT ROWID
+    """
+
+
+HOLDS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS Holds (
+        hold_id INTEGER PRIMARY KEY,
+        book_id INTEGER NOT NULL,
+        student_id TEXT NOT NULL,
+        priority INTEGER NOT NULL DEFAULT 1,
+        placed_date TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'waiting',
+        ready_date TEXT,
+        expires TEXT NOT NULL,
+        FOREIGN KEY (book_id) REFERENCES Books(book_id),
+        FOREIGN KEY (student_id) REFERENCES Student(student_id)
+    )
+    """
+
+
+COPIES_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS Copies (
+        copy_id INTEGER PRIMARY KEY,
+        barcode TEXT NOT NULL UNIQUE,
+        book_id INTEGER NOT NULL,
+        status TEXT NOT NULL DEFAULT 'shelf',
+        FOREIGN KEY (book_id) REFERENCES Books(book_id)
+    )
+    """
+
+# The highest copy_id ever handed out (one row), so a withdrawn copy's id and generated barcode are never reused
+COPY_SEQUENCE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS CopySequence (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        last_copy_id INTEGER NOT NULL
+    )
+    """
+
+# The highest issue_id ever handed out (one row). Archiving deletes the newest returned loans from
+# IssueTable too, and SQLite would give their ids to the next loans.
+LOAN_SEQUENCE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS LoanSequence (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        last_issue_id INTEGER NOT NULL
+    )
+    """,
+    # Loans inserted with an id of their own (imports, older tools) move the sequence past them
+    """
+    CREATE TRIGGER IF NOT EXISTS loan_sequence_advance AFTER INSERT ON IssueTable
+    WHEN NEW.issue_id > (SELECT last_issue_id FROM LoanSequence WHERE id = 1)
+    BEGIN
+        UPDATE LoanSequence SET last_issue_id = NEW.issue_id WHERE id = 1;
+    END
+    """,
+]
+
+# Books.total_copies / copies_available follow the Copies rows (lms_inventory), so nothing recounts them.
+COPIES_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS copies_added AFTER INSERT ON Copies
+    BEGIN
+        UPDATE Books SET total_copies = total_copies + 1, copies_available = copies_available + (NEW.status = 'shelf')
+        WHERE book_id = NEW.book_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS copies_removed AFTER DELETE ON Copies
+    BEGIN
+        UPDATE Books SET total_copies = total_copies - 1, copies_available = copies_available - (OLD.status = 'shelf')
+        WHERE book_id = OLD.book_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS copies_moved AFTER UPDATE OF status ON Copies
+    WHEN (OLD.status = 'shelf') != (NEW.status = 'shelf')
+    BEGIN
+        UPDATE Books SET copies_available = copies_available + (NEW.status = 'shelf') - (OLD.status = 'shelf')
+        WHERE book_id = NEW.book_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_deleted AFTER DELETE ON Books
+    BEGIN
+        DELETE FROM Copies WHERE book_id = OLD.book_id;
+    END
+    """,
+]
+
+
+def _base_schema(conn):
+    for statement in BASE_SCHEMA:
+        conn.execute(statement)
+    # Default admin: admin/admin123
+    conn.execute("""
+    INSERT INTO Admin (username, password)
+    SELECT 'admin', 'admin123' WHERE NOT EXISTS (SELECT 1 FROM Admin WHERE username = 'admin')
+    """)
+
+
+def _search_index(conn):
+    ensure_search_index(conn)
+
+
+def _secondary_indexes(conn):
+    # Issue history per student, newest first (student_view_issued)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_issue_student_date ON IssueTable (student_id, issue_date DESC, issue_id DESC)")
+    # Open and overdue loans (fines, overdue reports)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_issue_open_due ON IssueTable (is_returned, due_date)")
+    # Loans of a book and the IssueTable -> Books join
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_issue_book ON IssueTable (book_id)")
+    # Catalog sort orders (book_id is the implicit tie-breaker in every index)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_books_title ON Books (title)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_books_author ON Books (author)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_books_year ON Books (year)")
+
+
+def _fine_accrual(conn):
+    # Nightly accrual snapshots written by lms_fines.snapshot_accruals
+    conn.execute(FINE_ACCRUAL_SCHEMA)
+
+
+def _returned_index(conn):
+    # Returned loans by return date, for lms_archive batches; open loans stay out of the index.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_issue_returned ON IssueTable (return_date) WHERE is_returned = 1")
+
+
+def _holds(conn):
+    # Hold queue of lms_holds
+    conn.execute(HOLDS_SCHEMA)
+    # The queue itself: a book's waiting holds in serving order, so the next one is the first index entry
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_holds_queue ON Holds (book_id, priority, hold_id) WHERE status = 'waiting'")
+    # A student's holds (holds page, pickup at the desk)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_holds_student ON Holds (student_id, status)")
+    # Active holds by deadline, for the expiry sweep
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_holds_expires ON Holds (expires) WHERE status IN ('waiting', 'ready')")
+
+
+def _copies(conn):
+    # Per-copy inventory of lms_inventory; loans and ready holds point at the copy they hold
+    conn.execute(COPIES_SCHEMA)
+    conn.execute("ALTER TABLE IssueTable ADD COLUMN copy_id INTEGER REFERENCES Copies(copy_id)")
+    conn.execute("ALTER TABLE Holds ADD COLUMN copy_id INTEGER REFERENCES Copies(copy_id)")
+
+    # Backfill: one copy per counted copy (more if open loans and ready holds outnumber them), numbered
+    # per book from first_id + 1. Loans get the first copies, ready holds the next, copies counted as out
+    # without a loan are 'missing', the rest are on the shelf.
+    conn.execute("""
+    CREATE TEMP TABLE copy_plan (
+        book_id INTEGER PRIMARY KEY, first_id INTEGER, loaned INTEGER, held INTEGER, out INTEGER, total INTEGER
+    )
+    """)
+    conn.execute("""
+    WITH loaned AS (SELECT book_id, COUNT(*) AS n FROM IssueTable WHERE is_returned = 0 GROUP BY book_id),
+    held AS (SELECT book_id, COUNT(*) AS n FROM Holds WHERE status = 'ready' GROUP BY book_id),
+    counts AS (
+        SELECT b.book_id, COALESCE(l.n, 0) AS loaned, COALESCE(h.n, 0) AS held,
+            MAX(b.total_copies - b.copies_available, COALESCE(l.n, 0) + COALESCE(h.n, 0)) AS out,
+            MAX(b.total_copies, COALESCE(l.n, 0) + COALESCE(h.n, 0)) AS total
+        FROM Books b LEFT JOIN loaned l ON l.book_id = b.book_id LEFT JOIN held h ON h.book_id = b.book_id
+    )
+    INSERT INTO copy_plan
+    SELECT book_id, SUM(total) OVER (ORDER BY book_id) - total, loaned, held, out, total FROM counts
+    """)
+    conn.execute("""
+    WITH RECURSIVE copy_no (n, book_id, first_id, loaned, held, out, total) AS (
+        SELECT 1, book_id, first_id, loaned, held, out, total FROM copy_plan WHERE total > 0
+        UNION ALL
+        SELECT n + 1, book_id, first_id, loaned, held, out, total FROM copy_no WHERE n < total
+    )
+    INSERT INTO Copies (copy_id, barcode, book_id, status)
+    SELECT first_id + n, printf('C%09d', first_id + n), book_id,
+        CASE WHEN n <= loaned THEN 'loaned' WHEN n <= loaned + held THEN 'held' WHEN n <= out THEN 'missing' ELSE 'shelf' END
+    FROM copy_no
+    """)
+    conn.execute("""
+    UPDATE IssueTable SET copy_id = p.first_id + r.n
+    FROM (SELECT issue_id, book_id, ROW_NUMBER() OVER (PARTITION BY book_id ORDER BY issue_id) AS n
+          FROM IssueTable WHERE is_returned = 0) r
+    JOIN copy_plan p ON p.book_id = r.book_id
+    WHERE IssueTable.issue_id = r.issue_id
+    """)
+    conn.execute("""
+    UPDATE Holds SET copy_id = p.first_id + p.loaned + r.n
+    FROM (SELECT hold_id, book_id, ROW_NUMBER() OVER (PARTITION BY book_id ORDER BY hold_id) AS n
+          FROM Holds WHERE status = 'ready') r
+    JOIN copy_plan p ON p.book_id = r.book_id
+    WHERE Holds.hold_id = r.hold_id
+    """)
+    conn.execute("""
+    UPDATE Books SET total_copies = p.total, copies_available = p.total - p.out
+    FROM copy_plan p WHERE Books.book_id = p.book_id
+    """)
+    conn.execute("DROP TABLE temp.copy_plan")
+
+    # A book's copies by status (issue by book ID takes a shelf copy)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_copies_book ON Copies (book_id, status)")
+    # The open loan of a copy (scan-to-return)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_issue_open_copy ON IssueTable (copy_id) WHERE is_returned = 0")
+    for statement in COPIES_TRIGGERS:
+        conn.execute(statement)
+
+
+def _circulation_summaries(conn):
+    # Summary tables of lms_analytics, backfilled from the loans so far and then kept by triggers
+    for statement in SUMMARY_SCHEMA:
+        conn.execute(statement)
+    refresh_summaries(conn)
+    for statement in SUMMARY_TRIGGERS:
+        conn.execute(statement)
+
+
+def _recommendations(conn):
+    # Co-borrowing model of lms_recommend; filled by its batch job
+    for statement in RECOMMEND_SCHEMA:
+        conn.execute(statement)
+
+
+def _year_sort_index(conn):
+    from lms_queries import UNKNOWN_YEAR  # lms_queries -> lms_archive imports this module
+
+    # The catalog's Year sort seeks on COALESCE(year, UNKNOWN_YEAR) so books without a year can be paged
+    conn.execute("DROP INDEX IF EXISTS idx_books_year")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_books_year_key ON Books (COALESCE(year, {UNKNOWN_YEAR}))")
+
+
+def _active_borrowers_index(conn):
+    conn.execute(ACTIVE_BORROWERS_INDEX)
+
+
+def _copy_sequence(conn):
+    # Starts past every copy_id still in use or recorded on a loan or hold
+    conn.execute(COPY_SEQUENCE_SCHEMA)
+    conn.execute("""
+    INSERT OR IGNORE INTO CopySequence (id, last_copy_id)
+    SELECT 1, MAX((SELECT COALESCE(MAX(copy_id), 0) FROM Copies), (SELECT COALESCE(MAX(copy_id), 0) FROM IssueTable),
+                  (SELECT COALESCE(MAX(copy_id), 0) FROM Holds))
+    """)
+
+
+def _archived_max_issue_id(conn):
+    """The largest issue_id in the history database, attached or at lms_archive.ARCHIVE_FILE; 0 if there is none."""
+    from lms_archive import ARCHIVE_FILE, ARCHIVE_SCHEMA  # lms_archive imports this module
+
+    attached = {row[1]: row[2] for row in conn.execute("PRAGMA database_list")}
+    if ARCHIVE_SCHEMA in attached:
+        path = attached[ARCHIVE_SCHEMA]
+    elif os.path.exists(ARCHIVE_FILE):
+        path = ARCHIVE_FILE
+    else:
+        return 0
+    # ATTACH is not allowed inside the migration's transaction, so read it on a connection of its own
+    archive = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        if not archive.execute("SELECT 1 FROM sqlite_master WHERE name = 'IssueHistory'").fetchone():
+            return 0
+        return archive.execute("SELECT COALESCE(MAX(issue_id), 0) FROM IssueHistory").fetchone()[0]
+    finally:
+        archive.close()
+
+
+def _loan_sequence(conn):
+    # Starts past every issue_id in IssueTable, the archive and the recommender's mark, so whichever
+    # program migrates first (the app, lms_api, an import) never hands out an archived id
+    for statement in LOAN_SEQUENCE_SCHEMA:
+        conn.execute(statement)
+    conn.execute("""
+    INSERT OR IGNORE INTO LoanSequence (id, last_issue_id)
+    SELECT 1, MAX((SELECT COALESCE(MAX(issue_id), 0) FROM IssueTable),
+                  (SELECT COALESCE(MAX(last_issue_id), 0) FROM RecommenderState), ?)
+    """, (_archived_max_issue_id(conn),))
+
+
+def _barcode_prefix(conn):
+    # Branch databases each number copies from 1; a random prefix keeps their generated barcodes apart
+    conn.execute("ALTER TABLE CopySequence ADD COLUMN barcode_prefix TEXT")
+    conn.execute("UPDATE CopySequence SET barcode_prefix = upper(hex(randomblob(3)))")
+
+
+# Ordered (version, description, function) triples. Never edit or reorder a
+# released migration; append a new one instead.
+MIGRATIONS = [
+    (1, "Base tables and default admin", _base_schema),
+    (2, "Full-text search index on Books", _search_index),
+    (3, "Secondary indexes on IssueTable and Books", _secondary_indexes),
+    (4, "FineAccrual snapshot table", _fine_accrual),
+    (5, "Returned-loans index for archiving", _returned_index),
+    (6, "Holds table and queue indexes", _holds),
+    (7, "Per-copy inventory with counter triggers", _copies),
+    (8, "Circulation summary tables with maintenance triggers", _circulation_summaries),
+    (9, "Co-borrowing recommendation tables", _recommendations),
+    (10, "Year sort index with unknown years first", _year_sort_index),
+    (11, "Active-borrowers index on StudentCirculation", _active_borrowers_index),
+    (12, "Copy id sequence so ids and barcodes are never reused", _copy_sequence),
+    (13, "Loan id sequence so archived issue ids are never reused", _loan_sequence),
+    (14, "Per-database prefix for generated barcodes", _barcode_prefix),
+]
+
+_migrated = set()  # Absolute paths of database files already migrated in this process
+_migrated_lock = threading.Lock()
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(pool, target=None):
+    """Applies pending migrations in order, up to ``target`` (default: all); returns the versions applied."""
+    applied = []
+    for version, _, upgrade in MIGRATIONS:
+        if target is not None and version > target:
+            break
+        with pool.writer() as conn:
+            # Re-read inside the write transaction: another process may have migrated meanwhile.
+            if schema_version(conn) >= version:
+                continue
+            upgrade(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+        applied.append(version)
+    return applied
+
+
+def ensure_migrated(pool):
+    """Migrates the pool's database once per process; returns the versions applied."""
+    key = os.path.abspath(pool.db_file)
+    if key in _migrated:
+        return []
+    with _migrated_lock:
+        if key in _migrated:
+            return []
+        applied = migrate(pool)
+        _migrated.add(key)
+    return applied
+
+
+# --- QUERY PLAN REGRESSION CHECK ---
+
+def hot_queries():
+    """The per-request queries of the app, as (name, query, params) with representative parameters.
+
+    Each one comes from the builder or constant the app runs, so the check
+    follows the queries as they change. The issue-history queries with the
+    archive read history.IssueHistory, so the connection needs it attached.
+    """
+    # Imported here: these modules import lms_migrations (through lms_archive and lms_holds)
+    from lms_analytics import dashboard_queries
+    from lms_circulation import OPEN_LOAN_OF_COPY, close_loan_query
+    from lms_fines import accrued_fines_query, fines_summary_query
+    from lms_holds import CLAIM_HOLD, NEXT_HOLD, student_holds_query
+    from lms_inventory import COPY_BY_BARCODE, SHELF_COPY
+    from lms_pagination import PageCursor
+    from lms_queries import (
+        AVAILABLE_COLUMNS, BOOK_SORTS, CATALOG_COLUMNS, catalog_conditions, catalog_pager, catalog_search,
+        issue_history_conditions, issue_history_pager,
+    )
+    from lms_recommend import also_borrowed_query, recent_books_query
+    from lms_service import ADMIN_LOGIN, STUDENT_LOGIN
+
+    # A cursor in the middle of each catalog sort
+    sort_cursors = {"Book ID": (100,), "Title": ("M", 1), "Author": ("M", 1), "Year": (2000, 1)}
+    queries = [
+        ("admin login", ADMIN_LOGIN, ("admin", "x")),
+        ("student login", STUDENT_LOGIN, ("S001",)),
+        ("catalog search", *catalog_search("history", CATALOG_COLUMNS)),
+    ]
+    for sort_label in BOOK_SORTS:
+        for descending in (False, True):
+            pager = catalog_pager(CATALOG_COLUMNS, sort_label, descending)
+            order = "descending" if descending else "ascending"
+            queries.append((f"catalog page by {sort_label.lower()}, {order}",
+                            *pager.query(cursor=PageCursor(sort_cursors[sort_label]))))
+    queries.append(("available books page", *catalog_pager(AVAILABLE_COLUMNS, "Book ID").query(
+        *catalog_conditions("", available_only=True), cursor=PageCursor(sort_cursors["Book ID"]))))
+    for show in ("All", "Not returned"):
+        # As student_view_issued runs them: archived loans are shown unless only open loans are
+        include_archive = show != "Not returned"
+        pager = issue_history_pager(include_archive=include_archive)
+        queries.append((f"issue history page ({show.lower()})",
+                        *pager.query(*issue_history_conditions("S001", show), PageCursor(("2025-01-01", 10**9)))))
+    queries += [
+        ("fines list", *accrued_fines_query(limit=500)),
+        ("fines summary", *fines_summary_query()),
+        ("return: close the loan", close_loan_query(), {"today": "2025-01-01", "issue_id": 1}),
+        ("return: next hold", NEXT_HOLD, {"today": "2025-01-01", "expires": "2025-01-08", "copy_id": 1, "book_id": 1}),
+        ("issue: claim a ready hold", CLAIM_HOLD, ("S001", 1)),
+        ("issue: take a shelf copy", SHELF_COPY, (1,)),
+        ("scan: copy by barcode", COPY_BY_BARCODE, ("C000000001",)),
+        ("scan: open loan of a copy", OPEN_LOAN_OF_COPY, (1, "C000000001", 1)),
+        ("student's holds", *student_holds_query("S001")),
+        ("recommendations of a book", *also_borrowed_query(1)),
+        ("student's recent books", *recent_books_query("S001")),
+    ]
+    queries += [(f"analytics: {name}", query, params) for name, (query, params) in dashboard_queries().items()]
+    return queries
+
+
+# "SCAN t" alone reads the whole of t; index scans add USING ..., FTS5 lookups VIRTUAL TABLE ...
+_TABLE_SCAN = re.compile(r"SCAN (\w+)$")
+# A subquery in FROM, scanned under its alias once computed
+_SUBQUERY = re.compile(r"(?:MATERIALIZE|CO-ROUTINE) (\w+)$")
+
+
+def full_scans(conn, queries=None):
+    """Returns (name, plan detail) for every hot query whose plan scans a whole table.
+
+    Scanning a whole index, a subquery's result or one of the small
+    CALENDAR_TABLES summaries is allowed.
+    """
+    offenders = []
+    for name, query, params in queries or hot_queries():
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+        subqueries = {match[1] for match in map(_SUBQUERY.match, plan) if match}
+        for detail in plan:
+            scan = _TABLE_SCAN.match(detail)
+            if scan and scan[1] not in subqueries and scan[1] not in CALENDAR_TABLES:
+                offenders.append((name, detail))
+    return offenders
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migrate the LMS database to the latest schema version.")
+    parser.add_argument("--db", default=DB_FILE, help="SQLite database file (default: %(default)s)")
+    parser.add_argument("--check-plans", action="store_true", help="fail if a hot query falls back to a table scan")
+    parser.add_argument("--archive", default=None,
+                        help="history database the issue-history queries read (default: lms_archive.ARCHIVE_FILE)")
+    args = parser.parse_args(argv)
+
+    pool = ConnectionPool(args.db)
+    applied = migrate(pool)
+    print(f"{args.db}: schema version {schema_version(pool.reader())} (applied: {applied or 'none'})")
+
+    if args.check_plans:
+        from lms_archive import ARCHIVE_FILE, archive_pool, ensure_archive
+
+        pool = archive_pool(args.db, args.archive or ARCHIVE_FILE)
+        ensure_archive(pool)
+        offenders = full_scans(pool.reader())
+        for name, detail in offenders:
+            print(f"FULL SCAN in {name}: {detail}")
+        if offenders:
+            sys.exit(1)
+        print(f"Query plans OK ({len(hot_queries())} hot queries use indexes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Keyset (seek) pagination for the catalog and issue-history views.
+
+Instead of loading a whole table, each page is fetched with
+``WHERE (sort_key, id) > (last seen) ORDER BY sort_key, id LIMIT n``, so a
+page costs the same however far into the table it is and however big the
+table grows. The last key column must be unique (book_id, issue_id) to
+break ties in the sort column.
+
+A row-value comparison with NULL is never true, so a nullable sort column
+(Books.year) sorts and seeks as ``COALESCE(column, stand-in)``, with the
+stand-in below every real value; an index on the same expression serves it.
+Run ``python -m lms_pagination`` to walk a table with NULL keys both ways.
+"""
+import sqlite3
+from dataclasses import dataclass
+
+PAGE_SIZE = 25
+
+
+@dataclass(frozen=True)
+class PageCursor:
+    """Where a page starts: after ``key`` going forward, or before it going backward."""
+    key: tuple
+    backward: bool = False
+
+
+@dataclass
+class Page:
+    rows: object  # DataFrame of at most page_size rows, in display order
+    first_key: tuple
+    last_key: tuple
+    has_prev: bool
+    has_next: bool
+
+    def next_cursor(self):
+        return PageCursor(self.last_key) if self.has_next else None
+
+    def prev_cursor(self):
+        return PageCursor(self.first_key, backward=True) if self.has_prev else None
+
+
+class KeysetPager:
+    """Builds page queries over ``select_from`` ordered by ``key_columns``.
+
+    ``key_columns`` is a list of (SQL expression, result column name) pairs,
+    e.g. ``[("b.title", "title"), ("b.book_id", "book_id")]``; the result
+    columns must be part of the SELECT list. A nullable column takes a third
+    item, the value its NULLs sort as: ``("b.year", "year", -1)``.
+    """
+
+    def __init__(self, select_from, key_columns, descending=False, page_size=PAGE_SIZE):
+        self.select_from = select_from
+        self.key_columns = key_columns
+        self.descending = descending
+        self.page_size = page_size
+        self.sort_keys = [f"COALESCE({column[0]}, {column[2]!r})" if len(column) > 2 else column[0]
+                          for column in key_columns]
+
+    def query(self, conditions=(), params=(), cursor=None):
+        """Returns (query, params) for the page at ``cursor`` (None is the first page)."""
+        conditions = list(conditions)
+        params = list(params)
+        # Walking backward flips both the comparison and the order; page() restores display order.
+        descending = self.descending != bool(cursor and cursor.backward)
+        if cursor is not None:
+            keys = ", ".join(self.sort_keys)
+            marks = ", ".join("?" for _ in self.key_columns)
+            comparison = "<" if descending else ">"
+            conditions.append(f"({keys}) {comparison} ({marks})")
+            params.extend(cursor.key)
+            if self.sort_keys[0] != self.key_columns[0][0]:
+                # SQLite seeks an expression index on a plain bound only, not on the row value
+                conditions.append(f"{self.sort_keys[0]} {comparison}= ?")
+                params.append(cursor.key[0])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        direction = "DESC" if descending else "ASC"
+        order = ", ".join(f"{expr} {direction}" for expr in self.sort_keys)
+        # One extra row tells whether there is another page in this direction.
+        query = f"{self.select_from} {where} ORDER BY {order} LIMIT ?"
+        return query, tuple(params) + (self.page_size + 1,)
+
+    def page(self, rows, cursor=None):
+        """Trims the fetched DataFrame to a Page; returns None if it is empty."""
+        if rows is None or rows.empty:
+            return None
+        more = len(rows) > self.page_size
+        rows = rows.iloc[:self.page_size]
+        backward = bool(cursor and cursor.backward)
+        if backward:
+            rows = rows.iloc[::-1]
+        rows = rows.reset_index(drop=True)
+        return Page(
+            rows=rows,
+            first_key=self.row_key(rows.iloc[0]),
+            last_key=self.row_key(rows.iloc[-1]),
+            has_prev=more if backward else cursor is not None,
+            has_next=True if backward else more,
+        )
+
+    def row_key(self, row):
+        """The cursor key of a result row (a DataFrame row or a mapping), NULLs as their stand-in."""
+        key = []
+        for column in self.key_columns:
+            value = row[column[1]]
+            # NumPy scalars from the DataFrame become plain Python values so they bind as SQL parameters.
+            value = value.item() if hasattr(value, "item") else value
+            if len(column) > 2 and (value is None or value != value):  # NULL, or NaN in a pandas column
+                value = column[2]
+            key.append(value)
+        return tuple(key)
+
+
+def _walk(conn, pager, backward_from=None):
+    """Every row of ``pager`` page by page with plain sqlite3 rows, forward or backward from a cursor."""
+    cursor, rows = backward_from, []
+    while True:
+        page = conn.execute(*pager.query(cursor=cursor)).fetchall()
+        more = len(page) > pager.page_size
+        page = page[:pager.page_size]
+        if not page:
+            return rows
+        rows.extend(page)
+        if not more:
+            return rows
+        cursor = PageCursor(pager.row_key(page[-1]), backward=backward_from is not None)
+
+
+def self_check():
+    """Pages through a table with NULL and repeated sort keys in every direction; raises AssertionError on a miss."""
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.execute("CREATE TABLE Books (book_id INTEGER PRIMARY KEY, year INTEGER)")
+    conn.executemany("INSERT INTO Books VALUES (?, ?)",
+                     [(book_id, None if book_id % 4 == 0 else 1990 + book_id % 7) for book_id in range(1, 60)])
+    for descending in (False, True):
+        pager = KeysetPager("SELECT book_id, year FROM Books", [("year", "year", -1), ("book_id", "book_id")],
+                            descending=descending, page_size=5)
+        expected = [row["book_id"] for row in conn.execute(
+            "SELECT book_id FROM Books ORDER BY year IS NOT NULL, year, book_id")]
+        expected = expected[::-1] if descending else expected
+        forward = [row["book_id"] for row in _walk(conn, pager)]
+        assert forward == expected, f"descending={descending}: forward walk {forward}"
+        past_end = PageCursor((-2, 0) if descending else (10**9, 0), backward=True)
+        backward = [row["book_id"] for row in _walk(conn, pager, past_end)]
+        assert backward == expected[::-1], f"descending={descending}: backward walk {backward}"
+    conn.close()
+
+
+if __name__ == "__main__":
+    self_check()
+    print("Keyset pagination OK")
@@ -0,0 +1,87 @@
+"""Query builders for the catalog and issue-history pages.
+
+Shared by the Streamlit pages, the benchmarks and anything else that needs
+to run exactly the queries the app runs, without importing Streamlit.
+"""
+from lms_archive import ALL_LOANS
+from lms_pagination import PAGE_SIZE, KeysetPager
+from lms_search import match_condition, search_query
+
+CATALOG_COLUMNS = ["book_id", "title", "author", "publisher", "year", "copies_available"]
+AVAILABLE_COLUMNS = ["book_id", "title", "author", "copies_available"]
+
+# Books without a year sort as this, before every real year (idx_books_year_key indexes the same expression)
+UNKNOWN_YEAR = -1
+
+# Sort options for the catalog; book_id is appended as the unique tie-breaker
+BOOK_SORTS = {
+    "Book ID": [],
+    "Title": [("b.title", "title")],
+    "Author": [("b.author", "author")],
+    "Year": [("b.year", "year", UNKNOWN_YEAR)],
+}
+
+# Issue history filters shown to students
+ISSUE_FILTERS = {"All": None, "Not returned": "it.is_returned = 0", "Returned": "it.is_returned = 1"}
+
+
+def catalog_sorts(columns):
+    """The BOOK_SORTS labels whose sort columns are all among ``columns``."""
+    return [label for label, keys in BOOK_SORTS.items() if all(key[1] in columns for key in keys)]
+
+
+def catalog_pager(columns, sort_label, descending=False, page_size=PAGE_SIZE):
+    """Keyset pager over Books in the order of one of BOOK_SORTS.
+
+    The sort columns must be selected, since the next page's cursor is read
+    from the last row; raises ValueError otherwise.
+    """
+    if "book_id" not in columns or sort_label not in catalog_sorts(columns):
+        raise ValueError(f"sorting by {sort_label!r} needs its columns in the selected columns {columns}")
+    return KeysetPager(
+        f"SELECT {', '.join(f'b.{c}' for c in columns)} FROM Books b",
+        BOOK_SORTS[sort_label] + [("b.book_id", "book_id")],
+        descending=descending,
+        page_size=page_size,
+    )
+
+
+def catalog_conditions(search_term, available_only=False):
+    """WHERE conditions and params restricting the catalog to search matches / available books."""
+    conditions, params = [], []
+    match = match_condition(search_term)
+    if match:
+        conditions.append(match[0])
+        params.extend(match[1])
+    if available_only:
+        conditions.append("b.copies_available > 0")
+    return conditions, params
+
+
+def catalog_search(search_term, columns, available_only=False):
+    """Relevance-ranked search (query, params), or None if the term has no words."""
+    return search_query(search_term, columns, available_only=available_only)
+
+
+def issue_history_pager(include_archive=False):
+    """Keyset pager over a student's loans joined to Books, newest first.
+
+    ``include_archive`` adds the archived loans in history.IssueHistory (see
+    lms_archive); the pool's connections must have the history database attached.
+    """
+    return KeysetPager(f"""
+    SELECT
+        it.issue_id, b.title, b.author, it.issue_date, it.due_date,
+        CASE WHEN it.is_returned = 0 THEN 'No' ELSE 'Yes' END AS Returned,
+        it.fine_amount
+    FROM {ALL_LOANS if include_archive else "IssueTable"} it
+    JOIN Books b ON it.book_id = b.book_id
+    """, [("it.issue_date", "issue_date"), ("it.issue_id", "issue_id")], descending=True)
+
+
+def issue_history_conditions(student_id, show="All"):
+    """WHERE conditions and params for one student's history under an ISSUE_FILTERS option."""
+    conditions = ["it.student_id = ?"]
+    if ISSUE_FILTERS[show]:
+        conditions.append(ISSUE_FILTERS[show])
+    return conditions, [student_id]
@@ -0,0 +1,253 @@
+"""Co-borrowing recommendations: "students who borrowed this also borrowed".
+
+The model is item-item cosine similarity over the binary student x book
+matrix A (A[s, b] = 1 if student s ever borrowed book b), stored sparse:
+
+    StudentBooks      the non-zero entries of A, numbered per student in first-borrow order
+    BookBorrowers     the column sums of A (distinct borrowers per book)
+    CoBorrow          the off-diagonal non-zeros of A^T A (students who borrowed both books)
+    Recommendations   the TOP_K most similar books of each book, ranked
+
+    similarity(a, b) = together(a, b) / sqrt(borrowers(a) * borrowers(b))
+
+A^T A is computed in SQLite as a join of A with itself grouped by book pair,
+a sparse matrix product that never materialises a dense row. To bound the
+work for heavy borrowers, each book is paired with the PAIR_WINDOW books the
+student borrowed before it rather than with their whole history.
+
+The batch job folds in the loans recorded since its last run: new
+(student, book) entries are appended to A, their pairs are added to
+CoBorrow, and the books they touch are re-ranked from their current list
+plus their changed pairs, so a refresh reads only what changed. Within one
+book's row the ranking depends only on together(a, b) and borrowers(b), so
+the counts always equal a full build's and the lists drift only where a
+listed neighbour gained borrowers and should make room for an unlisted one.
+A full build is the same job starting from an empty model:
+
+    python -m lms_recommend refresh    # e.g. nightly
+    python -m lms_recommend build      # e.g. weekly
+
+Showing a book's recommendations is one read of the Recommendations
+primary key.
+"""
+import argparse
+import os
+import time
+from dataclasses import dataclass
+
+from lms_analytics import loan_source
+from lms_db import DB_FILE, PRAGMAS
+
+TOP_K = int(os.environ.get("LMS_RECOMMEND_TOP_K", 10))  # Neighbours kept per book
+PAIR_WINDOW = int(os.environ.get("LMS_RECOMMEND_WINDOW", 10))  # Earlier books of the student each book pairs with
+MIN_TOGETHER = int(os.environ.get("LMS_RECOMMEND_MIN_TOGETHER", 2))  # Co-borrowers needed to recommend a pair
+
+# The batch job's connections: a full build's temporary tables spill to disk instead of memory and
+# the database is read through the page cache alone, so the job's heap stays about the same at any
+# size (RSS also counts the file pages SQLite's sorter maps while merging its spill files)
+BATCH_PRAGMAS = {**PRAGMAS, "temp_store": "FILE", "mmap_size": 0}
+
+RECOMMEND_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS StudentBooks (
+        student_id TEXT NOT NULL,
+        book_id INTEGER NOT NULL,
+        seq INTEGER NOT NULL,
+        PRIMARY KEY (student_id, book_id)
+    ) WITHOUT ROWID
+    """,
+    # A student's books in borrowing order (the pairing window, recently borrowed books)
+    "CREATE INDEX IF NOT EXISTS idx_student_books_seq ON StudentBooks (student_id, seq, book_id)",
+    """
+    CREATE TABLE IF NOT EXISTS BookBorrowers (
+        book_id INTEGER PRIMARY KEY,
+        borrowers INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS CoBorrow (
+        book_id INTEGER NOT NULL,
+        other_id INTEGER NOT NULL,
+        together INTEGER NOT NULL,
+        PRIMARY KEY (book_id, other_id)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS Recommendations (
+        book_id INTEGER NOT NULL,
+        rank INTEGER NOT NULL,
+        other_id INTEGER NOT NULL,
+        score REAL NOT NULL,
+        PRIMARY KEY (book_id, rank)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS RecommenderState (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        last_issue_id INTEGER NOT NULL,
+        updated TEXT
+    )
+    """,
+]
+
+MODEL_TABLES = ["StudentBooks", "BookBorrowers", "CoBorrow", "Recommendations", "RecommenderState"]
+
+
+@dataclass
+class ModelStats:
+    loans: int = 0  # Loans read since the last run
+    new_entries: int = 0  # New (student, book) entries of A
+    pairs: int = 0  # Distinct book pairs whose count changed
+    books_ranked: int = 0  # Books whose top-K was recomputed
+    seconds: float = 0.0
+
+
+def refresh_model(conn, loans=None):
+    """Folds the loans recorded since the last run into the model, inside the caller's write transaction."""
+    started = time.perf_counter()
+    loans = loans or loan_source(conn)
+    state = conn.execute("SELECT last_issue_id FROM RecommenderState WHERE id = 1").fetchone()
+    mark = state[0] if state else 0
+    stats = ModelStats()
+    stats.loans, last = conn.execute(
+        f"SELECT COUNT(*), COALESCE(MAX(issue_id), ?) FROM {loans} WHERE issue_id > ?", (mark, mark)
+    ).fetchone()
+
+    # New entries of A, numbered after the student's existing ones in first-borrow order
+    conn.execute("CREATE TEMP TABLE new_books (student_id TEXT, book_id INTEGER, seq INTEGER)")
+    conn.execute(f"""
+    WITH fresh AS (
+        SELECT student_id, book_id, MIN(issue_id) AS first_issue FROM {loans} WHERE issue_id > ?
+        GROUP BY student_id, book_id
+    )
+    INSERT INTO temp.new_books
+    SELECT f.student_id, f.book_id,
+        COALESCE((SELECT MAX(seq) FROM StudentBooks s WHERE s.student_id = f.student_id), 0)
+        + ROW_NUMBER() OVER (PARTITION BY f.student_id ORDER BY f.first_issue)
+    FROM fresh f
+    WHERE NOT EXISTS (SELECT 1 FROM StudentBooks s WHERE s.student_id = f.student_id AND s.book_id = f.book_id)
+    """, (mark,))
+    stats.new_entries = conn.execute("INSERT INTO StudentBooks SELECT * FROM temp.new_books").rowcount
+    conn.execute("""
+    INSERT INTO BookBorrowers (book_id, borrowers)
+    SELECT book_id, COUNT(*) FROM temp.new_books WHERE true GROUP BY book_id
+    ON CONFLICT DO UPDATE SET borrowers = borrowers + excluded.borrowers
+    """)
+
+    # The increment of A^T A: each new entry against the student's PAIR_WINDOW earlier books
+    conn.execute("CREATE TEMP TABLE pair_counts (book_id INTEGER, other_id INTEGER, together INTEGER)")
+    conn.execute("""
+    INSERT INTO temp.pair_counts
+    SELECT book_id, other_id, SUM(together) FROM (
+        SELECT n.book_id, o.book_id AS other_id, 1 AS together
+        FROM temp.new_books n JOIN StudentBooks o
+            ON o.student_id = n.student_id AND o.seq >= n.seq - ? AND o.seq < n.seq
+    ) GROUP BY book_id, other_id
+    """, (PAIR_WINDOW,))
+    stats.pairs = conn.execute("""
+    INSERT INTO CoBorrow (book_id, other_id, together)
+    SELECT book_id, other_id, SUM(together) FROM (
+        SELECT book_id, other_id, together FROM temp.pair_counts
+        UNION ALL
+        SELECT other_id, book_id, together FROM temp.pair_counts
+    ) WHERE true GROUP BY book_id, other_id
+    ON CONFLICT DO UPDATE SET together = together + excluded.together
+    """).rowcount
+
+    # Each book with a changed pair is re-ranked from its current list and its changed pairs;
+    # starting from an empty model (a full build) every pair is a candidate, so rank CoBorrow itself
+    if mark:
+        # Kept in key order, so the CoBorrow lookups walk the index in order (CROSS JOIN keeps
+        # the candidates outermost; the planner has no statistics for a temp table)
+        conn.execute(
+            "CREATE TEMP TABLE candidates (book_id INTEGER, other_id INTEGER, PRIMARY KEY (book_id, other_id)) WITHOUT ROWID")
+        conn.execute("""
+        INSERT OR IGNORE INTO temp.candidates
+        SELECT book_id, other_id FROM temp.pair_counts UNION ALL SELECT other_id, book_id FROM temp.pair_counts
+        """)
+        conn.execute("""
+        INSERT OR IGNORE INTO temp.candidates
+        SELECT r.book_id, r.other_id FROM Recommendations r
+        WHERE r.book_id IN (SELECT DISTINCT book_id FROM temp.candidates)
+        """)
+        pairs = "(SELECT c.* FROM temp.candidates k CROSS JOIN CoBorrow c ON c.book_id = k.book_id AND c.other_id = k.other_id)"
+        conn.execute("DELETE FROM Recommendations WHERE book_id IN (SELECT DISTINCT book_id FROM temp.candidates)")
+    else:
+        conn.execute("CREATE TEMP TABLE candidates AS SELECT DISTINCT book_id FROM CoBorrow")
+        pairs = "CoBorrow"
+    conn.execute(f"""
+    INSERT INTO Recommendations (book_id, rank, other_id, score)
+    SELECT book_id, rank, other_id, score FROM (
+        SELECT book_id, other_id, score, ROW_NUMBER() OVER (PARTITION BY book_id ORDER BY score DESC, other_id) AS rank
+        FROM (
+            SELECT c.book_id, c.other_id, c.together / sqrt(ba.borrowers * bb.borrowers) AS score
+            FROM {pairs} c
+            JOIN BookBorrowers ba ON ba.book_id = c.book_id
+            JOIN BookBorrowers bb ON bb.book_id = c.other_id
+            WHERE c.together >= ?
+        )
+    ) WHERE rank <= ?
+    """, (MIN_TOGETHER, TOP_K))
+    stats.books_ranked = conn.execute("SELECT COUNT(DISTINCT book_id) FROM temp.candidates").fetchone()[0]
+    for table in ("new_books", "pair_counts", "candidates"):
+        conn.execute(f"DROP TABLE temp.{table}")
+
+    conn.execute("""
+    INSERT INTO RecommenderState (id, last_issue_id, updated) VALUES (1, ?, datetime('now'))
+    ON CONFLICT DO UPDATE SET last_issue_id = excluded.last_issue_id, updated = excluded.updated
+    """, (last,))
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def refresh_recommendations(pool):
+    """Folds new loans into the model in one write transaction; returns ModelStats."""
+    with pool.writer() as conn:
+        return refresh_model(conn)
+
+
+def build_recommendations(pool):
+    """Rebuilds the model from every loan, live and archived, in one write transaction; returns ModelStats."""
+    with pool.writer() as conn:
+        for table in MODEL_TABLES:
+            conn.execute(f"DELETE FROM {table}")
+        return refresh_model(conn)
+
+
+def also_borrowed_query(book_id, limit=TOP_K):
+    """(query, params) for the books most often borrowed with ``book_id``, best first."""
+    return """
+    SELECT r.other_id AS book_id, b.title, b.author, b.copies_available, ROUND(r.score, 3) AS score
+    FROM Recommendations r JOIN Books b ON b.book_id = r.other_id
+    WHERE r.book_id = ? ORDER BY r.rank LIMIT ?
+    """, (book_id, limit)
+
+
+def recent_books_query(student_id, limit=10):
+    """(query, params) for the books a student borrowed most recently, as of the last model run."""
+    return """
+    SELECT s.book_id, b.title FROM StudentBooks s JOIN Books b ON b.book_id = s.book_id
+    WHERE s.student_id = ? ORDER BY s.seq DESC LIMIT ?
+    """, (student_id, limit)
+
+
+def main(argv=None):
+    from lms_archive import ARCHIVE_FILE, archive_pool, ensure_archive
+    from lms_migrations import ensure_migrated
+
+    parser = argparse.ArgumentParser(description="Build or update the co-borrowing recommendations.")
+    parser.add_argument("command", choices=["refresh", "build"])
+    parser.add_argument("--db", default=DB_FILE, help="SQLite database file (default: %(default)s)")
+    parser.add_argument("--archive", default=ARCHIVE_FILE, help="history database file (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    pool = archive_pool(args.db, args.archive, pragmas=BATCH_PRAGMAS)
+    ensure_migrated(pool)
+    ensure_archive(pool)
+    stats = build_recommendations(pool) if args.command == "build" else refresh_recommendations(pool)
+    print(", ".join(f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}"
+                    for key, value in vars(stats).items()))
+
+
+if __name__ == "__main__":
+    main()
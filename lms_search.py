@@ -0,0 +1,92 @@
+"""Full-text catalog search backed by an SQLite FTS5 index.
+
+``BooksFTS`` is an external-content FTS5 table over Books(title, author,
+publisher); triggers keep it in step with every insert, update and delete on
+Books, so the catalog pages never need a ``LIKE '%term%'`` table scan.
+"""
+import re
+
+SEARCH_LIMIT = 200
+
+# Column weights for bm25(): a hit in the title outranks one in the author, then publisher.
+BM25_WEIGHTS = (10.0, 5.0, 1.0)
+
+SEARCH_INDEX_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS BooksFTS USING fts5(
+    title, author, publisher,
+    content='Books', content_rowid='book_id',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON Books BEGIN
+    INSERT INTO BooksFTS (rowid, title, author, publisher)
+    VALUES (new.book_id, new.title, new.author, new.publisher);
+END;
+
+CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON Books BEGIN
+    INSERT INTO BooksFTS (BooksFTS, rowid, title, author, publisher)
+    VALUES ('delete', old.book_id, old.title, old.author, old.publisher);
+END;
+
+CREATE TRIGGER IF NOT EXISTS books_fts_update AFTER UPDATE OF book_id, title, author, publisher ON Books BEGIN
+    INSERT INTO BooksFTS (BooksFTS, rowid, title, author, publisher)
+    VALUES ('delete', old.book_id, old.title, old.author, old.publisher);
+    INSERT INTO BooksFTS (rowid, title, author, publisher)
+    VALUES (new.book_id, new.title, new.author, new.publisher);
+END;
+"""
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def ensure_search_index(conn):
+    """Creates BooksFTS and its triggers, indexing existing books the first time."""
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'BooksFTS'").fetchone()
+    for statement in SEARCH_INDEX_SCHEMA.split(";\n\n"):
+        conn.execute(statement)
+    if not exists:
+        conn.execute("INSERT INTO BooksFTS (BooksFTS) VALUES ('rebuild')")
+
+
+def match_expression(search_term):
+    """Turns free text into an FTS5 MATCH expression, or None if it has no words.
+
+    Every word must match (implicit AND) and every word is a prefix, so
+    "harr pot" finds "Harry Potter" while the user is still typing. Words are
+    quoted, so FTS5 operators and punctuation in the input are never parsed.
+    """
+    tokens = _TOKEN.findall(search_term)
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def search_query(search_term, columns, available_only=False, limit=SEARCH_LIMIT, with_score=False):
+    """Builds a BM25-ranked catalog search; returns (query, params) or None if the term has no words.
+
+    ``with_score`` adds the bm25 rank as a ``score`` column (lower is better).
+    """
+    expression = match_expression(search_term)
+    if expression is None:
+        return None
+    weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+    select = ", ".join([f"b.{column}" for column in columns] + ([f"bm25(BooksFTS, {weights}) AS score"] if with_score else []))
+    available = "AND b.copies_available > 0" if available_only else ""
+    query = f"""
+    SELECT {select}
+    FROM BooksFTS
+    JOIN Books b ON b.book_id = BooksFTS.rowid
+    WHERE BooksFTS MATCH ? {available}
+    ORDER BY bm25(BooksFTS, {weights})
+    LIMIT ?
+    """
+    return query, (expression, limit)
+
+
+def match_condition(search_term, id_column="b.book_id"):
+    """Builds a WHERE condition restricting ``id_column`` to FTS matches; returns (condition, params) or None."""
+    expression = match_expression(search_term)
+    if expression is None:
+        return None
+    return f"{id_column} IN (SELECT rowid FROM BooksFTS WHERE BooksFTS MATCH ?)", (expression,)
@@ -0,0 +1,134 @@
+"""Login, catalog search and circulation as plain functions over a pool.
+
+This is the layer both front ends call: the Streamlit pages and the HTTP
+API in lms_api. Nothing here imports Streamlit or pandas; results are plain
+dicts and the lms_circulation outcome dataclasses, ready for a UI message or
+a JSON body.
+"""
+from dataclasses import asdict
+
+from lms_circulation import IssueOutcome, ReturnOutcome, issue_books, issue_copies, return_books, return_copies
+from lms_holds import DEFAULT_PRIORITY, place_hold, student_holds_query
+from lms_pagination import PAGE_SIZE
+from lms_queries import CATALOG_COLUMNS, catalog_conditions, catalog_pager, catalog_search
+
+ADMIN_LOGIN = "SELECT admin_id FROM Admin WHERE username = ? AND password = ?"
+STUDENT_LOGIN = "SELECT student_id, student_name FROM Student WHERE student_id = ?"
+
+
+def parse_ids(text):
+    """Parses a comma/space separated list of positive integer IDs; returns None if any is invalid."""
+    ids = []
+    for token in text.replace(",", " ").split():
+        if not token.isdigit() or int(token) < 1:
+            return None
+        ids.append(int(token))
+    return ids
+
+
+def admin_login(pool, username, password):
+    """Returns the admin_id for valid credentials, otherwise None."""
+    row = pool.reader().execute(ADMIN_LOGIN, (username, password)).fetchone()
+    return row["admin_id"] if row else None
+
+
+def student_login(pool, student_id):
+    """Returns {"student_id", "student_name"} for a known student, otherwise None."""
+    row = pool.reader().execute(STUDENT_LOGIN, (student_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def search_books(pool, search_term="", available_only=False, columns=CATALOG_COLUMNS, limit=PAGE_SIZE):
+    """Best matches for ``search_term`` (or the first books by ID when it has no words) as dicts."""
+    query = catalog_search(search_term, columns, available_only=available_only)
+    if query is None:
+        conditions, params = catalog_conditions(search_term, available_only)
+        query = catalog_pager(columns, "Book ID", page_size=limit).query(conditions, params)
+    rows = pool.reader().execute(*query).fetchmany(limit)
+    return [dict(row) for row in rows]
+
+
+def outcome_dicts(outcomes):
+    """Issue/return outcomes as JSON-ready dicts with an ``ok`` flag."""
+    return [dict(asdict(o), ok=o.ok) for o in outcomes]
+
+
+def issue(pool, student_id, book_ids, today=None, write_queue=None):
+    """Issues ``book_ids`` to ``student_id`` in one transaction; returns one dict per book.
+
+    With a ``write_queue`` the transaction is part of its next group commit.
+    """
+    if write_queue is not None:
+        return outcome_dicts(write_queue.submit(issue_books, student_id, book_ids, today).result())
+    return outcome_dicts(issue_books(pool, student_id, book_ids, today))
+
+
+def return_loans(pool, issue_ids, today=None, write_queue=None):
+    """Returns the loans in ``issue_ids`` in one transaction; returns one dict per loan.
+
+    A loan whose copy went to a waiting hold names it in ``hold_id`` and ``held_for``.
+    """
+    if write_queue is not None:
+        return outcome_dicts(write_queue.submit(return_books, issue_ids, today).result())
+    return outcome_dicts(return_books(pool, issue_ids, today))
+
+
+def parse_barcodes(text):
+    """Splits scanned barcodes on commas, spaces or newlines."""
+    return text.replace(",", " ").split()
+
+
+def issue_scanned(pool, student_id, barcodes, today=None, write_queue=None, cache=None):
+    """Issues scanned copies to ``student_id`` in one transaction; returns one dict per barcode."""
+    if write_queue is not None:
+        return outcome_dicts(write_queue.submit(issue_copies, student_id, barcodes, today, cache=cache).result())
+    return outcome_dicts(issue_copies(pool, student_id, barcodes, today, cache=cache))
+
+
+def return_scanned(pool, barcodes, today=None, write_queue=None, cache=None):
+    """Returns the loans of scanned copies in one transaction; returns one dict per barcode."""
+    if write_queue is not None:
+        return outcome_dicts(write_queue.submit(return_copies, barcodes, today, cache=cache).result())
+    return outcome_dicts(return_copies(pool, barcodes, today, cache=cache))
+
+
+def _scan_at_branches(branches, default, barcodes, scan, unowned):
+    """Runs ``scan(pool, barcodes)`` once per branch owning some of ``barcodes``; returns its dicts in scan order."""
+    routed, errors = branches.route(barcodes, default)
+    owner = {barcode: branch for branch, scanned in routed.items() for barcode in scanned}
+    results = {branch: iter(scan(branches.pool(branch), scanned)) for branch, scanned in routed.items()}
+    return [next(results[owner[barcode]]) if barcode in owner
+            else outcome_dicts([unowned(None, barcode=barcode, error=errors[barcode])])[0]
+            for barcode in barcodes]
+
+
+def issue_scanned_at(branches, default, student_id, barcodes, today=None, desk=None):
+    """Issues scanned copies at the branches that own them (a BranchRegistry); returns one dict per barcode.
+
+    Each branch's copies are issued in one transaction on its pool. Labels
+    without a prefix are issued at ``default``. ``desk(pool)`` gives the
+    write_queue and cache keyword arguments for a branch's pool.
+    """
+    def scan(pool, scanned):
+        return issue_scanned(pool, student_id, scanned, today, **(desk(pool) if desk else {}))
+    return _scan_at_branches(branches, default, barcodes, scan, IssueOutcome)
+
+
+def return_scanned_at(branches, default, barcodes, today=None, desk=None):
+    """Returns scanned copies at the branches that own them; returns one dict per barcode (see issue_scanned_at)."""
+    def scan(pool, scanned):
+        return return_scanned(pool, scanned, today, **(desk(pool) if desk else {}))
+    return _scan_at_branches(branches, default, barcodes, scan, ReturnOutcome)
+
+
+def hold(pool, student_id, book_ids, priority=DEFAULT_PRIORITY, write_queue=None):
+    """Places a hold on each of ``book_ids``; returns one dict per book with the queue position."""
+    if write_queue is not None:
+        outcomes = [write_queue.submit(place_hold, student_id, book_id, priority) for book_id in book_ids]
+        return outcome_dicts(future.result() for future in outcomes)
+    return outcome_dicts(place_hold(pool, student_id, book_id, priority) for book_id in book_ids)
+
+
+def student_holds(pool, student_id):
+    """A student's active holds (ready for pickup first) with queue positions, as dicts."""
+    return [dict(row) for row in pool.reader().execute(*student_holds_query(student_id))]